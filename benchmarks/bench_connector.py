@@ -0,0 +1,63 @@
+#!/usr/bin/python3
+"""
+Compares fetching bug info one Connector Get per bug ID against the
+batched multi-path get_many, using the local fake Connector server.
+
+  python benchmarks/bench_connector.py --bugs 500 --latency 0.002
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cloudvision.Connector.grpc_client import GRPCClient
+from cvp_mcp.grpc.connector import get, get_many
+from fake_cvp import serve
+
+DATASET = "analytics"
+
+
+def per_id(client, bug_ids):
+    return {bug_id: dict(get(client, DATASET, ["BugAlerts", "bugs", bug_id])) for bug_id in bug_ids}
+
+
+def batched(client, bug_ids, batch_size):
+    paths = [["BugAlerts", "bugs", bug_id] for bug_id in bug_ids]
+    return {path[-1]: info for path, info in get_many(client, DATASET, paths, batch_size).items()}
+
+
+def timed(func, *args, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main(args):
+    server, address, servicers = serve(latency=args.latency)
+    bug_ids = list(range(1, args.bugs + 1))
+    try:
+        with GRPCClient(address) as client:
+            loop_time, loop_result = timed(per_id, client, bug_ids)
+            print(f"per-id loop     {args.bugs:>6} bugs  {loop_time * 1000:9.1f} ms")
+            for batch_size in args.batch_sizes:
+                batch_time, batch_result = timed(batched, client, bug_ids, batch_size)
+                assert batch_result == loop_result, "batched results differ from per-id results"
+                print(f"batch size {batch_size:>4} {args.bugs:>6} bugs  {batch_time * 1000:9.1f} ms  "
+                      f"{loop_time / batch_time:6.1f}x")
+        print(f"fake server handled {servicers['router'].requests} Get requests")
+    finally:
+        server.stop(None)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bugs", type=int, default=500, help="Number of bug IDs to fetch")
+    parser.add_argument("--latency", type=float, default=0.002, help="Seconds of injected latency per Get request")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[25, 100, 250], help="Batch sizes to compare")
+    main(parser.parse_args())
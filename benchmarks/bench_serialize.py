@@ -0,0 +1,97 @@
+#!/usr/bin/python3
+"""
+Microbenchmark of the compiled serialize_arista_protobuf against the
+reflective serializer on synthetic endpoint-location and probe messages.
+Both must produce identical output.
+
+  python benchmarks/bench_serialize.py --endpoints 200 --locations 8
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from arista.endpointlocation.v1 import models as endpoint_models
+from arista.connectivitymonitor.v1 import models as probe_models
+from google.protobuf import wrappers_pb2 as wrappers
+from cvp_mcp.grpc.utils import serialize_arista_protobuf, serialize_arista_protobuf_reflective
+
+
+def synthetic_endpoint_location(endpoints, locations):
+    """An EndpointLocation search result with endpoints x locations entries"""
+    result = endpoint_models.EndpointLocation()
+    result.key.search_term.value = "00:1c:73"
+    for i in range(endpoints):
+        device = result.device_map.values[f"00:1c:73:00:{i // 256:02x}:{i % 256:02x}"]
+        device.device_type = endpoint_models.DEVICE_TYPE_ENDPOINT
+        device.device_status = endpoint_models.DEVICE_STATUS_ACTIVE
+        mac = device.identifier_list.values.add()
+        mac.type = endpoint_models.IDENTIFIER_TYPE_MAC_ADDR
+        mac.value.value = f"00:1c:73:00:{i // 256:02x}:{i % 256:02x}"
+        mac.source_list.values.extend([1, 2])
+        ip = device.identifier_list.values.add()
+        ip.type = endpoint_models.IDENTIFIER_TYPE_IPV4_ADDR
+        ip.value.value = f"10.{i // 65536}.{i // 256 % 256}.{i % 256}"
+        device.device_info.device_name.value = f"host-{i}"
+        device.device_info.mac_vendor.value = "Arista Networks"
+        device.device_info.hierarchy.values.extend(["Network", "Server"])
+        for j in range(locations):
+            location = device.location_list.values.add()
+            location.device_id.value = f"SN{j:05d}"
+            location.device_status = endpoint_models.DEVICE_STATUS_ACTIVE
+            location.interface.value = f"Ethernet{j + 1}"
+            location.vlan_id.value = 100 + j
+            location.learned_time.seconds = 1700000000 + j
+            location.mac_type = endpoint_models.MAC_TYPE_LEARNED_DYNAMIC
+            location.likelihood = endpoint_models.LIKELIHOOD_VERY_LIKELY
+            location.explanation_list.values.extend([1, 2, 3])
+            location.identifier_list.values.add().CopyFrom(mac)
+    return result
+
+
+def synthetic_probes(count):
+    return [
+        probe_models.ProbeStats(
+            key=probe_models.ProbeStatsKey(
+                device_id=wrappers.StringValue(value=f"SN{i % 500:05d}"),
+                host=wrappers.StringValue(value=f"10.0.{i // 256 % 256}.{i % 256}"),
+                vrf=wrappers.StringValue(value="default"),
+                source_intf=wrappers.StringValue(value="Management1"),
+            ),
+            latency_millis=wrappers.DoubleValue(value=i * 0.01),
+            jitter_millis=wrappers.DoubleValue(value=i * 0.001),
+            http_response_time_millis=wrappers.DoubleValue(value=i * 0.02),
+            packet_loss_percent=wrappers.Int64Value(value=i % 3),
+        )
+        for i in range(count)
+    ]
+
+
+def compare(name, serialize_all, repeat):
+    assert serialize_all(serialize_arista_protobuf) == serialize_all(serialize_arista_protobuf_reflective), \
+        f"{name}: compiled output differs from reflective output"
+    reflective = min(timeit.repeat(lambda: serialize_all(serialize_arista_protobuf_reflective), number=1, repeat=repeat))
+    compiled = min(timeit.repeat(lambda: serialize_all(serialize_arista_protobuf), number=1, repeat=repeat))
+    print(f"{name:<20} reflective {reflective * 1000:8.2f} ms  compiled {compiled * 1000:8.2f} ms  "
+          f"{reflective / compiled:5.2f}x")
+
+
+def main(args):
+    endpoint_location = synthetic_endpoint_location(args.endpoints, args.locations)
+    probes = synthetic_probes(args.probes)
+    # convert_response_to_endpoint_location serializes Location messages
+    locations = [location for device in endpoint_location.device_map.values.values() for location in device.location_list.values]
+    compare("endpoint location", lambda serialize: serialize(endpoint_location), args.repeat)
+    compare("locations", lambda serialize: [serialize(location) for location in locations], args.repeat)
+    compare("probe stats", lambda serialize: [serialize(probe) for probe in probes], args.repeat)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--endpoints", type=int, default=200, help="Endpoints in the synthetic search result")
+    parser.add_argument("--locations", type=int, default=8, help="Locations per endpoint")
+    parser.add_argument("--probes", type=int, default=5000, help="Number of synthetic probe messages")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing repetitions, the best is reported")
+    main(parser.parse_args())
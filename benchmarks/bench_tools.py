@@ -0,0 +1,176 @@
+#!/usr/bin/python3
+"""
+Drives every MCP tool against the local fake CVP at several fleet sizes
+and reports per-tool latency, throughput, response size and peak RSS, so
+regressions show up. Each fleet size runs the fake CVP and the tools in
+separate fresh processes, so caches start empty and RSS is the MCP
+server's own.
+
+  python benchmarks/bench_tools.py --sizes 100 1000 10000 --repeat 20 --concurrency 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS))
+
+
+def scenarios(devices):
+    """(tool, arguments) pairs covering every tool, sized for the fleet"""
+    serial_numbers = [f"SN{i:06d}" for i in range(devices)]
+    sample = range(min(devices, 50))
+    return [
+        ("get_cvp_one_device", {"device_id": serial_numbers[0]}),
+        ("get_cvp_devices", {"device_ids": serial_numbers[:100]}),
+        ("get_cvp_devices_by_hostname", {"hostnames": [f"leaf{i}" for i in sample]}),
+        ("get_cvp_devices_by_mac", {"system_macs": [f"00:1c:73:00:{(i >> 8) & 255:02x}:{i & 255:02x}" for i in sample]}),
+        ("get_cvp_all_inventory", {}),
+        ("get_cvp_all_bugs", {}),
+        ("get_cvp_devices_exposed_to_bug", {"bug_id": 5}),
+        ("get_cvp_devices_by_exposure", {"exposure": "High", "exposure_type": "bug", "limit": 50}),
+        ("get_cvp_all_connectivity_probes", {}),
+        ("get_cvp_one_connectivity_probe", {"serial_number": serial_numbers[0]}),
+        ("get_cvp_connectivity_probe_summary", {}),
+        ("get_cvp_connectivity_probe_trend", {"minutes": 5}),
+        ("get_cvp_all_device_lifecycle", {}),
+        ("get_cvp_devices_by_lifecycle_date", {"before": "2027-01-01", "limit": 50}),
+        ("get_cvp_endpoint_location", {"search_term": "host1"}),
+        ("get_cvp_endpoint_locations", {"search_terms": [f"host{i}" for i in sample]}),
+        ("get_cvp_mcp_stats", {}),
+    ]
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def call(mcp, tool, arguments):
+    start = time.perf_counter()
+    content = await mcp.call_tool(tool, arguments)
+    elapsed = time.perf_counter() - start
+    return elapsed, sum(len(block.text.encode()) for block in content if hasattr(block, "text"))
+
+
+async def bench_tool(mcp, tool, arguments, repeat, concurrency):
+    first, response_bytes = await call(mcp, tool, arguments)
+    latencies = [(await call(mcp, tool, arguments))[0] for _ in range(repeat)]
+    # Identical concurrent calls coalesce, as they would in the server
+    semaphore = asyncio.Semaphore(concurrency)
+    async def _bounded():
+        async with semaphore:
+            await call(mcp, tool, arguments)
+    start = time.perf_counter()
+    await asyncio.gather(*[_bounded() for _ in range(repeat)])
+    wall = time.perf_counter() - start
+    return {
+        "tool": tool,
+        "first_ms": first * 1000,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": sorted(latencies)[max(0, int(len(latencies) * 0.95) - 1)] * 1000,
+        "calls_per_second": repeat / wall,
+        "response_bytes": response_bytes,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+async def run_child(args):
+    """Runs every scenario against the fake CVP named by the CVP environment variable"""
+    import cloudvision_mcp
+    from cvp_mcp.grpc.cache import inventory_cache, probe_history
+    from cvp_mcp.grpc.channel import get_channel
+    from cvp_mcp.grpc.index import bug_exposure_index, lifecycle_index
+    from cvp_mcp.grpc.retry import rpc_policy
+    mcp = cloudvision_mcp.mcp
+    rpc_policy.hedge_delay = args.hedge_after_ms / 1000
+    if args.subscribe:
+        # Start the background subscriptions like main() does
+        datadict = cloudvision_mcp.get_env_vars()
+        inventory_cache.start(lambda: get_channel(datadict))
+        probe_history.start(lambda: get_channel(datadict))
+        bug_exposure_index.start(lambda: get_channel(datadict))
+        lifecycle_index.start(lambda: get_channel(datadict))
+        for _ in range(600):
+            if inventory_cache.is_fresh():
+                break
+            await asyncio.sleep(0.05)
+    covered = {tool for tool, _ in scenarios(args.devices)}
+    missing = sorted(tool.name for tool in await mcp.list_tools() if tool.name not in covered)
+    if missing:
+        print(f"warning: no scenario for {', '.join(missing)}", file=sys.stderr)
+    results = []
+    for tool, arguments in scenarios(args.devices):
+        if args.tools and tool not in args.tools:
+            continue
+        results.append(await bench_tool(mcp, tool, arguments, args.repeat, args.concurrency))
+    inventory_cache.stop()
+    probe_history.stop()
+    bug_exposure_index.stop()
+    lifecycle_index.stop()
+    print(json.dumps(results))
+
+
+def run_size(args, devices):
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(BENCHMARKS, "fake_cvp.py"), "--devices", str(devices), "--latency", str(args.latency),
+         "--error-rate", str(args.error_rate), "--slow-rate", str(args.slow_rate), "--slow-latency", str(args.slow_latency)],
+        stdout=subprocess.PIPE, text=True,
+    )
+    try:
+        address = server.stdout.readline().strip()
+        env = dict(os.environ, CVP=address, CVPTOKEN="benchmark", CVP_INSECURE="1")
+        command = [sys.executable, __file__, "--child", "--devices", str(devices), "--repeat", str(args.repeat), "--concurrency", str(args.concurrency),
+                   "--hedge-after-ms", str(args.hedge_after_ms)]
+        if not args.subscribe:
+            command.append("--no-subscribe")
+        if args.tools:
+            command += ["--tools", *args.tools]
+        child = subprocess.run(command, env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL if not args.verbose else None, text=True, check=True)
+        return json.loads(child.stdout.strip().splitlines()[-1])
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main(args):
+    if args.child:
+        asyncio.run(run_child(args))
+        return
+    report = {}
+    for devices in args.sizes:
+        results = run_size(args, devices)
+        report[devices] = results
+        print(f"\n{devices} devices")
+        print(f"{'tool':<38} {'first ms':>9} {'p50 ms':>8} {'p95 ms':>8} {'calls/s':>9} {'bytes':>10} {'rss MB':>7}")
+        for result in results:
+            print(f"{result['tool']:<38} {result['first_ms']:9.1f} {result['p50_ms']:8.2f} {result['p95_ms']:8.2f} "
+                  f"{result['calls_per_second']:9.1f} {result['response_bytes']:10d} {result['peak_rss_mb']:7.1f}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000], help="Fleet sizes to benchmark")
+    parser.add_argument("--repeat", type=int, default=20, help="Calls per tool after the first")
+    parser.add_argument("--concurrency", type=int, default=8, help="Calls in flight while measuring throughput")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds of injected latency per fake CVP request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of fake CVP requests failing with UNAVAILABLE")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Fraction of fake CVP requests delayed by --slow-latency")
+    parser.add_argument("--slow-latency", type=float, default=0.0, help="Extra seconds taken by slow fake CVP requests")
+    parser.add_argument("--hedge-after-ms", type=int, default=0, help="Hedge single-record lookups after this many milliseconds, 0 disables hedging")
+    parser.add_argument("--tools", nargs="*", help="Only benchmark these tools")
+    parser.add_argument("--no-subscribe", dest="subscribe", action="store_false", help="Do not start the inventory, probe and index subscriptions")
+    parser.add_argument("--output", type=str, help="Write the results as JSON to this file")
+    parser.add_argument("--verbose", action="store_true", help="Show the server logs")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--devices", type=int, default=100, help=argparse.SUPPRESS)
+    main(parser.parse_args())
@@ -0,0 +1,439 @@
+"""
+Local stand-in for the CloudVision gRPC APIs used by the MCP server,
+serving synthetic data so tools can be benchmarked without a live CVP.
+It implements DeviceService, BugExposureService, ProbeStatsService,
+DeviceLifecycleSummaryService, EndpointLocationService and the Connector
+Get RPC. Point the server at it with CVP=<address> and CVP_INSECURE=1.
+"""
+from concurrent import futures
+import queue
+import random
+import time
+import grpc
+from google.protobuf import timestamp_pb2
+from google.protobuf import wrappers_pb2 as wrappers
+from cloudvision.Connector import codec
+from cloudvision.Connector.gen import notification_pb2 as ntf
+from cloudvision.Connector.gen import router_pb2_grpc as rtr_client
+from arista.inventory.v1 import models as inventory_models, services as inventory_services
+from arista.bugexposure.v1 import models as bug_models, services as bug_services
+from arista.connectivitymonitor.v1 import models as probe_models, services as probe_services
+from arista.lifecycle.v1 import models as lifecycle_models, services as lifecycle_services
+from arista.endpointlocation.v1 import models as endpoint_models, services as endpoint_services
+from fmp import wrappers_pb2 as fmp_wrappers
+
+# Subscribe operations, as in arista.subscriptions.Operation
+INITIAL = 10
+INITIAL_SYNC_COMPLETE = 11
+UPDATED = 20
+DELETED = 30
+# Model names cycled through the synthetic fleet, covering every device type
+MODELS = ["DCS-7050SX3-48YC8", "DCS-7280CR3-32P4", "CCS-720XP-48ZC2", "cEOSLab", "vEOS-lab", "C-230", "PA-3220"]
+VERSIONS = ["4.29.2F", "4.30.1F", "4.31.0F", "4.32.1F"]
+# Distinct bug IDs the synthetic fleet is exposed to
+BUG_POOL = 200
+VRFS = ["default", "MGMT", "PROD"]
+
+
+def synthetic_bug_info(bug_id):
+    """Bug metadata shaped like the BugAlerts/bugs/<id> analytics path"""
+    return {
+        "alertNote": f"Synthetic bug {bug_id} affecting forwarding agent",
+        "bugId": bug_id,
+        "cveId": f"CVE-2024-{10000 + bug_id}" if bug_id % 5 == 0 else "",
+        "severity": ["Low", "Medium", "High"][bug_id % 3],
+        "versionIntroduced": "4.28.0F",
+        "versionFixed": ["4.30.1F", "4.31.0F"],
+    }
+
+
+class FakeRouter(rtr_client.RouterV1Servicer):
+    """
+    Connector RouterV1 service answering Get with one notification per
+    requested path. latency seconds are slept once per Get request.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.requests = 0
+        self._encoder = codec.Encoder()
+        self._decoder = codec.Decoder()
+
+    def Get(self, request, context):
+        self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+        now = timestamp_pb2.Timestamp()
+        now.GetCurrentTime()
+        for query in request.query:
+            notifications = []
+            for path in query.paths:
+                path_elements = [self._decoder.decode(elt) for elt in path.path_elements]
+                if path_elements[:2] != ["BugAlerts", "bugs"]:
+                    continue
+                updates = [
+                    ntf.Notification.Update(key=self._encoder.encode(k), value=self._encoder.encode(v))
+                    for k, v in synthetic_bug_info(int(path_elements[2])).items()
+                ]
+                notifications.append(ntf.Notification(
+                    timestamp=now,
+                    path_elements=list(path.path_elements),
+                    updates=updates,
+                ))
+            yield ntf.NotificationBatch(dataset=query.dataset, notifications=notifications)
+
+
+def _timestamp(seconds):
+    return timestamp_pb2.Timestamp(seconds=seconds)
+
+
+def matches(partial, message):
+    """True when every field set in partial has the same value in message"""
+    for field, value in partial.ListFields():
+        other = getattr(message, field.name)
+        if field.message_type is not None and not field.is_repeated:
+            if not message.HasField(field.name) or not matches(value, other):
+                return False
+        elif value != other:
+            return False
+    return True
+
+
+class SyntheticFleet:
+    """
+    Deterministic synthetic CVP data for a fleet of devices: inventory,
+    bug exposure, connectivity probes, lifecycle dates and one endpoint
+    per device. Messages are built once so serving them is cheap.
+    """
+
+    def __init__(self, devices=100, probes_per_device=4, seed=0):
+        rng = random.Random(seed)
+        self.devices = [self._device(i, rng) for i in range(devices)]
+        self.serial_numbers = [device.key.device_id.value for device in self.devices]
+        self.bug_exposures = [self._bug_exposure(serial_number, rng) for serial_number in self.serial_numbers]
+        self.probes = [
+            self._probe(serial_number, j, rng)
+            for serial_number in self.serial_numbers
+            for j in range(probes_per_device)
+        ]
+        self.lifecycles = [self._lifecycle(device, rng) for device in self.devices]
+        self.endpoints = {}
+        for i, serial_number in enumerate(self.serial_numbers):
+            endpoint = self._endpoint(i, serial_number)
+            for identifier in endpoint.identifier_list.values:
+                self.endpoints[identifier.value.value.lower()] = endpoint
+
+    @staticmethod
+    def _device(i, rng):
+        model = MODELS[i % len(MODELS)]
+        return inventory_models.Device(
+            key=inventory_models.DeviceKey(device_id=wrappers.StringValue(value=f"SN{i:06d}")),
+            hostname=wrappers.StringValue(value=f"leaf{i}"),
+            model_name=wrappers.StringValue(value=model),
+            software_version=wrappers.StringValue(value=VERSIONS[i % len(VERSIONS)]),
+            hardware_revision=wrappers.StringValue(value="11.00"),
+            fqdn=wrappers.StringValue(value=f"leaf{i}.lab.example.com"),
+            domain_name=wrappers.StringValue(value="lab.example.com"),
+            system_mac_address=wrappers.StringValue(value=f"00:1c:73:{(i >> 16) & 255:02x}:{(i >> 8) & 255:02x}:{i & 255:02x}"),
+            streaming_status=inventory_models.STREAMING_STATUS_INACTIVE if rng.random() < 0.1 else inventory_models.STREAMING_STATUS_ACTIVE,
+        )
+
+    @staticmethod
+    def _bug_exposure(serial_number, rng):
+        bug_ids = sorted(rng.sample(range(1, BUG_POOL + 1), rng.randint(0, 5)))
+        cve_ids = [bug_id for bug_id in bug_ids if bug_id % 5 == 0]
+        def _highest(ids):
+            if not ids:
+                return bug_models.HIGHEST_EXPOSURE_NONE
+            return bug_models.HIGHEST_EXPOSURE_HIGH if max(ids) % 3 == 2 else bug_models.HIGHEST_EXPOSURE_LOW
+        return bug_models.BugExposure(
+            key=bug_models.BugExposureKey(device_id=wrappers.StringValue(value=serial_number)),
+            bug_ids=fmp_wrappers.RepeatedInt32(values=bug_ids),
+            cve_ids=fmp_wrappers.RepeatedInt32(values=cve_ids),
+            bug_count=wrappers.Int32Value(value=len(bug_ids)),
+            cve_count=wrappers.Int32Value(value=len(cve_ids)),
+            highest_bug_exposure=_highest(bug_ids),
+            highest_cve_exposure=_highest(cve_ids),
+        )
+
+    @staticmethod
+    def _probe(serial_number, j, rng):
+        probe = probe_models.ProbeStats(
+            key=probe_models.ProbeStatsKey(
+                device_id=wrappers.StringValue(value=serial_number),
+                host=wrappers.StringValue(value=f"10.{j}.0.1"),
+                vrf=wrappers.StringValue(value=VRFS[j % len(VRFS)]),
+                source_intf=wrappers.StringValue(value="Management1"),
+            ),
+            latency_millis=wrappers.DoubleValue(value=round(rng.lognormvariate(0, 0.8), 3)),
+            jitter_millis=wrappers.DoubleValue(value=round(rng.random(), 3)),
+            http_response_time_millis=wrappers.DoubleValue(value=round(rng.uniform(5, 50), 3)),
+            packet_loss_percent=wrappers.Int64Value(value=rng.choice([0] * 18 + [1, 5])),
+        )
+        if rng.random() < 0.02:
+            probe.error.value = "probe timed out"
+        return probe
+
+    @staticmethod
+    def _lifecycle(device, rng):
+        lifecycle = lifecycle_models.DeviceLifecycleSummary(
+            key=lifecycle_models.DeviceLifecycleSummaryKey(device_id=device.key.device_id),
+        )
+        lifecycle.software_eol.version.value = device.software_version.value
+        # Spread dates from 2024 to 2031
+        lifecycle.software_eol.end_of_support.CopyFrom(_timestamp(1704067200 + rng.randrange(0, 8 * 365) * 86400))
+        if device.model_name.value.startswith(("DCS-", "CCS-")):
+            hardware = lifecycle.hardware_lifecycle_summary
+            end_of_sale = 1704067200 + rng.randrange(0, 4 * 365) * 86400
+            hardware.end_of_sale.date.CopyFrom(_timestamp(end_of_sale))
+            hardware.end_of_hardware_rma_requests.date.CopyFrom(_timestamp(end_of_sale + 3 * 365 * 86400))
+            hardware.end_of_tac_support.date.CopyFrom(_timestamp(end_of_sale + 4 * 365 * 86400))
+            hardware.end_of_life.date.CopyFrom(_timestamp(end_of_sale + 5 * 365 * 86400))
+        return lifecycle
+
+    @staticmethod
+    def _endpoint(i, serial_number):
+        device = endpoint_models.Device()
+        for identifier_type, value in (
+            (endpoint_models.IDENTIFIER_TYPE_MAC_ADDR, f"02:00:00:{(i >> 16) & 255:02x}:{(i >> 8) & 255:02x}:{i & 255:02x}"),
+            (endpoint_models.IDENTIFIER_TYPE_IPV4_ADDR, f"172.{16 + (i >> 16)}.{(i >> 8) & 255}.{i & 255}"),
+            (endpoint_models.IDENTIFIER_TYPE_HOSTNAME, f"host{i}"),
+        ):
+            device.identifier_list.values.add(type=identifier_type, value=wrappers.StringValue(value=value))
+        device.location_list.values.add(
+            device_id=wrappers.StringValue(value=serial_number),
+            interface=wrappers.StringValue(value=f"Ethernet{1 + i % 48}"),
+            vlan_id=wrappers.UInt32Value(value=10),
+        )
+        return device
+
+
+class FakeService:
+    """
+    Base for the fake resource API services: latency seconds are slept
+    once per request, and publish() feeds updates to open Subscribe streams.
+    Faults can be injected: error_rate of requests fail with UNAVAILABLE
+    and slow_rate of them take slow_latency seconds longer.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.error_rate = 0.0
+        self.slow_rate = 0.0
+        self.slow_latency = 0.0
+        self.requests = 0
+        self._subscribers = []
+
+    def _request(self, context):
+        self.requests += 1
+        if self.error_rate and random.random() < self.error_rate:
+            context.abort(grpc.StatusCode.UNAVAILABLE, "injected failure")
+        if self.latency:
+            time.sleep(self.latency)
+        if self.slow_rate and random.random() < self.slow_rate:
+            time.sleep(self.slow_latency)
+
+    def publish(self, operation, value):
+        """Sends an UPDATED or DELETED for value to every Subscribe stream"""
+        for updates in list(self._subscribers):
+            updates.put((operation, value))
+
+    def _by_device(self, values):
+        """values grouped by key.device_id, built on first use"""
+        if getattr(self, "_device_values", None) is None:
+            self._device_values = {}
+            for value in values:
+                self._device_values.setdefault(value.key.device_id.value, []).append(value)
+        return self._device_values
+
+    def _stream(self, response, request, context, values):
+        self._request(context)
+        partial = list(request.partial_eq_filter)
+        # Filters on serial number alone are looked up rather than scanned
+        device_ids = [pattern.key.device_id.value for pattern in partial]
+        if partial and all(
+            [field.name for field, _ in pattern.ListFields()] == ["key"]
+            and [field.name for field, _ in pattern.key.ListFields()] == ["device_id"]
+            for pattern in partial
+        ):
+            by_device = self._by_device(values)
+            values = [value for device_id in dict.fromkeys(device_ids) for value in by_device.get(device_id, ())]
+            partial = []
+        for value in values:
+            if not partial or any(matches(pattern, value) for pattern in partial):
+                yield response(value=value, type=INITIAL)
+
+    def _subscribe(self, response, request, context, values):
+        updates = queue.Queue()
+        self._subscribers.append(updates)
+        try:
+            yield from self._stream(response, request, context, values)
+            yield response(type=INITIAL_SYNC_COMPLETE)
+            while context.is_active():
+                try:
+                    operation, value = updates.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                yield response(value=value, type=operation)
+        finally:
+            self._subscribers.remove(updates)
+
+
+class FakeDeviceService(FakeService, inventory_services.DeviceServiceServicer):
+    """
+    DeviceService over the synthetic fleet. Requests filtering only on
+    serial number, hostname or system MAC use lookup tables, as the bulk
+    lookups send hundreds of filters per request.
+    """
+
+    LOOKUPS = {
+        "key": lambda device: device.key.device_id.value,
+        "hostname": lambda device: device.hostname.value,
+        "system_mac_address": lambda device: device.system_mac_address.value,
+    }
+
+    def __init__(self, fleet, latency=0.0):
+        super().__init__(latency)
+        self.fleet = fleet
+        self._lookups = {
+            field: {key(device): device for device in fleet.devices}
+            for field, key in self.LOOKUPS.items()
+        }
+
+    def _lookup(self, request):
+        fields = {tuple(field.name for field, _ in pattern.ListFields()) for pattern in request.partial_eq_filter}
+        if len(fields) != 1 or len(next(iter(fields))) != 1 or next(iter(fields))[0] not in self._lookups:
+            return None
+        field = next(iter(fields))[0]
+        key = self.LOOKUPS[field]
+        found = (self._lookups[field].get(key(pattern)) for pattern in request.partial_eq_filter)
+        return [device for device in found if device is not None]
+
+    def GetOne(self, request, context):
+        self._request(context)
+        device = self._lookups["key"].get(request.key.device_id.value)
+        if device is None:
+            context.abort(grpc.StatusCode.NOT_FOUND, "device not found")
+        return inventory_services.DeviceResponse(value=device)
+
+    def GetAll(self, request, context):
+        devices = self._lookup(request)
+        if devices is not None:
+            self._request(context)
+            for device in devices:
+                yield inventory_services.DeviceStreamResponse(value=device, type=INITIAL)
+            return
+        yield from self._stream(inventory_services.DeviceStreamResponse, request, context, self.fleet.devices)
+
+    def Subscribe(self, request, context):
+        yield from self._subscribe(inventory_services.DeviceStreamResponse, request, context, self.fleet.devices)
+
+
+class FakeBugExposureService(FakeService, bug_services.BugExposureServiceServicer):
+
+    def __init__(self, fleet, latency=0.0):
+        super().__init__(latency)
+        self.fleet = fleet
+
+    def GetAll(self, request, context):
+        yield from self._stream(bug_services.BugExposureStreamResponse, request, context, self.fleet.bug_exposures)
+
+    def Subscribe(self, request, context):
+        yield from self._subscribe(bug_services.BugExposureStreamResponse, request, context, self.fleet.bug_exposures)
+
+
+class FakeProbeStatsService(FakeService, probe_services.ProbeStatsServiceServicer):
+
+    def __init__(self, fleet, latency=0.0):
+        super().__init__(latency)
+        self.fleet = fleet
+
+    def GetAll(self, request, context):
+        yield from self._stream(probe_services.ProbeStatsStreamResponse, request, context, self.fleet.probes)
+
+    def Subscribe(self, request, context):
+        yield from self._subscribe(probe_services.ProbeStatsStreamResponse, request, context, self.fleet.probes)
+
+
+class FakeDeviceLifecycleSummaryService(FakeService, lifecycle_services.DeviceLifecycleSummaryServiceServicer):
+
+    def __init__(self, fleet, latency=0.0):
+        super().__init__(latency)
+        self.fleet = fleet
+
+    def GetAll(self, request, context):
+        yield from self._stream(lifecycle_services.DeviceLifecycleSummaryStreamResponse, request, context, self.fleet.lifecycles)
+
+    def Subscribe(self, request, context):
+        yield from self._subscribe(lifecycle_services.DeviceLifecycleSummaryStreamResponse, request, context, self.fleet.lifecycles)
+
+
+class FakeEndpointLocationService(FakeService, endpoint_services.EndpointLocationServiceServicer):
+    """Finds synthetic endpoints by MAC, IPv4 address or hostname"""
+
+    def __init__(self, fleet, latency=0.0):
+        super().__init__(latency)
+        self.fleet = fleet
+
+    def GetOne(self, request, context):
+        self._request(context)
+        search_term = request.key.search_term.value
+        location = endpoint_models.EndpointLocation(key=request.key)
+        endpoint = self.fleet.endpoints.get(search_term.strip().lower())
+        if endpoint is not None:
+            location.device_map.values[search_term].CopyFrom(endpoint)
+        return endpoint_services.EndpointLocationResponse(value=location)
+
+
+def serve(port=0, latency=0.0, max_workers=16, devices=100, probes_per_device=4, seed=0, error_rate=0.0, slow_rate=0.0, slow_latency=0.0):
+    """
+    Starts an insecure fake CVP server on localhost serving a synthetic
+    fleet of devices. latency seconds are added to every request, and
+    resource API requests fail or are slow at the given fault rates.
+    Returns (server, address, servicers)
+    """
+    fleet = SyntheticFleet(devices, probes_per_device, seed)
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=max_workers))
+    servicers = {
+        "fleet": fleet,
+        "router": FakeRouter(latency),
+        "device": FakeDeviceService(fleet, latency),
+        "bug_exposure": FakeBugExposureService(fleet, latency),
+        "probe_stats": FakeProbeStatsService(fleet, latency),
+        "lifecycle": FakeDeviceLifecycleSummaryService(fleet, latency),
+        "endpoint_location": FakeEndpointLocationService(fleet, latency),
+    }
+    for servicer in servicers.values():
+        if isinstance(servicer, FakeService):
+            servicer.error_rate = error_rate
+            servicer.slow_rate = slow_rate
+            servicer.slow_latency = slow_latency
+    rtr_client.add_RouterV1Servicer_to_server(servicers["router"], server)
+    inventory_services.add_DeviceServiceServicer_to_server(servicers["device"], server)
+    bug_services.add_BugExposureServiceServicer_to_server(servicers["bug_exposure"], server)
+    probe_services.add_ProbeStatsServiceServicer_to_server(servicers["probe_stats"], server)
+    lifecycle_services.add_DeviceLifecycleSummaryServiceServicer_to_server(servicers["lifecycle"], server)
+    endpoint_services.add_EndpointLocationServiceServicer_to_server(servicers["endpoint_location"], server)
+    bound_port = server.add_insecure_port(f"localhost:{port}")
+    server.start()
+    return server, f"localhost:{bound_port}", servicers
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Serve a synthetic fleet as a fake CVP")
+    parser.add_argument("--port", type=int, default=0, help="Port to listen on, 0 picks a free port")
+    parser.add_argument("--devices", type=int, default=100, help="Number of devices in the synthetic fleet")
+    parser.add_argument("--probes-per-device", type=int, default=4, help="Connectivity probes per device")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds of injected latency per request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests failing with UNAVAILABLE")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Fraction of requests delayed by --slow-latency")
+    parser.add_argument("--slow-latency", type=float, default=0.0, help="Extra seconds taken by slow requests")
+    args = parser.parse_args()
+    server, address, _ = serve(
+        args.port, args.latency, devices=args.devices, probes_per_device=args.probes_per_device,
+        error_rate=args.error_rate, slow_rate=args.slow_rate, slow_latency=args.slow_latency,
+    )
+    # The first line of output is the address, for scripts starting this server
+    print(address, flush=True)
+    server.wait_for_termination()
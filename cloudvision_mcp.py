@@ -1,18 +1,30 @@
 #!/usr/bin/python3
 
 from mcp.server.fastmcp import FastMCP
-from typing import TypedDict, Optional
-from cvp_mcp.grpc.inventory import grpc_all_inventory, grpc_one_inventory_serial
-from cvp_mcp.grpc.bugs import grpc_all_bug_exposure
-from cvp_mcp.grpc.monitor import grpc_all_probe_status, grpc_one_probe_status
-from cvp_mcp.grpc.lifecycle import grpc_all_device_lifecycle
-from cvp_mcp.grpc.endpoint import grpc_one_endpoint_location
-from cvp_mcp.grpc.models import SwitchInfo, BugExposure, DeviceLifecycleSummary
+from typing import Optional
+from cvp_mcp.grpc.monitor import iter_all_probe_status_async, grpc_one_probe_status_async
+from cvp_mcp.grpc.lifecycle import iter_all_device_lifecycle_async
+from cvp_mcp.grpc import pipeline
+from cvp_mcp.grpc.models import switch_to_dict
 from cvp_mcp.grpc.connector import conn_get_info_bugs
-from cvp_mcp.grpc.utils import createConnection
+from cvp_mcp.grpc.channel import get_channel, get_aio_channel
+from cvp_mcp.grpc.retry import rpc_policy
+from cvp_mcp.grpc.cache import inventory_cache, bug_info_cache, endpoint_cache, probe_history
+from cvp_mcp.grpc.snapshot import snapshot_store, snapshot_all_probe_status_async
+from cvp_mcp.grpc.index import bug_exposure_index, lifecycle_index, index_warmer, normalize_exposure, normalize_milestone, date_to_epoch, EXPOSURE_KINDS
+from cvp_mcp.grpc.utils import convert_response_to_lifecycle_record, format_device_lifecycle, format_epoch
+from cvp_mcp.grpc.analytics import summarize_probes, probe_group_column
+from cvp_mcp.grpc.inventory import paginate_inventory
+from cvp_mcp.grpc import utils
+from cvp_mcp.singleflight import coalesce, single_flight
+from cvp_mcp.deadline import with_deadline
+from cvp_mcp import deadline
+from cvp_mcp.output import tool_output, debug_json
+from cvp_mcp.metrics import tool_metrics, registry, PROMETHEUS_CONTENT_TYPE
+from starlette.requests import Request
+from starlette.responses import Response
 import argparse
-import grpc
-import json
+import asyncio
 import sys
 import logging
 import os
@@ -43,14 +55,19 @@ def get_env_vars():
     datadict['cvtoken'] = cvtoken
     datadict["cvp"] = cvp
     datadict["cert"] = certfile
+    # Plaintext gRPC, only for local test servers such as benchmarks/fake_cvp.py
+    datadict["insecure"] = os.environ.get("CVP_INSECURE", "").lower() in ("1", "true", "yes")
     return datadict
 
 # ===================================================
 # Inventory Based Tools
 # ===================================================
 
-@mcp.tool()
-def get_cvp_one_device(device_id) -> str:
+@mcp.tool(structured_output=False)
+@tool_output(record=True)
+@coalesce
+@with_deadline
+async def get_cvp_one_device(device_id) -> dict:
     """
     Prints out information about a single device in CVP
     For one switch it gets the serial number, system mac address,
@@ -59,41 +76,142 @@ def get_cvp_one_device(device_id) -> str:
     """
     datadict = get_env_vars()
     logging.debug(f"CVP Get One Device Tool - {device_id}")
+    device = {}
     try:
         match CVP_TRANSPORT:
             case "grpc":
-                connCreds = createConnection(datadict)
-                with grpc.secure_channel(datadict["cvp"], connCreds) as channel:
-                    device = grpc_one_inventory_serial(channel, device_id)
+                channel = get_aio_channel(datadict)
+                device = switch_to_dict(await inventory_cache.get_one_async(channel, device_id))
             case "http":
                 device = ""
     except Exception as e:
         logging.error(e)
-    logging.debug(json.dumps(device, indent=2))
-    return(json.dumps(device, indent=2))
+    return(device)
     
-@mcp.tool()
-def get_cvp_all_inventory() -> dict:
+@mcp.tool(structured_output=False)
+@tool_output("devices")
+@coalesce
+@with_deadline
+async def get_cvp_devices(device_ids: list[str]) -> dict:
+    """
+    Gets information about many devices in CVP at once by serial number,
+    use this instead of calling get_cvp_one_device repeatedly.
+    For each switch it gets the serial number, system mac address,
+    hostname, EOS version, streaming status, device type, harware revision,
+    FQDN, domain name, and model. Serial numbers that were not found are listed
+    in not_found.
+    """
+    datadict = get_env_vars()
+    all_data = {"devices": {}, "not_found": []}
+    logging.info(f"CVP Get Devices Tool for {len(device_ids)} devices")
+    match CVP_TRANSPORT:
+        case "grpc":
+            channel = get_aio_channel(datadict)
+            devices = await inventory_cache.get_many_async(channel, device_ids)
+            for device_id, device in devices.items():
+                if device:
+                    all_data["devices"][device_id] = switch_to_dict(device)
+                else:
+                    all_data["not_found"].append(device_id)
+        case "http":
+            logging.info("CVP HTTP Request for devices")
+    return(all_data)
+
+@mcp.tool(structured_output=False)
+@tool_output("devices")
+@coalesce
+@with_deadline
+async def get_cvp_devices_by_hostname(hostnames: list[str]) -> dict:
+    """
+    Gets information about devices in CVP by hostname, for many hostnames at once.
+    Hostnames are matched exactly but case-insensitively, each hostname maps to
+    the list of switches using it. Hostnames that were not found are listed in
+    not_found.
+    """
+    datadict = get_env_vars()
+    all_data = {"devices": {}, "not_found": []}
+    logging.info(f"CVP Get Devices By Hostname Tool for {len(hostnames)} hostnames")
+    match CVP_TRANSPORT:
+        case "grpc":
+            channel = get_aio_channel(datadict)
+            devices = await inventory_cache.get_by_async(channel, "hostname", hostnames)
+            for hostname, switches in devices.items():
+                if switches:
+                    all_data["devices"][hostname] = [switch_to_dict(switch) for switch in switches]
+                else:
+                    all_data["not_found"].append(hostname)
+        case "http":
+            logging.info("CVP HTTP Request for devices by hostname")
+    return(all_data)
+
+@mcp.tool(structured_output=False)
+@tool_output("devices")
+@coalesce
+@with_deadline
+async def get_cvp_devices_by_mac(system_macs: list[str]) -> dict:
+    """
+    Gets information about devices in CVP by system MAC address, for many MACs at once.
+    MACs may be written as aa:bb:cc:dd:ee:ff, aa-bb-cc-dd-ee-ff or aabb.ccdd.eeff.
+    System MACs that were not found are listed in not_found.
+    """
+    datadict = get_env_vars()
+    all_data = {"devices": {}, "not_found": []}
+    logging.info(f"CVP Get Devices By MAC Tool for {len(system_macs)} MACs")
+    match CVP_TRANSPORT:
+        case "grpc":
+            channel = get_aio_channel(datadict)
+            devices = await inventory_cache.get_by_async(channel, "system_mac", system_macs)
+            for system_mac, switches in devices.items():
+                if switches:
+                    all_data["devices"][system_mac] = switch_to_dict(switches[0])
+                else:
+                    all_data["not_found"].append(system_mac)
+        case "http":
+            logging.info("CVP HTTP Request for devices by MAC")
+    return(all_data)
+
+@mcp.tool(structured_output=False)
+@tool_output("streaming_active", "streaming_inactive")
+@coalesce
+@with_deadline
+async def get_cvp_all_inventory(
+    model: Optional[str] = None,
+    version: Optional[str] = None,
+    hostname: Optional[str] = None,
+    device_type: Optional[str] = None,
+    streaming_status: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None) -> dict:
     """
     Grabs all switches and devices from CloudVision (CVP)
     For all devices it gets the serial number, system mac address,
     hostname, EOS version, streaming status, device type, harware revision,
     FQDN, domain name, and model
+    Results can be filtered by model, EOS version, hostname (glob such as leaf*),
+    device type (EOS, Virtual EOS, Access Point, Third Party) and streaming
+    status (Active, Inactive). When limit is set, devices are returned in
+    serial number order with a next_cursor to pass as cursor for the next page.
     """
+    if limit is not None and (not isinstance(limit, int) or limit < 1):
+        raise ValueError("limit must be a positive integer")
+    if cursor is not None and not isinstance(cursor, str):
+        raise ValueError("cursor must be the next_cursor string of a previous page")
     datadict = get_env_vars()
     all_devices = {}
+    filters = dict(model=model, version=version, hostname=hostname, device_type=device_type, streaming_status=streaming_status)
     logging.info("CVP Get all Tool")
     match CVP_TRANSPORT:
         case "grpc":
-            connCreds = createConnection(datadict)
-            with grpc.secure_channel(datadict["cvp"], connCreds) as channel:
-                all_active, all_inactive = grpc_all_inventory(channel)
-                all_devices["streaming_active"] = all_active
-                all_devices["streaming_inactive"] = all_inactive
+            channel = get_aio_channel(datadict)
+            switches = await inventory_cache.get_filtered_async(channel, **filters)
+            page, next_cursor = paginate_inventory(switches, limit, cursor)
+            all_devices["streaming_active"] = [switch_to_dict(switch) for switch in page if switch["streaming_status"] == "Active"]
+            all_devices["streaming_inactive"] = [switch_to_dict(switch) for switch in page if switch["streaming_status"] == "Inactive"]
+            if limit:
+                all_devices["next_cursor"] = next_cursor
         case "http":
             logging.info("CVP HTTP Request for all devices")
             all_devices = ""
-    logging.debug(json.dumps(all_devices))    
     # return(json.dumps(all_devices, indent=2))
     return(all_devices)
 
@@ -101,8 +219,11 @@ def get_cvp_all_inventory() -> dict:
 # Bug Based Tools
 # ===================================================
 
-@mcp.tool()
-def get_cvp_all_bugs() -> dict:
+@mcp.tool(structured_output=False)
+@tool_output("bugs", "devices", "bug_info")
+@coalesce
+@with_deadline
+async def get_cvp_all_bugs() -> dict:
     """
     Prints out all bug exposures
     For each bug, it gets: device serial number, list of bug IDs,
@@ -111,53 +232,154 @@ def get_cvp_all_bugs() -> dict:
     It will get  the serial number, system mac address,
     hostname, EOS version, streaming status, device type, harware revision,
     FQDN, domain name, and model
+    Bugs are served from the last snapshot, index_age_seconds gives its age
     """
     all_data = {}
     all_devices = []
     all_bug_ids = []
-    # all_bug_info = {}
+    all_bug_info = {}
     datadict = get_env_vars()
     logging.info("CVP Get all Bugs Tool")
     match CVP_TRANSPORT:
         case "grpc":
-            connCreds = createConnection(datadict)
-            with grpc.secure_channel(datadict["cvp"], connCreds) as channel:
-                all_bugs = grpc_all_bug_exposure(channel)
-                if all_bugs:
-                    for bug in all_bugs:
-                        for id in bug["bug_ids"]:
-                            if id not in all_bug_ids:
-                                all_bug_ids.append(id)
-                        device = grpc_one_inventory_serial(channel, bug["serial_number"])
-                        if device:
-                            all_devices.append(device)
+            channel = get_aio_channel(datadict)
+            # Served from the last bug exposure snapshot, a stale one is refreshed in the background
+            await bug_exposure_index.ensure_warm_async(lambda: get_channel(datadict))
+            all_bugs = bug_exposure_index.all_records()
+            all_data["index_age_seconds"] = bug_exposure_index.stats()["age_seconds"]
+            all_data["index_refreshing"] = bug_exposure_index.refreshing()
+            serial_numbers = [bug["serial_number"] for bug in all_bugs]
+            bug_ids = {}
+            for bug in all_bugs:
+                bug_ids.update(dict.fromkeys(bug["bug_ids"]))
+            if all_bugs:
+                all_bug_ids = list(bug_ids)
+                # The device lookups and the information about each bug are independent
+                devices, all_bug_info = await asyncio.gather(
+                    inventory_cache.get_many_async(channel, serial_numbers),
+                    # The Connector client is synchronous, keep it off the event loop
+                    asyncio.to_thread(conn_get_info_bugs, datadict, all_bug_ids),
+                )
+                all_devices = [switch_to_dict(device) for device in devices.values() if device]
         case "http":
             logging.info("HTTP Transport to get all bugs")
             all_bugs = ""
-    logging.debug(json.dumps(all_bugs))    
-    # Grab information about each bug
-    all_bug_info = conn_get_info_bugs(datadict, all_bug_ids)
+    debug_json("All bugs: ", all_bugs)
     all_data["bug_info"] = all_bug_info
     all_data['bugs'] = all_bugs
     all_data['devices'] = all_devices
     try:
-        logging.debug(f"Bug Data: {type(all_data['bug_info'])} {all_data['bug_info']}")
-        logging.debug(f"All data: {json.dumps(all_data)}")
+        debug_json(f"Bug Data: {type(all_data['bug_info'])} ", all_data['bug_info'])
+        debug_json("All data: ", all_data)
     except Exception as y:
         logging.error(y)
     # return(json.dumps(all_data, indent=2))
     return(all_data)
 
 
+async def describe_exposed_devices(channel, serial_numbers, limit=None):
+    """Pairs each exposed serial number with its exposure and inventory details"""
+    all_data = {"count": len(serial_numbers), "index_age_seconds": bug_exposure_index.stats()["age_seconds"]}
+    if limit is not None:
+        serial_numbers = serial_numbers[:limit]
+    devices = await inventory_cache.get_many_async(channel, serial_numbers)
+    all_devices = []
+    for exposure in bug_exposure_index.records(serial_numbers):
+        device = devices.get(exposure["serial_number"])
+        all_devices.append({
+            "serial_number": exposure["serial_number"],
+            "hostname": device["hostname"] if device else "",
+            "model": device["model"] if device else "",
+            "version": device["version"] if device else "",
+            "bug_count": exposure["bug_count"],
+            "cve_count": exposure["cve_count"],
+            "highest_bug_exposure": exposure["highest_bug_exposre"],
+            "highest_cve_exposure": exposure["highest_cve_exposure"],
+        })
+    all_data["devices"] = all_devices
+    return(all_data)
+
+@mcp.tool(structured_output=False)
+@tool_output("devices")
+@coalesce
+@with_deadline
+async def get_cvp_devices_exposed_to_bug(
+    bug_id: Optional[int] = None,
+    cve_id: Optional[int] = None,
+    limit: Optional[int] = None) -> dict:
+    """
+    Lists the devices exposed to one bug ID and/or one CVE ID
+    For each device it gets the hostname, model, EOS version, bug and CVE
+    counts and the highest bug and CVE exposure. When both IDs are given
+    only devices exposed to both are listed. Answers from an index of all
+    bug exposures instead of pulling every bug, use this rather than
+    get_cvp_all_bugs for targeted questions
+    """
+    if bug_id is None and cve_id is None:
+        raise ValueError("bug_id or cve_id is required")
+    datadict = get_env_vars()
+    all_data = {}
+    logging.info("CVP Get Devices Exposed To Bug")
+    match CVP_TRANSPORT:
+        case "grpc":
+            channel = get_aio_channel(datadict)
+            await bug_exposure_index.ensure_warm_async(lambda: get_channel(datadict))
+            serial_numbers = bug_exposure_index.devices_exposed_to(bug_id, cve_id)
+            all_data = await describe_exposed_devices(channel, serial_numbers, limit)
+        case "http":
+            logging.info("HTTP Transport to get exposed devices")
+    all_data["bug_id"] = bug_id
+    all_data["cve_id"] = cve_id
+    return(all_data)
+
+@mcp.tool(structured_output=False)
+@tool_output("devices")
+@coalesce
+@with_deadline
+async def get_cvp_devices_by_exposure(
+    exposure: str = "High",
+    exposure_type: str = "cve",
+    limit: Optional[int] = None) -> dict:
+    """
+    Lists the devices whose highest bug or CVE exposure is a given level
+    exposure is one of High, Low, None or Unspecified and exposure_type is
+    bug or cve. For each device it gets the hostname, model, EOS version,
+    bug and CVE counts and the highest bug and CVE exposure. Answers from
+    an index of all bug exposures instead of pulling every bug
+    """
+    # Reject unknown levels before the index is refreshed
+    exposure = normalize_exposure(exposure)
+    if exposure_type not in EXPOSURE_KINDS:
+        raise ValueError(f"exposure_type must be one of {', '.join(EXPOSURE_KINDS)}")
+    datadict = get_env_vars()
+    all_data = {}
+    logging.info("CVP Get Devices By Exposure")
+    match CVP_TRANSPORT:
+        case "grpc":
+            channel = get_aio_channel(datadict)
+            await bug_exposure_index.ensure_warm_async(lambda: get_channel(datadict))
+            serial_numbers = bug_exposure_index.devices_with_exposure(exposure, exposure_type)
+            all_data = await describe_exposed_devices(channel, serial_numbers, limit)
+        case "http":
+            logging.info("HTTP Transport to get exposed devices")
+    all_data["exposure"] = exposure
+    all_data["exposure_type"] = exposure_type
+    return(all_data)
+
+
 # ===================================================
 # Commectivty Monitor Based Tools
 # ===================================================
 
-@mcp.tool()
-def get_cvp_all_connectivity_probes() -> dict:
+@mcp.tool(structured_output=False)
+@tool_output("probes", "devices")
+@coalesce
+@with_deadline
+async def get_cvp_all_connectivity_probes(limit: Optional[int] = None) -> dict:
     """
     Gets all connectivity monitor probes from CVP
     Displays latency, jitter, http response time and packet loss
+    Set limit to only return the first probes
     """
     datadict = get_env_vars()
     all_devices = {}
@@ -165,29 +387,28 @@ def get_cvp_all_connectivity_probes() -> dict:
     logging.info("CVP Get all Probes")
     match CVP_TRANSPORT:
         case "grpc":
-            connCreds = createConnection(datadict)
-            with grpc.secure_channel(datadict["cvp"], connCreds) as channel:
-                all_probes= grpc_all_probe_status(channel)
-                # Gather information about the source switches for analytics
-                for probe in all_probes:
-                    serial_number = probe['serial_number']
-                    if serial_number not in all_devices.keys():
-                        all_devices[serial_number] = grpc_one_inventory_serial(channel, serial_number)
+            channel = get_aio_channel(datadict)
+            all_probes= await pipeline.collect(pipeline.limit(iter_all_probe_status_async(channel), limit))
+            # Gather information about the source switches for analytics
+            devices = await inventory_cache.get_many_async(channel, [probe['serial_number'] for probe in all_probes])
+            all_devices = {serial_number: switch_to_dict(device) for serial_number, device in devices.items()}
         case "http":
             logging.info("CVP HTTP Request for all devices")
             all_devices = ""
     all_data['devices'] = all_devices
     all_data['probes'] = all_probes
-    logging.debug(json.dumps(all_data))    
     # return(json.dumps(all_data, indent=2))
     return(all_data)
 
-@mcp.tool()
-def get_cvp_one_connectivity_probe(
+@mcp.tool(structured_output=False)
+@tool_output("probes", "devices")
+@coalesce
+@with_deadline
+async def get_cvp_one_connectivity_probe(
     serial_number: Optional[str] = None,
     endpoint: Optional[str] = None,
     vrf: Optional[str] = None,
-    source_interface: Optional[str] = None) -> str:
+    source_interface: Optional[str] = None) -> dict:
     """
     Prints out information about a single device in CVP
     Displays latency, jitter, http response time and packet loss
@@ -199,34 +420,96 @@ def get_cvp_one_connectivity_probe(
     try:
         match CVP_TRANSPORT:
             case "grpc":
-                connCreds = createConnection(datadict)
-                with grpc.secure_channel(datadict["cvp"], connCreds) as channel:
-                    probes = grpc_one_probe_status(channel, serial_number, endpoint, vrf, source_interface)
-                    for _probe in probes:
-                        logging.debug(f"MON S/n: {_probe['serial_number']}")
-                        serial_number = _probe['serial_number']
-                        if serial_number  not in all_devices.keys():
-                            all_devices[serial_number]= grpc_one_inventory_serial(channel, serial_number)
-                    all_data['probes'] = probes
-                    all_data['devices'] = all_devices
+                channel = get_aio_channel(datadict)
+                probes = await grpc_one_probe_status_async(channel, serial_number, endpoint, vrf, source_interface)
+                devices = await inventory_cache.get_many_async(channel, [_probe['serial_number'] for _probe in probes])
+                all_devices = {serial_number: switch_to_dict(device) for serial_number, device in devices.items()}
+                all_data['probes'] = probes
+                all_data['devices'] = all_devices
             case "http":
                 device = ""
     except Exception as e:
         logging.error(e)
-    logging.debug(json.dumps(all_data, indent=2))
-    return(json.dumps(all_data, indent=2))
+    return(all_data)
 
 
+@mcp.tool(structured_output=False)
+@tool_output("worst_latency_groups", "worst_loss_groups", "worst_latency_probes", "worst_loss_probes", "devices")
+@coalesce
+@with_deadline
+async def get_cvp_connectivity_probe_summary(
+    group_by: str = "device",
+    top: int = 10,
+    serial_number: Optional[str] = None,
+    vrf: Optional[str] = None,
+    host: Optional[str] = None) -> dict:
+    """
+    Summarizes all connectivity monitor probes from CVP instead of listing them
+    Gives p50/p95/max latency and jitter and packet loss overall, the top
+    groups by p95 latency and by packet loss, and the top probes by latency
+    and by loss. group_by is one of device, vrf, host or source_interface,
+    top is how many groups and probes to return. Can be narrowed to one
+    device serial number, VRF or probed host.
+    """
+    # Reject an unknown group_by before streaming every probe
+    probe_group_column(group_by)
+    datadict = get_env_vars()
+    all_data = {}
+    logging.info("CVP Get Probe Summary")
+    match CVP_TRANSPORT:
+        case "grpc":
+            channel = get_aio_channel(datadict)
+            table = await snapshot_all_probe_status_async(channel)
+            all_data = summarize_probes(table, group_by, top, serial_number, vrf, host)
+            if group_by == "device":
+                # Name the worst devices, the summary only carries serial numbers
+                serial_numbers = [group["device"] for group in all_data["worst_latency_groups"] + all_data["worst_loss_groups"]]
+                devices = await inventory_cache.get_many_async(channel, serial_numbers)
+                all_data["devices"] = {serial_number: switch_to_dict(device) for serial_number, device in devices.items()}
+        case "http":
+            logging.info("CVP HTTP Request for probe summary")
+    return(all_data)
+
+@mcp.tool(structured_output=False)
+@tool_output("probes")
+@coalesce
+@with_deadline
+async def get_cvp_connectivity_probe_trend(
+    minutes: int = 15,
+    metric: str = "latency_millis",
+    serial_number: Optional[str] = None,
+    host: Optional[str] = None,
+    vrf: Optional[str] = None,
+    source_interface: Optional[str] = None,
+    top: int = 10) -> dict:
+    """
+    Shows how connectivity monitor probes changed over the last minutes
+    metric is one of latency_millis, jitter_millis, http_response_time_millis
+    or packet_loss_percent. For the top probes by average it gives the first,
+    last, min, max and mean value, the change and a short time series.
+    Answers from the live probe history kept by this server, not from CVP
+    """
+    logging.info("CVP Get Probe Trend")
+    if not probe_history.running:
+        return({"error": "Probe history is disabled, start the server with --probe-history-minutes above 0"})
+    all_data = probe_history.trend(minutes, metric, serial_number, host, vrf, source_interface, top)
+    return(all_data)
+
 # ===================================================
 # Device Lifecycle Based Tools
 # ===================================================
 
-@mcp.tool()
-def get_cvp_all_device_lifecycle()-> dict:
+@mcp.tool(structured_output=False)
+@tool_output("lifecycle", "devices")
+@coalesce
+@with_deadline
+async def get_cvp_all_device_lifecycle(limit: Optional[int] = None)-> dict:
     """
     Gets all device lifecycle from CVP
     Displays information about switch software end of life,
     and hardware end of support, end of rma, end of sale and end of life.
+    Set limit to only return the first devices
+    Devices are served from the last snapshot, index_age_seconds gives its age
     """
     datadict = get_env_vars()
     all_devices = {}
@@ -234,29 +517,100 @@ def get_cvp_all_device_lifecycle()-> dict:
     logging.info("CVP Get all Device Lifecycle")
     match CVP_TRANSPORT:
         case "grpc":
-            connCreds = createConnection(datadict)
-            with grpc.secure_channel(datadict["cvp"], connCreds) as channel:
-                all_lifecycle = grpc_all_device_lifecycle(channel)
-                # Gather information about the source switches for analytics
-                for _lifecycle in all_lifecycle:
-                    serial_number = _lifecycle['serial_number']
-                    if serial_number not in all_devices.keys():
-                        all_devices[serial_number] = grpc_one_inventory_serial(channel, serial_number)
+            channel = get_aio_channel(datadict)
+            if limit is not None and lifecycle_index.refreshed_at is None:
+                # Only stream the first devices rather than loading the whole index
+                records = await pipeline.collect(pipeline.limit(iter_all_device_lifecycle_async(channel, convert_response_to_lifecycle_record), limit))
+            else:
+                # Served from the last lifecycle snapshot, a stale one is refreshed in the background
+                await lifecycle_index.ensure_warm_async(lambda: get_channel(datadict))
+                records = lifecycle_index.all_records()[:limit]
+                all_data["index_age_seconds"] = lifecycle_index.stats()["age_seconds"]
+                all_data["index_refreshing"] = lifecycle_index.refreshing()
+            all_lifecycle = [format_device_lifecycle(record) for record in records]
+            # Gather information about the source switches for analytics
+            devices = await inventory_cache.get_many_async(channel, [_lifecycle['serial_number'] for _lifecycle in all_lifecycle])
+            all_devices = {serial_number: switch_to_dict(device) for serial_number, device in devices.items()}
         case "http":
             logging.info("CVP HTTP Request for all devices")
             all_devices = ""
     all_data['devices'] = all_devices
     all_data['lifecycle'] = all_lifecycle
-    logging.debug(json.dumps(all_data))    
     # return(json.dumps(all_data, indent=2))
     return(all_data)
 
+@mcp.tool(structured_output=False)
+@tool_output("devices")
+@coalesce
+@with_deadline
+async def get_cvp_devices_by_lifecycle_date(
+    before: str,
+    milestone: str = "end_of_support",
+    after: Optional[str] = None,
+    limit: Optional[int] = None) -> dict:
+    """
+    Lists the devices reaching a lifecycle milestone before a date, earliest first
+    milestone is one of end_of_support (EOS software), end_of_life, end_of_sale,
+    end_of_tac_support or end_of_hardware_rma_request. before and after are
+    dates as YYYY-MM-DD, after is optional and excludes earlier dates.
+    For each device it gets the hostname, the milestone date and its full
+    software and hardware lifecycle.
+    """
+    # Reject bad arguments before the index is refreshed
+    milestone = normalize_milestone(milestone)
+    before_epoch = date_to_epoch(before)
+    after_epoch = date_to_epoch(after) if after else None
+    datadict = get_env_vars()
+    all_data = {}
+    logging.info("CVP Get Devices By Lifecycle Date")
+    match CVP_TRANSPORT:
+        case "grpc":
+            channel = get_aio_channel(datadict)
+            await lifecycle_index.ensure_warm_async(lambda: get_channel(datadict))
+            records = lifecycle_index.between(milestone, before_epoch, after_epoch)
+            all_data["count"] = len(records)
+            all_data["index_age_seconds"] = lifecycle_index.stats()["age_seconds"]
+            if limit is not None:
+                records = records[:limit]
+            devices = await inventory_cache.get_many_async(channel, [record["serial_number"] for record in records])
+            # Only the returned rows are formatted
+            all_data["devices"] = [
+                {
+                    "serial_number": record["serial_number"],
+                    "hostname": devices[record["serial_number"]]["hostname"] if devices.get(record["serial_number"]) else "",
+                    milestone: format_epoch(record[milestone]),
+                    "lifecycle": format_device_lifecycle(record),
+                }
+                for record in records
+            ]
+        case "http":
+            logging.info("CVP HTTP Request for lifecycle dates")
+    all_data["milestone"] = milestone
+    all_data["before"] = before
+    all_data["after"] = after
+    return(all_data)
+
 # ===================================================
 # Endpoint Location  Based Tools
 # ===================================================
 
-@mcp.tool()
-def get_cvp_endpoint_location(search_term: str)-> dict:
+def endpoint_serial_numbers(endpoints):
+    """
+    Serial numbers of the switches each endpoint location was seen on
+    """
+    serial_numbers = []
+    for _endpoint in endpoints:
+        _endpoint = _endpoint[0]
+        debug_json("END FOR: ", _endpoint)
+        for _device in _endpoint["location_list"]:
+            serial_numbers.append(_device['device_id']['value'])
+    return(serial_numbers)
+
+@mcp.tool(structured_output=False)
+@tool_output("endpoints", "devices")
+@coalesce
+@with_deadline
+async def get_cvp_endpoint_location(search_term: str)-> dict:
     """
     Gets all endpoint locations from CVP for a user device, or connected endpoint
      based on a query of MAC, IP or hostname
@@ -266,30 +620,95 @@ def get_cvp_endpoint_location(search_term: str)-> dict:
     """
     datadict = get_env_vars()
     all_devices = {}
+    all_endpoints = []
     all_data = {}
     logging.info("CVP Get Endpoint Location")
     match CVP_TRANSPORT:
         case "grpc":
-            connCreds = createConnection(datadict)
-            with grpc.secure_channel(datadict["cvp"], connCreds) as channel:
-                all_endpoints = grpc_one_endpoint_location(channel, search_term)
-                # Gather information about the source switches for analytics
-                for _endpoint in all_endpoints:
-                    _endpoint = _endpoint[0]
-                    logging.debug(f"END FOR: {_endpoint} - {_endpoint.keys()}")
-                    for _device in _endpoint["location_list"]:
-                        serial_number = _device['device_id']['value']
-                        if serial_number not in all_devices.keys():
-                            all_devices[serial_number] = grpc_one_inventory_serial(channel, serial_number)
+            channel = get_aio_channel(datadict)
+            try:
+                all_endpoints = await endpoint_cache.lookup_async(channel, search_term)
+            except Exception as e:
+                logging.error(f"Error with Endpoint Location: {e}")
+            # Gather information about the source switches for analytics
+            devices = await inventory_cache.get_many_async(channel, endpoint_serial_numbers(all_endpoints))
+            all_devices = {serial_number: switch_to_dict(device) for serial_number, device in devices.items()}
         case "http":
             logging.info("CVP HTTP Request for all devices")
             all_devices = ""
     all_data['devices'] = all_devices
     all_data['endpoints'] = all_endpoints
-    logging.debug(json.dumps(all_data))    
     # return(json.dumps(all_data, indent=2))
     return(all_data)
 
+@mcp.tool(structured_output=False)
+@tool_output("endpoints", "devices")
+@coalesce
+@with_deadline
+async def get_cvp_endpoint_locations(search_terms: list[str])-> dict:
+    """
+    Gets endpoint locations from CVP for many user devices or connected endpoints
+     in one call, each search term is a MAC, IP or hostname
+    Returns the endpoints found for each search term, the search terms that
+    matched nothing or failed, and information about every switch the
+    endpoints were seen on.
+    """
+    datadict = get_env_vars()
+    all_devices = {}
+    all_data = {"endpoints": {}, "not_found": [], "errors": []}
+    logging.info(f"CVP Get Endpoint Locations for {len(search_terms)} search terms")
+    match CVP_TRANSPORT:
+        case "grpc":
+            channel = get_aio_channel(datadict)
+            results = await endpoint_cache.lookup_many_async(channel, search_terms)
+            serial_numbers = []
+            for search_term, endpoints in results.items():
+                if endpoints is None:
+                    all_data["errors"].append(search_term)
+                elif not endpoints:
+                    all_data["not_found"].append(search_term)
+                else:
+                    all_data["endpoints"][search_term] = endpoints
+                    serial_numbers.extend(endpoint_serial_numbers(endpoints))
+            devices = await inventory_cache.get_many_async(channel, serial_numbers)
+            all_devices = {serial_number: switch_to_dict(device) for serial_number, device in devices.items()}
+        case "http":
+            logging.info("CVP HTTP Request for endpoint locations")
+            all_devices = ""
+    all_data['devices'] = all_devices
+    return(all_data)
+
+# ===================================================
+# Server Based Tools
+# ===================================================
+
+@mcp.tool(structured_output=False)
+@tool_output()
+async def get_cvp_mcp_stats() -> dict:
+    """
+    Gets statistics about this MCP server's internal caches,
+    such as the number of cached devices, cache age and hit counts,
+    and how many identical concurrent tool calls were coalesced,
+    and the size of columnar fleet snapshots against plain dicts
+    """
+    all_stats = {}
+    all_stats["inventory_cache"] = inventory_cache.stats()
+    all_stats["bug_info_cache"] = bug_info_cache.stats()
+    all_stats["endpoint_cache"] = endpoint_cache.stats()
+    all_stats["coalesced_calls"] = single_flight.stats()
+    all_stats["bug_exposure_index"] = bug_exposure_index.stats()
+    all_stats["lifecycle_index"] = lifecycle_index.stats()
+    all_stats["index_warmer"] = index_warmer.stats()
+    all_stats["probe_history"] = probe_history.stats()
+    all_stats["snapshots"] = snapshot_store.stats()
+    all_stats["tool_output"] = tool_metrics.stats()
+    all_stats["rpc_policy"] = rpc_policy.stats()
+    return(all_stats)
+
+async def metrics_endpoint(request: Request) -> Response:
+    """Serves the metrics registry in the Prometheus text format"""
+    return Response(registry.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
 def main(args):
     """Entry point for the direct execution server."""
     global CVP_TRANSPORT
@@ -308,6 +727,48 @@ def main(args):
     if mcp_cvp == "http":
         logging.warning("HTTP connections to CVP are currently not supported")
         sys.exit(1)
+    utils.FAN_OUT_WORKERS = args.max_concurrency
+    deadline.TOOL_DEADLINE = args.tool_deadline
+    rpc_policy.retries = args.rpc_retries
+    rpc_policy.hedge_delay = args.hedge_after_ms / 1000
+    bug_info_cache.memory.maxsize = args.bug_cache_size
+    if args.bug_cache_path:
+        bug_info_cache.open(args.bug_cache_path)
+    endpoint_cache.memory.maxsize = args.endpoint_cache_size
+    endpoint_cache.hit_ttl = args.endpoint_hit_ttl
+    endpoint_cache.miss_ttl = args.endpoint_miss_ttl
+    if args.metrics:
+        registry.enabled = True
+        if mcp_transport == "http":
+            mcp.custom_route("/metrics", methods=["GET"])(metrics_endpoint)
+            logging.info("Serving Prometheus metrics on /metrics")
+        else:
+            logging.warning("Metrics are recorded but /metrics is only served with the http transport")
+    if args.device_types:
+        utils.configure_device_types(utils.load_device_type_rules(args.device_types))
+    inventory_cache.max_staleness = args.inventory_max_age
+    bug_exposure_index.max_age = args.index_max_age
+    lifecycle_index.max_age = args.index_max_age
+    index_warmer.interval = args.index_warm_interval
+    index_warmer.jitter = args.index_warm_jitter
+    if inventory_cache.enabled:
+        datadict = get_env_vars()
+        logging.info(f"Starting inventory cache with {args.inventory_max_age}s staleness bound")
+        inventory_cache.start(lambda: get_channel(datadict))
+    probe_history.window = args.probe_history_minutes * 60
+    if probe_history.enabled:
+        datadict = get_env_vars()
+        logging.info(f"Starting probe history with a {args.probe_history_minutes} minute window")
+        probe_history.start(lambda: get_channel(datadict))
+    if args.index_subscribe:
+        datadict = get_env_vars()
+        logging.info("Subscribing to bug exposure and lifecycle changes for the indexes")
+        bug_exposure_index.start(lambda: get_channel(datadict))
+        lifecycle_index.start(lambda: get_channel(datadict))
+    elif index_warmer.interval > 0:
+        datadict = get_env_vars()
+        logging.info(f"Refreshing the bug exposure and lifecycle indexes every {args.index_warm_interval}s")
+        index_warmer.start(lambda: get_channel(datadict))
     if mcp_transport == "http":
         mcp.settings.port = mcp_port
         logging.info(f"Streamable HTTP Server listening on port {mcp_port}")
@@ -321,5 +782,22 @@ if __name__ == "__main__":
     parser.add_argument("-p", "--port", type=int, help="Port to run the Streamable HTTP Server", default=8000, required=False)
     parser.add_argument("-c", "--cvp", type=str, help="CVP Connection protocol", choices=["grpc", "http"], default="grpc", required=False)
     parser.add_argument("-d", "--debug", help="Enable debug logging", action="store_true")
+    parser.add_argument("--inventory-max-age", type=int, help="Seconds cached inventory is served after its subscription drops, 0 disables the cache", default=300, required=False)
+    parser.add_argument("--max-concurrency", type=int, help="Maximum concurrent CVP requests made by one tool call", default=8, required=False)
+    parser.add_argument("--tool-deadline", type=float, help="Seconds one tool call may spend on CVP requests, 0 leaves each request its own timeout", default=60, required=False)
+    parser.add_argument("--rpc-retries", type=int, help="Retries of a CVP request failing with UNAVAILABLE or RESOURCE_EXHAUSTED", default=2, required=False)
+    parser.add_argument("--hedge-after-ms", type=int, help="Milliseconds before a slow single-record CVP lookup is hedged with a duplicate request, 0 disables hedging", default=0, required=False)
+    parser.add_argument("--bug-cache-size", type=int, help="Number of bugs kept in the in-memory bug info cache", default=4096, required=False)
+    parser.add_argument("--bug-cache-path", type=str, help="SQLite file used to persist bug info between restarts", default=None, required=False)
+    parser.add_argument("--endpoint-cache-size", type=int, help="Number of endpoint location searches kept in memory", default=4096, required=False)
+    parser.add_argument("--endpoint-hit-ttl", type=int, help="Seconds a found endpoint location is served from memory, 0 disables caching hits", default=300, required=False)
+    parser.add_argument("--endpoint-miss-ttl", type=int, help="Seconds an endpoint search that found nothing is served from memory, 0 disables negative caching", default=60, required=False)
+    parser.add_argument("--index-max-age", type=int, help="Seconds the bug exposure and lifecycle indexes are served before a tool starts a background refresh", default=300, required=False)
+    parser.add_argument("--index-subscribe", help="Keep the bug exposure and lifecycle indexes current with CVP Subscribe streams instead of periodic full refreshes", action=argparse.BooleanOptionalAction, default=True)
+    parser.add_argument("--index-warm-interval", type=int, help="Seconds between background full refreshes of the bug exposure and lifecycle indexes without --index-subscribe, 0 disables them", default=240, required=False)
+    parser.add_argument("--index-warm-jitter", type=int, help="Maximum random seconds added to each background index refresh interval", default=30, required=False)
+    parser.add_argument("--probe-history-minutes", type=int, help="Minutes of live probe stats kept for trends, 0 disables the probe subscription", default=15, required=False)
+    parser.add_argument("--metrics", help="Record tool and CVP RPC histograms and serve them on /metrics", action="store_true")
+    parser.add_argument("--device-types", type=str, help="JSON, or a JSON file, of extra device types to model substrings", default=None, required=False)
     args = parser.parse_args()
     main(args)
@@ -0,0 +1,87 @@
+import contextvars
+import functools
+import time
+
+# Seconds a tool call may spend on CVP RPCs, 0 leaves each RPC its own timeout
+TOOL_DEADLINE = 60
+
+
+class DeadlineExceeded(Exception):
+    """Raised instead of starting an RPC once the tool call's budget is spent"""
+
+
+class Budget:
+    """
+    Deadline shared by every RPC one tool call makes, and the RPCs that
+    ran out of time, so the tool result can say its data is incomplete
+    """
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.deadline = time.monotonic() + seconds
+        self.expired = {}
+
+    def remaining(self):
+        return self.deadline - time.monotonic()
+
+    def report(self):
+        return {
+            "budget_seconds": self.seconds,
+            "rpcs": dict(self.expired),
+        }
+
+
+_budget = contextvars.ContextVar("cvp_mcp_budget", default=None)
+
+
+def rpc_timeout(default):
+    """
+    Timeout for the next RPC: the time left in the current tool call's
+    budget, capped at default, or default outside a tool call.
+    Raises DeadlineExceeded when the budget is already spent.
+    """
+    budget = _budget.get()
+    if budget is None:
+        return default
+    remaining = budget.remaining()
+    if remaining <= 0:
+        raise DeadlineExceeded(f"Tool deadline of {budget.seconds}s exceeded")
+    return remaining if default is None else min(default, remaining)
+
+
+def remaining():
+    """Seconds left in the current tool call's budget, None outside a tool call"""
+    budget = _budget.get()
+    return None if budget is None else budget.remaining()
+
+
+def record_expired(name):
+    """Notes that the RPC name ran out of time in the current tool call"""
+    budget = _budget.get()
+    if budget is not None:
+        budget.expired[name] = budget.expired.get(name, 0) + 1
+
+
+def with_deadline(func):
+    """
+    Decorator for async tools that gives each call a TOOL_DEADLINE budget
+    passed down to every RPC it makes, including RPCs run through
+    asyncio.to_thread. When RPCs ran out of time a dict result gets a
+    deadline_exceeded entry naming them, instead of the missing data
+    passing silently as empty. Place it under coalesce so coalesced
+    callers share the budget and the report.
+    """
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        if TOOL_DEADLINE <= 0:
+            return await func(*args, **kwargs)
+        budget = Budget(TOOL_DEADLINE)
+        token = _budget.set(budget)
+        try:
+            result = await func(*args, **kwargs)
+        finally:
+            _budget.reset(token)
+        if budget.expired and isinstance(result, dict):
+            result["deadline_exceeded"] = budget.report()
+        return result
+    return wrapper
@@ -1,8 +1,21 @@
-from .inventory import grpc_all_inventory, grpc_one_inventory_serial
-from .bugs import grpc_all_bug_exposure
-from .monitor import grpc_all_probe_status, grpc_one_probe_status
-from .lifecycle import grpc_all_device_lifecycle
+from .inventory import grpc_all_inventory, grpc_one_inventory_serial, grpc_bulk_inventory_serial, grpc_subscribe_inventory
+from .inventory import grpc_all_inventory_async, grpc_one_inventory_serial_async, grpc_bulk_inventory_serial_async, grpc_bulk_inventory_async, grpc_filtered_inventory_async
+from .inventory import iter_all_inventory, iter_all_inventory_async, iter_filtered_inventory_async, filter_inventory, paginate_inventory
+from .bugs import grpc_all_bug_exposure, grpc_subscribe_bug_exposure, grpc_all_bug_exposure_async, iter_all_bug_exposure, iter_all_bug_exposure_async
+from .monitor import grpc_all_probe_status, grpc_one_probe_status, grpc_subscribe_probe_status, grpc_all_probe_status_async, grpc_one_probe_status_async, iter_all_probe_status, iter_all_probe_status_async
+from .lifecycle import grpc_all_device_lifecycle, grpc_subscribe_device_lifecycle, grpc_all_device_lifecycle_async, iter_all_device_lifecycle, iter_all_device_lifecycle_async
 from .connector import conn_get_info_bugs
-from .endpoint import grpc_one_endpoint_location
-from .utils import RPC_TIMEOUT, createConnection, serialize_repeated_int32, convert_response_to_switch, convert_response_to_device_lifecycle, serialize_arista_protobuf
-from .models import SwitchInfo, BugExposure, DeviceLifecycleSummary, DeviceHardwareEoL, DeviceSoftwareEoL, EndpointLocation
+from .endpoint import grpc_one_endpoint_location, grpc_one_endpoint_location_async
+from .utils import RPC_TIMEOUT, createConnection, serialize_repeated_int32, convert_response_to_switch, convert_response_to_device_lifecycle, serialize_arista_protobuf, subscription_operation, fan_out, fan_out_async, convert_response_to_bug_exposure
+from .utils import convert_response_to_lifecycle_record, format_device_lifecycle, format_epoch
+from .utils import classify_device_type, configure_device_types, load_device_type_rules, normalize_mac
+from .models import SwitchInfo, SwitchRecord, switch_to_dict, BugExposure, DeviceLifecycleSummary, DeviceLifecycleRecord, DeviceHardwareEoL, DeviceSoftwareEoL, EndpointLocation
+from .channel import ChannelManager, AioChannelManager, get_channel, get_aio_channel, get_channel_manager, shutdown_channel_manager, shutdown_aio_channel_manager
+from .subscriber import Subscriber
+from .retry import RpcPolicy, rpc_policy
+from .cache import LRUCache, InventoryCache, BugInfoCache, EndpointLocationCache, ProbeHistory, inventory_cache, bug_info_cache, endpoint_cache, probe_history
+from .pipeline import filter_records, enrich, project, limit, collect
+from .snapshot import ColumnarTable, StringColumn, SnapshotStore, snapshot_store, summarize, percentile
+from .snapshot import snapshot_all_probe_status, snapshot_all_probe_status_async
+from .analytics import summarize_probes, probe_group_column
+from .index import FleetIndex, BugExposureIndex, LifecycleIndex, IndexWarmer, bug_exposure_index, lifecycle_index, index_warmer, normalize_exposure, normalize_milestone, date_to_epoch
@@ -0,0 +1,90 @@
+"""
+Server-side statistics over ColumnarTable snapshots, so tools can return
+a compact summary instead of every raw record.
+"""
+from .snapshot import summarize
+
+# group_by names accepted by summarize_probes and the probe column each uses
+PROBE_GROUPS = {
+    "device": "serial_number",
+    "vrf": "vrf",
+    "host": "host",
+    "source_interface": "source_intf",
+}
+PROBE_KEY_FIELDS = ["serial_number", "host", "vrf", "source_intf"]
+PROBE_METRIC_FIELDS = ["latency_millis", "jitter_millis", "http_response_time_millis", "packet_loss_percent", "error"]
+# Digits kept on summarized floats, to keep tool output small
+SUMMARY_DIGITS = 3
+
+
+def _rounded(summary, fields=("min", "max", "mean", "p50", "p95")):
+    return {
+        name: round(value, SUMMARY_DIGITS) if name in fields and value is not None else value
+        for name, value in summary.items()
+    }
+
+def _metrics(latency, jitter, loss):
+    return {
+        "probes": loss["count"],
+        "latency_millis": _rounded({name: latency[name] for name in ("p50", "p95", "max")}),
+        "jitter_millis": _rounded({name: jitter[name] for name in ("p50", "p95", "max")}),
+        "packet_loss_percent": _rounded({name: loss[name] for name in ("mean", "max")}),
+    }
+
+def probe_group_column(group_by):
+    """Returns the probe column for a group_by name, raising ValueError for unknown names"""
+    if group_by not in PROBE_GROUPS:
+        raise ValueError(f"group_by must be one of {', '.join(PROBE_GROUPS)}")
+    return PROBE_GROUPS[group_by]
+
+def summarize_probes(table, group_by="device", top=10, serial_number=None, vrf=None, host=None):
+    """
+    Summarizes a probe ColumnarTable: overall latency and jitter
+    percentiles, the top groups (device, vrf, host or source_interface)
+    by p95 latency and by packet loss, and the top probes by latency and
+    by loss. Probes reporting an error are counted but left out of the
+    latency and jitter statistics.
+    """
+    key = probe_group_column(group_by)
+    conditions = {name: value for name, value in (("serial_number", serial_number), ("vrf", vrf), ("host", host)) if value}
+    rows = table.where(**conditions)
+    healthy = table.where(rows, error="")
+    errors = len(rows) - len(healthy)
+
+    summary = {
+        "probes": len(rows),
+        "probes_with_errors": errors,
+        "overall": _metrics(
+            table.aggregate("latency_millis", healthy),
+            table.aggregate("jitter_millis", healthy),
+            table.aggregate("packet_loss_percent", rows),
+        ),
+        "group_by": group_by,
+    }
+    latency = table.group_by(key, "latency_millis", healthy)
+    jitter = table.group_by(key, "jitter_millis", healthy)
+    loss = table.group_by(key, "packet_loss_percent", rows)
+    empty = summarize([])
+    groups = {
+        name: _metrics(latency.get(name, empty), jitter.get(name, empty), loss[name])
+        for name in loss
+    }
+    summary["groups"] = len(groups)
+    by_latency = sorted(
+        (name for name in groups if groups[name]["latency_millis"]["p95"] is not None),
+        key=lambda name: groups[name]["latency_millis"]["p95"],
+        reverse=True,
+    )
+    by_loss = sorted(
+        (name for name in groups if groups[name]["packet_loss_percent"]["mean"]),
+        key=lambda name: (groups[name]["packet_loss_percent"]["mean"], groups[name]["packet_loss_percent"]["max"]),
+        reverse=True,
+    )
+    summary["worst_latency_groups"] = [dict(groups[name], **{group_by: name}) for name in by_latency[:top]]
+    summary["worst_loss_groups"] = [dict(groups[name], **{group_by: name}) for name in by_loss[:top]]
+
+    fields = PROBE_KEY_FIELDS + PROBE_METRIC_FIELDS
+    summary["worst_latency_probes"] = table.rows(table.top("latency_millis", top, healthy), fields)
+    lossy = table.where(rows, packet_loss_percent=(">", 0))
+    summary["worst_loss_probes"] = table.rows(table.top("packet_loss_percent", top, lossy), fields)
+    return(summary)
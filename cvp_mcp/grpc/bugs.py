@@ -1,7 +1,8 @@
 from arista.bugexposure.v1 import models
 from arista.bugexposure.v1 import services
-from .utils import RPC_TIMEOUT, createConnection, serialize_repeated_int32
+from .utils import createConnection, serialize_repeated_int32, convert_response_to_bug_exposure
 from .models import BugExposure
+from .retry import rpc_policy
 import grpc
 import logging
 import os
@@ -9,53 +10,72 @@ import json
 import sys
 
 
-def grpc_all_bug_exposure(channel):
+def iter_all_bug_exposure(channel):
     """
-    Gets all bugs in CVP
+    Yields each bug exposure as it arrives from CVP.
+    Closing the generator early cancels the stream.
     """
-    all_bugs= []
     # create the Python stub for the inventory API
     # this is essentially the client, but Python gRPC refers to them as "stubs"
     # because they call into the gRPC C API
     stub = services.BugExposureServiceStub(channel)
     get_all_req = services.BugExposureStreamRequest()
-    # print(json.dumps(stub.GetAll(get_all_req, timeout=RPC_TIMEOUT)))
-    # print(list(stub.GetAll(get_all_req, timeout=RPC_TIMEOUT)), file=sys.stderr)
-    for bug in stub.GetAll(get_all_req, timeout=RPC_TIMEOUT):
-        try:
-            # Check to make sure the device is valid
-            if bug.value.key.device_id != "127.0.0.1":
-                match bug.value.highest_bug_exposure:
-                    case models.HIGHEST_EXPOSURE_HIGH:
-                        highest_bug = "High"
-                    case models.HIGHEST_EXPOSURE_LOW:
-                        highest_bug = "Low"
-                    case models.HIGHEST_EXPOSURE_NONE:
-                        highest_bug = "None"
-                    case _:
-                        highest_bug = "Unspecified"
-                match bug.value.highest_cve_exposure:
-                    case models.HIGHEST_EXPOSURE_HIGH:
-                        highest_cve = "High"
-                    case models.HIGHEST_EXPOSURE_LOW:
-                        highest_cve = "Low"
-                    case models.HIGHEST_EXPOSURE_NONE:
-                        highest_cve = "None"
-                    case _:
-                        highest_cve = "Unspecified"
-                for id in bug.value.bug_ids.values:
-                    ids = int(id)
-                bug_exposure = BugExposure(
-                    serial_number = bug.value.key.device_id.value,
-                    bug_ids = serialize_repeated_int32(bug.value.bug_ids.values),
-                    cve_ids = serialize_repeated_int32(bug.value.cve_ids.values),
-                    bug_count = bug.value.bug_count.value,
-                    cve_count = bug.value.cve_count.value,
-                    highest_cve_exposure = highest_cve,
-                    highest_bug_exposre = highest_bug
-                )
-                all_bugs.append(bug_exposure)
-        except Exception as e:
-            logging.error(f"Error with device: {e}")
-    return(all_bugs)
-    # return(json.dumps(all_devices))
+    stream = rpc_policy.stream(stub.GetAll, get_all_req, "BugExposureService/GetAll")
+    try:
+        for bug in stream:
+            try:
+                # Check to make sure the device is valid
+                if bug.value.key.device_id.value == "127.0.0.1":
+                    continue
+                bug_exposure = convert_response_to_bug_exposure(bug)
+            except Exception as e:
+                logging.error(f"Error with device: {e}")
+                continue
+            yield bug_exposure
+    finally:
+        stream.close()
+
+
+def grpc_all_bug_exposure(channel):
+    """
+    Gets all bugs in CVP
+    """
+    return(list(iter_all_bug_exposure(channel)))
+
+
+def grpc_subscribe_bug_exposure(channel):
+    """
+    Opens a long-lived Subscribe stream of bug exposure changes.
+    The caller iterates and cancels the stream.
+    """
+    stub = services.BugExposureServiceStub(channel)
+    return(stub.Subscribe(services.BugExposureStreamRequest()))
+
+
+async def iter_all_bug_exposure_async(channel):
+    """
+    grpc.aio variant of iter_all_bug_exposure
+    """
+    stub = services.BugExposureServiceStub(channel)
+    get_all_req = services.BugExposureStreamRequest()
+    call = rpc_policy.stream_async(stub.GetAll, get_all_req, "BugExposureService/GetAll")
+    try:
+        async for bug in call:
+            try:
+                # Check to make sure the device is valid
+                if bug.value.key.device_id.value == "127.0.0.1":
+                    continue
+                bug_exposure = convert_response_to_bug_exposure(bug)
+            except Exception as e:
+                logging.error(f"Error with device: {e}")
+                continue
+            yield bug_exposure
+    finally:
+        await call.aclose()
+
+
+async def grpc_all_bug_exposure_async(channel):
+    """
+    Gets all bugs in CVP over a grpc.aio channel
+    """
+    return([bug async for bug in iter_all_bug_exposure_async(channel)])
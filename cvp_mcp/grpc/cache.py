@@ -0,0 +1,746 @@
+from array import array
+from collections import OrderedDict
+import json
+import logging
+import sqlite3
+import threading
+import time
+from .inventory import grpc_all_inventory, grpc_one_inventory_serial, grpc_bulk_inventory_serial, grpc_subscribe_inventory
+from .inventory import grpc_all_inventory_async, grpc_one_inventory_serial_async, grpc_bulk_inventory_serial_async
+from .inventory import grpc_filtered_inventory_async, filter_inventory
+from .monitor import grpc_subscribe_probe_status
+from .endpoint import fetch_endpoint_location_async, normalize_search_term
+from .subscriber import Subscriber
+from .utils import convert_response_to_switch, convert_response_to_probe_stat, subscription_operation, fan_out_async, normalize_mac
+
+# How long cached inventory is trusted after the subscription drops
+INVENTORY_MAX_STALENESS = 300
+# Number of bugs kept in memory by the bug info cache
+BUG_CACHE_SIZE = 4096
+# Endpoint searches kept in memory, and seconds found and not found results are served
+ENDPOINT_CACHE_SIZE = 4096
+ENDPOINT_HIT_TTL = 300
+ENDPOINT_MISS_TTL = 60
+# Seconds of probe stats kept per probe by the probe history
+PROBE_HISTORY_WINDOW = 900
+# Samples kept per probe and number of probes tracked, bounding memory.
+# A sample is 5 doubles, so at most 5000 * 180 * 40 bytes, about 36 MB
+PROBE_HISTORY_SAMPLES = 180
+PROBE_HISTORY_MAX_PROBES = 5000
+# Metrics kept in each probe history sample, after its timestamp
+PROBE_METRICS = ("latency_millis", "jitter_millis", "http_response_time_millis", "packet_loss_percent")
+
+
+class LRUCache:
+    """
+    Thread-safe bounded mapping that evicts the least recently used entry
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        return {
+            "size": len(self._data),
+            "max_size": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class InventoryCache:
+    """
+    In-process inventory keyed by serial number, with secondary indexes
+    on hostname and system MAC. It is filled once from grpc_all_inventory and kept current by a
+    DeviceService Subscribe stream. While the subscription is down the
+    data is served for at most max_staleness seconds, after which lookups
+    fall back to direct RPCs against CVP.
+    """
+
+    def __init__(self, max_staleness=INVENTORY_MAX_STALENESS):
+        self.max_staleness = max_staleness
+        self.hits = 0
+        self.misses = 0
+        self._devices = {}
+        self._by_hostname = {}
+        self._by_mac = {}
+        self._initial_seen = set()
+        self._synced_at = None
+        self._lock = threading.RLock()
+        self._subscriber = None
+
+    @property
+    def enabled(self):
+        return self.max_staleness > 0
+
+    def start(self, get_channel):
+        """Starts loading and subscribing in the background, get_channel returns a CVP channel"""
+        if not self.enabled or self._subscriber is not None:
+            return
+        self._subscriber = Subscriber(
+            "inventory",
+            get_channel,
+            grpc_subscribe_inventory,
+            self._on_message,
+            prime=self.load,
+            on_open=self._initial_seen.clear,
+        )
+        self._subscriber.start()
+
+    def stop(self):
+        if self._subscriber is not None:
+            self._subscriber.stop()
+            self._subscriber = None
+
+    def load(self, channel):
+        """Replaces the cached inventory with a full grpc_all_inventory fetch"""
+        all_active, all_inactive = grpc_all_inventory(channel)
+        self._replace(all_active + all_inactive)
+        return(all_active, all_inactive)
+
+    @staticmethod
+    def _index_key(field, value):
+        """Hostnames match case-insensitively and MACs in any notation"""
+        value = value.strip().lower()
+        if field == "system_mac":
+            return normalize_mac(value) or value
+        return value
+
+    def _indexes(self, switch):
+        return (
+            (self._by_hostname, self._index_key("hostname", switch["hostname"])),
+            (self._by_mac, self._index_key("system_mac", switch["system_mac"])),
+        )
+
+    def _store(self, switch):
+        """Adds or replaces a switch, keeping the secondary indexes in step"""
+        serial_number = switch["serial_number"]
+        self._drop(serial_number)
+        self._devices[serial_number] = switch
+        for index, key in self._indexes(switch):
+            index.setdefault(key, set()).add(serial_number)
+
+    def _drop(self, serial_number):
+        switch = self._devices.pop(serial_number, None)
+        if switch is None:
+            return
+        for index, key in self._indexes(switch):
+            serials = index.get(key)
+            if serials is not None:
+                serials.discard(serial_number)
+                if not serials:
+                    del index[key]
+
+    def _replace(self, switches):
+        with self._lock:
+            self._devices = {}
+            self._by_hostname = {}
+            self._by_mac = {}
+            for switch in switches:
+                self._store(switch)
+            self._synced_at = time.monotonic()
+        logging.info(f"Inventory cache loaded with {len(switches)} devices")
+
+    def _on_message(self, response):
+        operation = subscription_operation(response)
+        if operation == "INITIAL_SYNC_COMPLETE":
+            with self._lock:
+                # Devices removed while the subscription was down never get a DELETED
+                for serial_number in set(self._devices) - self._initial_seen:
+                    self._drop(serial_number)
+                self._synced_at = time.monotonic()
+            return
+        serial_number = response.value.key.device_id.value
+        if not serial_number:
+            return
+        switch = None if operation == "DELETED" else convert_response_to_switch(response)
+        with self._lock:
+            if operation == "INITIAL":
+                self._initial_seen.add(serial_number)
+            if switch:
+                self._store(switch)
+            else:
+                self._drop(serial_number)
+
+    def is_fresh(self):
+        """True when cached data is within the staleness bound"""
+        if not self.enabled or self._synced_at is None:
+            return False
+        subscriber = self._subscriber
+        if subscriber is not None and subscriber.connected:
+            return True
+        last_known_good = self._synced_at
+        if subscriber is not None:
+            last_known_good = max(last_known_good, subscriber.disconnected_at)
+        return time.monotonic() - last_known_good <= self.max_staleness
+
+    def _lookup_one(self, device_id):
+        if self.is_fresh():
+            with self._lock:
+                switch = self._devices.get(device_id)
+            if switch is not None:
+                self.hits += 1
+                return(switch)
+        self.misses += 1
+        return(None)
+
+    def _lookup_many(self, device_ids):
+        """Returns (devices, missing), missing devices are set to None"""
+        if not self.is_fresh():
+            self.misses += len(device_ids)
+            return({}, list(device_ids))
+        devices = {}
+        missing = []
+        with self._lock:
+            for device_id in dict.fromkeys(device_ids):
+                if not device_id:
+                    continue
+                switch = self._devices.get(device_id)
+                devices[device_id] = switch
+                if switch is None:
+                    missing.append(device_id)
+        self.hits += len(devices) - len(missing)
+        self.misses += len(missing)
+        return(devices, missing)
+
+    def _lookup_by(self, field, values):
+        """
+        Returns (found, missing) for hostname or system_mac lookups,
+        found maps each value to its switches sorted by serial number
+        """
+        if not self.is_fresh():
+            self.misses += len(values)
+            return({}, list(values))
+        index = self._by_hostname if field == "hostname" else self._by_mac
+        found = {}
+        missing = []
+        with self._lock:
+            for value in dict.fromkeys(values):
+                serials = index.get(self._index_key(field, value))
+                if serials:
+                    found[value] = [self._devices[serial_number] for serial_number in sorted(serials)]
+                else:
+                    missing.append(value)
+        self.hits += len(found)
+        self.misses += len(missing)
+        return(found, missing)
+
+    def _lookup_all(self):
+        if not self.is_fresh():
+            self.misses += 1
+            return(None)
+        self.hits += 1
+        with self._lock:
+            switches = list(self._devices.values())
+        all_active = [switch for switch in switches if switch["streaming_status"] == "Active"]
+        all_inactive = [switch for switch in switches if switch["streaming_status"] == "Inactive"]
+        return(all_active, all_inactive)
+
+    def get_one(self, channel, device_id):
+        """Returns one device, from memory when fresh or a GetOne otherwise"""
+        switch = self._lookup_one(device_id)
+        if switch is None:
+            switch = grpc_one_inventory_serial(channel, device_id)
+        return(switch)
+
+    def get_many(self, channel, device_ids):
+        """Returns devices keyed by serial number, fetching only cache misses from CVP"""
+        devices, missing = self._lookup_many(device_ids)
+        if missing:
+            devices.update(grpc_bulk_inventory_serial(channel, missing))
+        return(devices)
+
+    def get_all(self, channel):
+        """Returns (all_active, all_inactive) like grpc_all_inventory"""
+        cached = self._lookup_all()
+        if cached is not None:
+            return(cached)
+        if self.enabled:
+            return(self.load(channel))
+        return(grpc_all_inventory(channel))
+
+    async def get_one_async(self, channel, device_id):
+        """get_one for a grpc.aio channel"""
+        switch = self._lookup_one(device_id)
+        if switch is None:
+            switch = await grpc_one_inventory_serial_async(channel, device_id)
+        return(switch)
+
+    async def get_many_async(self, channel, device_ids):
+        """get_many for a grpc.aio channel"""
+        devices, missing = self._lookup_many(device_ids)
+        if missing:
+            devices.update(await grpc_bulk_inventory_serial_async(channel, missing))
+        return(devices)
+
+    async def get_by_async(self, channel, field, values):
+        """
+        Returns the switches for each hostname or system MAC (field is
+        hostname or system_mac) as a dict of value to a list of switches,
+        empty when nothing matched. Cache misses are resolved from one full
+        inventory stream, matched with the same case-insensitive keys as
+        the cache, since CVP would match hostnames case-sensitively.
+        """
+        values = [value for value in dict.fromkeys(values) if value]
+        found, missing = self._lookup_by(field, values)
+        if missing:
+            all_active, all_inactive = await self.get_all_async(channel)
+            fetched = {}
+            for switch in all_active + all_inactive:
+                fetched.setdefault(self._index_key(field, switch[field]), []).append(switch)
+            for value in missing:
+                found[value] = sorted(fetched.get(self._index_key(field, value), []), key=lambda switch: switch["serial_number"])
+        return({value: found[value] for value in values})
+
+    async def get_all_async(self, channel):
+        """get_all for a grpc.aio channel"""
+        cached = self._lookup_all()
+        if cached is not None:
+            return(cached)
+        all_active, all_inactive = await grpc_all_inventory_async(channel)
+        if self.enabled:
+            self._replace(all_active + all_inactive)
+        return(all_active, all_inactive)
+
+    async def get_filtered_async(self, channel, **filters):
+        """
+        Returns the devices matching filter_inventory filters, from memory
+        when fresh, otherwise from a filtered stream
+        """
+        if not any(filters.values()):
+            all_active, all_inactive = await self.get_all_async(channel)
+            return(all_active + all_inactive)
+        if self.is_fresh():
+            self.hits += 1
+            with self._lock:
+                switches = list(self._devices.values())
+            return(list(filter_inventory(switches, **filters)))
+        self.misses += 1
+        return(await grpc_filtered_inventory_async(channel, **filters))
+
+    def stats(self):
+        with self._lock:
+            switches = list(self._devices.values())
+        subscriber = self._subscriber
+        return {
+            "enabled": self.enabled,
+            "devices": len(switches),
+            "active": sum(1 for switch in switches if switch["streaming_status"] == "Active"),
+            "inactive": sum(1 for switch in switches if switch["streaming_status"] == "Inactive"),
+            "fresh": self.is_fresh(),
+            "subscribed": bool(subscriber and subscriber.connected),
+            "reconnects": subscriber.reconnects if subscriber else 0,
+            "age_seconds": round(time.monotonic() - self._synced_at, 3) if self._synced_at else None,
+            "max_staleness_seconds": self.max_staleness,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+class BugInfoCache:
+    """
+    Bug metadata from the BugAlerts analytics path keyed by bug ID.
+    Bug metadata does not change, so entries never expire. They are held
+    in a bounded LRU in memory and, when a path is set, in a SQLite file
+    that survives restarts.
+    """
+
+    def __init__(self, maxsize=BUG_CACHE_SIZE, path=None):
+        self.memory = LRUCache(maxsize)
+        self.disk_hits = 0
+        self.path = None
+        self._db = None
+        self._db_lock = threading.Lock()
+        if path:
+            self.open(path)
+
+    def open(self, path):
+        """Opens (or creates) the on-disk SQLite store"""
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS bug_info (bug_id TEXT PRIMARY KEY, info TEXT NOT NULL)")
+            self._db.commit()
+            self.path = path
+        logging.info(f"Bug info cache persisted to {path}")
+
+    def close(self):
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def get_many(self, bug_ids):
+        """Returns (found, missing), found is a dict of bug ID to bug info"""
+        found = {}
+        missing = []
+        for bug_id in dict.fromkeys(bug_ids):
+            info = self.memory.get(bug_id)
+            if info is None:
+                missing.append(bug_id)
+            else:
+                found[bug_id] = info
+        if missing and self._db is not None:
+            on_disk = self._read([str(bug_id) for bug_id in missing])
+            still_missing = []
+            for bug_id in missing:
+                info = on_disk.get(str(bug_id))
+                if info is None:
+                    still_missing.append(bug_id)
+                else:
+                    self.memory.put(bug_id, info)
+                    found[bug_id] = info
+            self.disk_hits += len(missing) - len(still_missing)
+            missing = still_missing
+        return(found, missing)
+
+    def put_many(self, bug_infos):
+        """Stores bug info for each bug ID, empty results are not cached"""
+        bug_infos = {bug_id: info for bug_id, info in bug_infos.items() if info}
+        for bug_id, info in bug_infos.items():
+            self.memory.put(bug_id, info)
+        if bug_infos and self._db is not None:
+            rows = [(str(bug_id), json.dumps(info, default=str)) for bug_id, info in bug_infos.items()]
+            with self._db_lock:
+                self._db.executemany("INSERT OR REPLACE INTO bug_info (bug_id, info) VALUES (?, ?)", rows)
+                self._db.commit()
+
+    def _read(self, keys):
+        found = {}
+        with self._db_lock:
+            # Stay under SQLite's bound parameter limit
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                query = f"SELECT bug_id, info FROM bug_info WHERE bug_id IN ({','.join('?' * len(chunk))})"
+                for bug_id, info in self._db.execute(query, chunk):
+                    found[bug_id] = json.loads(info)
+        return found
+
+    def stats(self):
+        _stats = self.memory.stats()
+        _stats["disk_path"] = self.path
+        _stats["disk_hits"] = self.disk_hits
+        if self._db is not None:
+            with self._db_lock:
+                _stats["disk_size"] = self._db.execute("SELECT COUNT(*) FROM bug_info").fetchone()[0]
+        return _stats
+
+
+class EndpointLocationCache:
+    """
+    Endpoint location searches keyed by normalized search term, in a
+    bounded LRU. Endpoints that were found are served for hit_ttl seconds
+    and searches that found nothing for the shorter miss_ttl, so agents
+    retrying an unknown MAC do not reach CVP each time. Failed searches
+    are not cached.
+    """
+
+    def __init__(self, maxsize=ENDPOINT_CACHE_SIZE, hit_ttl=ENDPOINT_HIT_TTL, miss_ttl=ENDPOINT_MISS_TTL):
+        self.memory = LRUCache(maxsize)
+        self.hit_ttl = hit_ttl
+        self.miss_ttl = miss_ttl
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.expirations = 0
+
+    def get(self, search_term):
+        """Cached endpoints for a normalized search term, or None when absent or expired"""
+        entry = self.memory.get(search_term)
+        if entry is not None and entry[0] <= time.monotonic():
+            self.expirations += 1
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry[1]:
+            self.hits += 1
+        else:
+            self.negative_hits += 1
+        return entry[1]
+
+    def put(self, search_term, endpoints):
+        ttl = self.hit_ttl if endpoints else self.miss_ttl
+        if ttl > 0:
+            self.memory.put(search_term, (time.monotonic() + ttl, endpoints))
+
+    async def lookup_async(self, channel, search_term):
+        """Endpoints for a MAC, IP or hostname, searching CVP on a miss. Errors raise."""
+        key = normalize_search_term(search_term)
+        endpoints = self.get(key)
+        if endpoints is None:
+            endpoints = await fetch_endpoint_location_async(channel, search_term)
+            self.put(key, endpoints)
+        return endpoints
+
+    async def lookup_many_async(self, channel, search_terms, max_workers=None):
+        """
+        Looks up many search terms with at most max_workers searches in
+        flight. Terms that normalize to the same key are searched once.
+        Returns a dict of search term to endpoints, None for failed searches.
+        """
+        search_terms = list(dict.fromkeys(search_terms))
+        keys = {}
+        for search_term in search_terms:
+            keys.setdefault(normalize_search_term(search_term), search_term)
+        results = await fan_out_async(
+            lambda search_term: self.lookup_async(channel, search_term),
+            keys.values(), max_workers, label="Error with Endpoint Location",
+        )
+        by_key = dict(zip(keys, results))
+        return {search_term: by_key[normalize_search_term(search_term)] for search_term in search_terms}
+
+    def clear(self):
+        self.memory.clear()
+
+    def stats(self):
+        return {
+            "size": len(self.memory),
+            "max_size": self.memory.maxsize,
+            "hit_ttl_seconds": self.hit_ttl,
+            "miss_ttl_seconds": self.miss_ttl,
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "expirations": self.expirations,
+            "evictions": self.memory.evictions,
+        }
+
+
+class _ProbeSeries:
+    """
+    One probe's samples in a ring buffer of flat arrays, a sample time in
+    times and its PROBE_METRICS values in values, oldest at start
+    """
+    __slots__ = ("updated_at", "capacity", "start", "times", "values")
+
+    def __init__(self, updated_at, capacity):
+        self.updated_at = updated_at
+        self.capacity = capacity
+        self.start = 0
+        self.times = array("d")
+        self.values = array("d")
+
+    def __len__(self):
+        return len(self.times)
+
+    def last_time(self):
+        return self.times[self.start - 1] if self.times else None
+
+    def append(self, sampled_at, metrics):
+        if len(self.times) < self.capacity:
+            self.times.append(sampled_at)
+            self.values.extend(metrics)
+            return
+        width = len(PROBE_METRICS)
+        self.times[self.start] = sampled_at
+        self.values[self.start * width:(self.start + 1) * width] = array("d", metrics)
+        self.start = (self.start + 1) % self.capacity
+
+    def samples(self, since, column):
+        """(time, value) of column for the samples taken at or after since, oldest first"""
+        width = len(PROBE_METRICS)
+        count = len(self.times)
+        samples = []
+        for offset in range(count):
+            i = (self.start + offset) % count
+            if self.times[i] >= since:
+                samples.append((self.times[i], self.values[i * width + column]))
+        return samples
+
+
+class ProbeHistory:
+    """
+    Rolling window of Connectivity Monitor probe stats kept in memory.
+    A ProbeStats Subscribe stream appends a sample to a bounded ring
+    buffer per (device, host, vrf, source_intf) probe. A sample no newer
+    than the probe's last one, such as an INITIAL message sent again after
+    a reconnect, is dropped. Samples older than the window are not
+    reported, and probes with no update for a whole window and the least
+    recently updated probes beyond max_probes are dropped.
+    """
+
+    def __init__(self, window=PROBE_HISTORY_WINDOW, max_samples=PROBE_HISTORY_SAMPLES, max_probes=PROBE_HISTORY_MAX_PROBES):
+        self.window = window
+        self.max_samples = max_samples
+        self.max_probes = max_probes
+        self.evictions = 0
+        # probe key -> _ProbeSeries, oldest update first
+        self._series = OrderedDict()
+        self._lock = threading.Lock()
+        self._subscriber = None
+
+    @property
+    def enabled(self):
+        return self.window > 0
+
+    @property
+    def running(self):
+        return self._subscriber is not None
+
+    def start(self, get_channel):
+        """Starts the probe stats subscription in the background, get_channel returns a CVP channel"""
+        if not self.enabled or self._subscriber is not None:
+            return
+        self._subscriber = Subscriber("probe stats", get_channel, grpc_subscribe_probe_status, self._on_message)
+        self._subscriber.start()
+
+    def stop(self):
+        if self._subscriber is not None:
+            self._subscriber.stop()
+            self._subscriber = None
+
+    def _on_message(self, response):
+        operation = subscription_operation(response)
+        if operation == "INITIAL_SYNC_COMPLETE":
+            return
+        probe = convert_response_to_probe_stat(response)
+        key = (probe["serial_number"], probe["host"], probe["vrf"], probe["source_intf"])
+        now = time.time()
+        with self._lock:
+            if operation == "DELETED":
+                self._series.pop(key, None)
+                return
+            if response.HasField("time"):
+                sampled_at = response.time.seconds + response.time.nanos / 1e9
+            else:
+                sampled_at = now
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _ProbeSeries(now, self.max_samples)
+            else:
+                series.updated_at = now
+                self._series.move_to_end(key)
+            last_time = series.last_time()
+            if last_time is None or sampled_at > last_time:
+                series.append(sampled_at, [probe[metric] for metric in PROBE_METRICS])
+            self._evict(now)
+
+    def _evict(self, now):
+        # _series is ordered by last update, so stale probes are at the front
+        while self._series:
+            key, series = next(iter(self._series.items()))
+            if len(self._series) <= self.max_probes and series.updated_at >= now - self.window:
+                break
+            del self._series[key]
+            self.evictions += 1
+
+    def trend(self, minutes=15, metric="latency_millis", serial_number=None, host=None, vrf=None, source_intf=None, top=10, points=15):
+        """
+        Returns how metric moved over the last minutes for the matching
+        probes: the top probes by mean, each with its first, last, min,
+        max and mean values and up to points averaged buckets
+        """
+        if metric not in PROBE_METRICS:
+            raise ValueError(f"metric must be one of {', '.join(PROBE_METRICS)}")
+        column = PROBE_METRICS.index(metric)
+        now = time.time()
+        since = now - min(minutes * 60, self.window)
+        wanted = (serial_number, host, vrf, source_intf)
+        with self._lock:
+            self._evict(now)
+            matched = [
+                (key, series.samples(since, column))
+                for key, series in self._series.items()
+                if all(value is None or value == part for value, part in zip(wanted, key))
+            ]
+        trends = []
+        for key, samples in matched:
+            if not samples:
+                continue
+            values = [value for _, value in samples]
+            trend = dict(zip(("serial_number", "host", "vrf", "source_intf"), key))
+            trend.update(
+                samples=len(values),
+                first=values[0],
+                last=values[-1],
+                min=min(values),
+                max=max(values),
+                mean=round(sum(values) / len(values), 3),
+                change=round(values[-1] - values[0], 3),
+                series=_buckets(samples, since, now, points),
+            )
+            trends.append(trend)
+        trends.sort(key=lambda trend: trend["mean"], reverse=True)
+        return {
+            "metric": metric,
+            "minutes": minutes,
+            "subscribed": bool(self._subscriber and self._subscriber.connected),
+            "probes_matched": len(trends),
+            "probes": trends[:top],
+        }
+
+    def stats(self):
+        with self._lock:
+            probes = len(self._series)
+            samples = sum(len(series) for series in self._series.values())
+        subscriber = self._subscriber
+        return {
+            "enabled": self.enabled,
+            "subscribed": bool(subscriber and subscriber.connected),
+            "reconnects": subscriber.reconnects if subscriber else 0,
+            "probes": probes,
+            "max_probes": self.max_probes,
+            "samples": samples,
+            "window_seconds": self.window,
+            "evictions": self.evictions,
+        }
+
+
+def _buckets(samples, since, until, points):
+    """Averages (time, value) samples into up to points equal time buckets"""
+    width = max((until - since) / max(points, 1), 1e-9)
+    sums = {}
+    for sampled_at, value in samples:
+        bucket = min(int((sampled_at - since) / width), points - 1)
+        total, count = sums.get(bucket, (0, 0))
+        sums[bucket] = (total + value, count + 1)
+    return [
+        {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(since + bucket * width)),
+            "value": round(total / count, 3),
+        }
+        for bucket, (total, count) in sorted(sums.items())
+    ]
+
+
+inventory_cache = InventoryCache()
+bug_info_cache = BugInfoCache()
+endpoint_cache = EndpointLocationCache()
+probe_history = ProbeHistory()
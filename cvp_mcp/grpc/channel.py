@@ -0,0 +1,232 @@
+import asyncio
+import atexit
+import itertools
+import logging
+import threading
+import time
+import grpc
+from .utils import createConnection
+from .instrument import rpc_interceptors, sync_rpc_interceptors
+from cvp_mcp.metrics import registry, CHANNEL_SETUP
+
+CHANNEL_POOL_SIZE = 2
+CHANNEL_OPTIONS = [
+    # Detect dead connections during long-lived streams. CVP's Go gRPC
+    # server answers pings more often than every 5 minutes, or pings with
+    # no RPC in flight, with a too_many_pings GOAWAY that drops the channel
+    ("grpc.keepalive_time_ms", 300000),
+    ("grpc.keepalive_timeout_ms", 20000),
+    ("grpc.client_idle_timeout_ms", 3600000),
+    ("grpc.max_receive_message_length", 64 * 1024 * 1024),
+]
+# Only shut down channels are replaced. A channel in TRANSIENT_FAILURE is
+# left to gRPC's own reconnect backoff, closing it would cancel its
+# in-flight RPCs, including long-lived Subscribe streams, and pay a new
+# TLS handshake on every call during a CVP outage
+BROKEN_STATES = (
+    grpc.ChannelConnectivity.SHUTDOWN,
+)
+
+_manager = None
+_aio_manager = None
+_manager_lock = threading.Lock()
+
+
+class _PooledChannel:
+    """
+    A secure channel, or a plaintext one when creds is None,
+    plus the last connectivity state reported for it
+    """
+
+    def __init__(self, target, creds, options):
+        self.state = grpc.ChannelConnectivity.IDLE
+        self.opened_at = time.perf_counter()
+        if creds is None:
+            channel = grpc.insecure_channel(target, options=options)
+        else:
+            channel = grpc.secure_channel(target, creds, options=options)
+        interceptors = sync_rpc_interceptors()
+        self.channel = grpc.intercept_channel(channel, *interceptors) if interceptors else channel
+        self.channel.subscribe(self._on_state, try_to_connect=True)
+
+    def _on_state(self, state):
+        if self.opened_at is not None and state == grpc.ChannelConnectivity.READY:
+            if registry.enabled:
+                CHANNEL_SETUP.observe(time.perf_counter() - self.opened_at, "grpc")
+            self.opened_at = None
+        self.state = state
+
+    def close(self):
+        try:
+            self.channel.unsubscribe(self._on_state)
+            self.channel.close()
+        except Exception as e:
+            logging.error(f"Error closing gRPC channel: {e}")
+
+
+class ChannelManager:
+    """
+    Process-wide pool of long-lived secure channels to CVP, plaintext
+    when datadict["insecure"] is set. Credentials are built once, channels are handed out round-robin
+    and any channel that has been shut down is replaced on checkout.
+    """
+
+    def __init__(self, datadict, size=CHANNEL_POOL_SIZE, options=CHANNEL_OPTIONS):
+        self.datadict = dict(datadict)
+        self.target = datadict["cvp"]
+        self.size = max(1, size)
+        self.options = list(options)
+        self._creds = None if datadict.get("insecure") else createConnection(datadict)
+        self._lock = threading.Lock()
+        self._closed = False
+        self._pool = [self._open() for _ in range(self.size)]
+        self._next = itertools.cycle(range(self.size))
+        logging.info(f"Opened {self.size} pooled gRPC channels to {self.target}")
+
+    def _open(self):
+        return _PooledChannel(self.target, self._creds, self.options)
+
+    def get_channel(self):
+        """Returns a warm channel from the pool, replacing it if it was shut down"""
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("CVP channel manager has been shut down")
+            index = next(self._next)
+            pooled = self._pool[index]
+            if pooled.state in BROKEN_STATES:
+                logging.warning(f"gRPC channel {index} to {self.target} is {pooled.state.name}, replacing it")
+                pooled.close()
+                pooled = self._pool[index] = self._open()
+            return pooled.channel
+
+    def shutdown(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            for pooled in self._pool:
+                pooled.close()
+            self._pool = []
+        logging.info(f"Closed pooled gRPC channels to {self.target}")
+
+
+class AioChannelManager:
+    """
+    grpc.aio counterpart of ChannelManager for async tools.
+    aio channels belong to the event loop that created them, so the pool
+    is opened lazily on the running loop and rebuilt if the loop changes.
+    """
+
+    def __init__(self, datadict, size=CHANNEL_POOL_SIZE, options=CHANNEL_OPTIONS):
+        self.datadict = dict(datadict)
+        self.target = datadict["cvp"]
+        self.size = max(1, size)
+        self.options = list(options)
+        self._creds = None if datadict.get("insecure") else createConnection(datadict)
+        self._loop = None
+        self._pool = []
+        self._next = itertools.cycle(range(self.size))
+
+    def _open(self):
+        if self._creds is None:
+            channel = grpc.aio.insecure_channel(self.target, options=self.options, interceptors=rpc_interceptors())
+        else:
+            channel = grpc.aio.secure_channel(self.target, self._creds, options=self.options, interceptors=rpc_interceptors())
+        # Start connecting now so the first call finds a warm channel
+        channel.get_state(try_to_connect=True)
+        if registry.enabled:
+            asyncio.get_running_loop().create_task(_observe_setup(channel, time.perf_counter()))
+        return channel
+
+    def get_channel(self):
+        """Returns a warm grpc.aio channel, must be called from the event loop"""
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._release_pool()
+            self._loop = loop
+            self._pool = [self._open() for _ in range(self.size)]
+            logging.info(f"Opened {self.size} pooled grpc.aio channels to {self.target}")
+        index = next(self._next)
+        channel = self._pool[index]
+        state = channel.get_state(try_to_connect=False)
+        if state in BROKEN_STATES:
+            logging.warning(f"grpc.aio channel {index} to {self.target} is {state.name}, replacing it")
+            loop.create_task(channel.close())
+            channel = self._pool[index] = self._open()
+        return channel
+
+    def _release_pool(self):
+        """
+        Closes the channels opened on a previous event loop. They can only
+        be closed on that loop, so they are abandoned with a warning if it
+        is no longer running.
+        """
+        pool, old_loop, self._pool = self._pool, self._loop, []
+        if not pool:
+            return
+        if old_loop is not None and old_loop.is_running() and not old_loop.is_closed():
+            for channel in pool:
+                asyncio.run_coroutine_threadsafe(channel.close(), old_loop)
+            logging.info(f"Closing {len(pool)} grpc.aio channels to {self.target} from a previous event loop")
+        else:
+            logging.warning(f"Abandoning {len(pool)} grpc.aio channels to {self.target}, their event loop is no longer running")
+
+    async def shutdown(self):
+        pool, self._pool, self._loop = self._pool, [], None
+        for channel in pool:
+            await channel.close()
+
+
+async def _observe_setup(channel, opened_at):
+    try:
+        await channel.channel_ready()
+    except Exception:
+        return
+    CHANNEL_SETUP.observe(time.perf_counter() - opened_at, "grpc.aio")
+
+
+def get_channel_manager(datadict):
+    """
+    Returns the process-wide channel manager, creating it on first use.
+    If the CVP connection settings change, the old pool is shut down.
+    """
+    global _manager
+    with _manager_lock:
+        if _manager is None or _manager.datadict != datadict:
+            if _manager is not None:
+                _manager.shutdown()
+            _manager = ChannelManager(datadict)
+        return _manager
+
+
+def get_channel(datadict):
+    """Returns a pooled channel to CVP for the given connection settings"""
+    return get_channel_manager(datadict).get_channel()
+
+
+def get_aio_channel(datadict):
+    """Returns a pooled grpc.aio channel to CVP, for use inside async tools"""
+    global _aio_manager
+    with _manager_lock:
+        if _aio_manager is None or _aio_manager.datadict != datadict:
+            _aio_manager = AioChannelManager(datadict)
+        manager = _aio_manager
+    return manager.get_channel()
+
+
+async def shutdown_aio_channel_manager():
+    global _aio_manager
+    manager, _aio_manager = _aio_manager, None
+    if manager is not None:
+        await manager.shutdown()
+
+
+def shutdown_channel_manager():
+    global _manager
+    with _manager_lock:
+        if _manager is not None:
+            _manager.shutdown()
+            _manager = None
+
+
+atexit.register(shutdown_channel_manager)
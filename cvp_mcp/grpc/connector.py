@@ -1,7 +1,18 @@
 from cloudvision.Connector.grpc_client import GRPCClient, create_query
+from .cache import bug_info_cache
+from .utils import fan_out
+from .retry import rpc_policy
+from .instrument import MeasuredStream
+from cvp_mcp.deadline import DeadlineExceeded
+from cvp_mcp.metrics import registry
+import grpc
 import logging
+import time
 import json
 
+# Number of paths sent in one Connector Get request
+CONNECTOR_BATCH_SIZE = 100
+
 def find_frozen_dicts(obj, path="root"):
     if hasattr(obj, '__class__') and 'frozendict' in str(type(obj)).lower():
         logging.debug(f"Found FrozenDict at {path}: {type(obj)}")
@@ -26,6 +37,18 @@ def serialize_cloudvision_data(data):
     converted = convert_frozen_dicts(data)
     return(converted)
 
+def connector_get(client, query):
+    '''
+    Yields the notification batches of a Connector Get under rpc_policy,
+    so it gets the calling tool's deadline as its timeout and is retried
+    like the resource API calls. GRPCClient opens its own channel, so the
+    Get is timed here rather than by the channel interceptors.
+    '''
+    stream = rpc_policy.stream(lambda query, timeout: client.get(query, timeout=timeout), query, "Connector/Get")
+    if registry.enabled:
+        return MeasuredStream(stream, "Connector/Get", time.perf_counter())
+    return stream
+
 def get(client, dataset, pathElts):
     ''' Returns a query on a path element'''
     result = {}
@@ -33,7 +56,7 @@ def get(client, dataset, pathElts):
         create_query([(pathElts, [])], dataset)
     ]
 
-    for batch in client.get(query):
+    for batch in connector_get(client, query):
         for notif in batch["notifications"]:
             bug_info = serialize_cloudvision_data(notif['updates'])
             result.update(bug_info)
@@ -41,39 +64,88 @@ def get(client, dataset, pathElts):
             # find_frozen_dicts(notif['updates'])
     return result
 
-def getBugInfo(client, bugId, mem=dict()):
-    if bugId in mem:
-        return mem[bugId]
+def get_many(client, dataset, paths, batch_size=CONNECTOR_BATCH_SIZE, max_workers=None):
+    '''
+    Returns the updates for many path elements, keyed by the tuple of path
+    elements. Paths are sent batch_size at a time as a single multi-path
+    query per Get request instead of one Get per path, and the batches run
+    concurrently. Paths in a batch that failed are left out of the result,
+    a batch that ran out of time is reported in the tool's deadline budget.
+    '''
+    paths = [list(pathElts) for pathElts in paths]
+    def _get_batch(batch_paths):
+        batch_result = {tuple(pathElts): {} for pathElts in batch_paths}
+        query = [
+            create_query([(pathElts, []) for pathElts in batch_paths], dataset)
+        ]
+        try:
+            for batch in connector_get(client, query):
+                for notif in batch["notifications"]:
+                    key = tuple(notif["path_elements"])
+                    if key in batch_result:
+                        batch_result[key].update(serialize_cloudvision_data(notif['updates']))
+        except (grpc.RpcError, DeadlineExceeded) as e:
+            if isinstance(e, grpc.RpcError) and e.code() != grpc.StatusCode.DEADLINE_EXCEEDED:
+                raise
+            # rpc_policy recorded the expired Get, the tool result reports it
+            return {}
+        return batch_result
+    result = {}
+    batches = [paths[start:start + batch_size] for start in range(0, len(paths), batch_size)]
+    for batch_result in fan_out(_get_batch, batches, max_workers, default={}, label="Get Bug"):
+        result.update(batch_result)
+    return result
+
+def connector_address(cvp):
+    """
+    Connector address for a CVP host, adding the default :443 unless
+    cvp already names a port (host:port or [v6 address]:port)
+    """
+    if cvp.startswith("["):
+        return cvp if "]:" in cvp else f"{cvp}:443"
+    if cvp.count(":") > 1:
+        # A bare IPv6 address
+        return f"[{cvp}]:443"
+    if ":" in cvp:
+        return cvp
+    return f"{cvp}:443"
+
+def getBugInfo(client, bugId, cache=bug_info_cache):
+    found, missing = cache.get_many([bugId])
+    if bugId in found:
+        return found[bugId]
     pathElts = [
         "BugAlerts",
         "bugs",
         bugId
     ]
     dataset = "analytics"
-    bugInfo = get(client, dataset, pathElts)
-    mem[bugId] = bugInfo
+    bugInfo = dict(get(client, dataset, pathElts))
+    cache.put_many({bugId: bugInfo})
 
     return bugInfo
 
-def conn_get_info_bugs(datadict, bug_ids):
+def conn_get_info_bugs(datadict, bug_ids, cache=bug_info_cache, batch_size=CONNECTOR_BATCH_SIZE):
     """
-    Returns an array of information about each bug id
+    Returns an array of information about each bug id.
+    Bugs already in the bug info cache are not requested from CVP again,
+    the rest are fetched batch_size bug paths per Connector Get request.
     """
-    all_bugs = {}
+    all_bugs, missing = cache.get_many(bug_ids)
+    logging.debug(f"Bug info cache: {len(all_bugs)} cached, {len(missing)} to fetch")
+    if not missing:
+        return(all_bugs)
+    fetched = {}
     dataset = "analytics"
-    cv_addr = f"{datadict['cvp']}:443"
-    with GRPCClient(grpcAddr=cv_addr, tokenValue=datadict["cvtoken"]) as client:
-        for bugId in bug_ids:
-            pathElts = [
-                "BugAlerts",
-                "bugs",
-                bugId
-            ]
-            try:
-                bugInfo = get(client, dataset, pathElts)
-                all_bugs[bugId] = dict(bugInfo)
-            except Exception as e:
-                logging.error(f"Get Bug: {e}")
+    cv_addr = connector_address(datadict["cvp"])
+    # Without a token GRPCClient opens a plaintext channel
+    token = None if datadict.get("insecure") else datadict["cvtoken"]
+    with GRPCClient(grpcAddr=cv_addr, tokenValue=token) as client:
+        paths = [["BugAlerts", "bugs", bugId] for bugId in missing]
+        for pathElts, bugInfo in get_many(client, dataset, paths, batch_size).items():
+            fetched[pathElts[-1]] = bugInfo
+    cache.put_many(fetched)
+    all_bugs.update(fetched)
     # logging.debug(type(all_bugs))
     # logging.debug(f"All Bugs: {json.dumps(all_bugs)}")
     return(all_bugs)
@@ -1,9 +1,12 @@
 from arista.endpointlocation.v1 import models
 from arista.endpointlocation.v1 import services
 from google.protobuf import wrappers_pb2 as wrappers
-from .utils import RPC_TIMEOUT, convert_response_to_probe_stat, convert_response_to_endpoint_location, serialize_arista_protobuf
+from .utils import normalize_mac, convert_response_to_probe_stat, convert_response_to_endpoint_location, serialize_arista_protobuf
 from .models import ProbeStats
+from .retry import rpc_policy
+from cvp_mcp import output
 import grpc
+import ipaddress
 import logging
 import os
 import json
@@ -11,26 +14,84 @@ import sys
 
 
 
-def grpc_one_endpoint_location(channel, query):
+def normalize_search_term(query):
     """
-    Performs a serach to get an endpoint based on search term
+    Canonical form of a MAC, IP or hostname search term, so the same
+    endpoint written differently shares a cache entry. MACs become
+    lowercase colon separated, IPs their compressed form and hostnames
+    lowercase.
     """
-    all_endpoints= []
-    stub = services.EndpointLocationServiceStub(channel)
-    get_all_req = services.EndpointLocationRequest(
+    term = query.strip().lower()
+    mac_address = normalize_mac(term)
+    if mac_address:
+        return mac_address
+    try:
+        return str(ipaddress.ip_address(term))
+    except ValueError:
+        return term
+
+
+def endpoint_location_request(query):
+    """
+    Builds an EndpointLocationRequest for a MAC, IP or hostname search term
+    """
+    return(services.EndpointLocationRequest(
         key=models.EndpointLocationKey(
             search_term=wrappers.StringValue(value=query)
         )
-    )
+    ))
+
+
+def convert_endpoint_locations(endpoints):
+    """
+    Converts every device in an EndpointLocationResponse device_map
+    """
+    all_endpoints= []
+    for endpoint in endpoints.value.device_map.values:
+        logging.debug(f"One PRE PROBE: {endpoint}")
+        # probe = serialize_arista_protobuf(endpoint)
+        _endpoint = convert_response_to_endpoint_location(endpoints.value.device_map.values[endpoint])
+        output.debug_json("One PROBE: ", _endpoint)
+        all_endpoints.append(_endpoint)
+    return(all_endpoints)
+
+
+def grpc_one_endpoint_location(channel, query):
+    """
+    Performs a serach to get an endpoint based on search term
+    """
+    stub = services.EndpointLocationServiceStub(channel)
+    get_all_req = endpoint_location_request(query)
+    try:
+        endpoints = rpc_policy.call(stub.GetOne, get_all_req, "EndpointLocationService/GetOne")
+        return(convert_endpoint_locations(endpoints))
+    except Exception as e:
+        logging.error(f"Error with Endpoint Location: {e}")
+        return(ProbeStats())
+
+
+async def fetch_endpoint_location_async(channel, query):
+    """
+    Searches for an endpoint over a grpc.aio channel. A search CVP
+    answers with NOT_FOUND returns an empty list, other errors raise.
+    """
+    stub = services.EndpointLocationServiceStub(channel)
+    get_all_req = endpoint_location_request(query)
+    try:
+        endpoints = await rpc_policy.call_async(stub.GetOne, get_all_req, "EndpointLocationService/GetOne", hedge=True)
+    except grpc.RpcError as e:
+        if e.code() == grpc.StatusCode.NOT_FOUND:
+            return([])
+        raise
+    return(convert_endpoint_locations(endpoints))
+
+
+async def grpc_one_endpoint_location_async(channel, query):
+    """
+    Performs a search to get an endpoint based on search term over a grpc.aio channel
+    """
     try:
-        endpoints = stub.GetOne(get_all_req, timeout=RPC_TIMEOUT)
-        for endpoint in endpoints.value.device_map.values:
-            logging.debug(f"One PRE PROBE: {endpoint}")
-            # probe = serialize_arista_protobuf(endpoint)
-            _endpoint = convert_response_to_endpoint_location(endpoints.value.device_map.values[endpoint])
-            logging.debug(f"One PROBE: {_endpoint}")
-            all_endpoints.append(_endpoint)
-        return(all_endpoints)
+        return(await fetch_endpoint_location_async(channel, query))
     except Exception as e:
         logging.error(f"Error with Endpoint Location: {e}")
         return(ProbeStats())
@@ -0,0 +1,491 @@
+"""
+In-memory indexes over fleet-wide datasets, so targeted questions such
+as "which devices are exposed to this CVE" are answered from memory
+instead of pulling and scanning the whole dataset on every call.
+Indexes are loaded once and patched by Subscribe deltas, or refreshed
+with full GetAll pulls when they are not subscribed.
+"""
+import abc
+import asyncio
+import bisect
+import datetime
+import logging
+import random
+import threading
+import time
+from .bugs import iter_all_bug_exposure, iter_all_bug_exposure_async, grpc_subscribe_bug_exposure
+from .lifecycle import iter_all_device_lifecycle, iter_all_device_lifecycle_async, grpc_subscribe_device_lifecycle
+from .subscriber import Subscriber
+from .utils import LIFECYCLE_DATES, convert_response_to_lifecycle_record, convert_response_to_bug_exposure, subscription_operation
+
+# Seconds an index is served before a tool call refreshes it from CVP
+INDEX_MAX_AGE = 300
+# Seconds between background refreshes of the indexes, plus up to the jitter
+WARM_INTERVAL = 240
+WARM_JITTER = 30
+EXPOSURE_LEVELS = ("High", "Low", "None", "Unspecified")
+EXPOSURE_KINDS = {
+    "bug": "highest_bug_exposre",
+    "cve": "highest_cve_exposure",
+}
+
+
+def normalize_exposure(level):
+    """Returns the exposure level name for level, raising ValueError for unknown levels"""
+    for name in EXPOSURE_LEVELS:
+        if level and level.strip().lower() == name.lower():
+            return name
+    raise ValueError(f"exposure must be one of {', '.join(EXPOSURE_LEVELS)}")
+
+def date_to_epoch(value):
+    """Epoch seconds for midnight UTC of a YYYY-MM-DD date"""
+    try:
+        date = datetime.date.fromisoformat(value.strip())
+    except (AttributeError, ValueError):
+        raise ValueError(f"Dates must be given as YYYY-MM-DD, got {value!r}")
+    return int(datetime.datetime(date.year, date.month, date.day, tzinfo=datetime.timezone.utc).timestamp())
+
+def normalize_milestone(milestone):
+    """Returns the lifecycle date field for milestone, raising ValueError for unknown names"""
+    if milestone not in LIFECYCLE_DATES:
+        raise ValueError(f"milestone must be one of {', '.join(LIFECYCLE_DATES)}")
+    return milestone
+
+
+class FleetIndex(abc.ABC):
+    """
+    Base for indexes kept in line with a CVP dataset. Subclasses key
+    records by serial number and implement _add and _discard to maintain
+    their postings, _records and _records_async to stream the dataset,
+    and _subscribe and _convert to follow its changes.
+    """
+
+    name = "fleet"
+
+    def __init__(self, max_age=INDEX_MAX_AGE):
+        self.max_age = max_age
+        self.refreshed_at = None
+        self.refreshes = 0
+        self.updates = 0
+        self.failed_refreshes = 0
+        self.last_error = None
+        self.deltas = 0
+        self._items = {}
+        self._lock = threading.Lock()
+        self._refreshing = threading.Lock()
+        self._subscriber = None
+        self._synced = False
+        self._initial_seen = set()
+
+    def __len__(self):
+        return len(self._items)
+
+    @abc.abstractmethod
+    def _add(self, record):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def _discard(self, serial_number):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def _records(self, channel):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def _records_async(self, channel):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def _subscribe(self, channel):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def _convert(self, response):
+        """Record for a Subscribe response, None to skip it"""
+        raise NotImplementedError
+
+    def update(self, record):
+        """Adds or replaces one device's record, returns True if it changed"""
+        with self._lock:
+            if self._items.get(record["serial_number"]) == record:
+                return False
+            self._discard(record["serial_number"])
+            self._add(record)
+            self.updates += 1
+            return True
+
+    def remove(self, serial_number):
+        with self._lock:
+            if serial_number in self._items:
+                self._discard(serial_number)
+                self.updates += 1
+
+    def sync(self, records):
+        """
+        Brings the index in line with a full set of records, updating
+        only changed devices and removing devices that are gone.
+        Returns the number of devices that changed.
+        """
+        seen = set()
+        changed = 0
+        for record in records:
+            seen.add(record["serial_number"])
+            changed += self.update(record)
+        with self._lock:
+            gone = set(self._items) - seen
+            for serial_number in gone:
+                self._discard(serial_number)
+            self.updates += len(gone)
+            self.refreshed_at = time.monotonic()
+            self.refreshes += 1
+        logging.info(f"{self.name} index synced, {changed + len(gone)} of {len(seen)} devices changed")
+        return changed + len(gone)
+
+    def refresh(self, channel):
+        """Syncs the index with a full GetAll of its dataset"""
+        return self.sync(self._records(channel))
+
+    async def refresh_async(self, channel):
+        """refresh for a grpc.aio channel"""
+        return self.sync([record async for record in self._records_async(channel)])
+
+    def start(self, get_channel):
+        """
+        Loads the index from a Subscribe stream and then applies its
+        delta updates in the background, so only changed devices are
+        sent and re-indexed. get_channel returns a CVP channel.
+        """
+        if self._subscriber is not None:
+            return
+        self._subscriber = Subscriber(self.name, get_channel, self._subscribe, self._on_message, on_open=self._on_open)
+        self._subscriber.start()
+
+    def stop(self):
+        if self._subscriber is not None:
+            self._subscriber.stop()
+            self._subscriber = None
+
+    def _on_open(self):
+        with self._lock:
+            if self._synced:
+                # The index was current until the previous stream dropped
+                self.refreshed_at = max(self.refreshed_at, self._subscriber.disconnected_at)
+            self._synced = False
+            self._initial_seen = set()
+
+    def _on_message(self, response):
+        operation = subscription_operation(response)
+        if operation == "INITIAL_SYNC_COMPLETE":
+            with self._lock:
+                # Devices removed while the subscription was down never get a DELETED
+                gone = set(self._items) - self._initial_seen
+                for serial_number in gone:
+                    self._discard(serial_number)
+                self.updates += len(gone)
+                self.refreshed_at = time.monotonic()
+                self.refreshes += 1
+                self._synced = True
+                self._initial_seen = set()
+            logging.info(f"{self.name} index synced from its subscription with {len(self)} devices")
+            return
+        if operation == "DELETED":
+            serial_number = response.value.key.device_id.value
+            if serial_number:
+                self.remove(serial_number)
+                self.deltas += 1
+            return
+        record = self._convert(response)
+        if record is None or not record["serial_number"]:
+            return
+        if operation == "INITIAL":
+            with self._lock:
+                self._initial_seen.add(record["serial_number"])
+        else:
+            self.deltas += 1
+        self.update(record)
+
+    def subscribed(self):
+        """True while a Subscribe stream is keeping the index current"""
+        subscriber = self._subscriber
+        return self._synced and subscriber is not None and subscriber.connected
+
+    def age(self):
+        if self.refreshed_at is None:
+            return None
+        if self.subscribed():
+            return 0.0
+        last_known_good = self.refreshed_at
+        subscriber = self._subscriber
+        if self._synced and subscriber is not None:
+            last_known_good = max(last_known_good, subscriber.disconnected_at)
+        return time.monotonic() - last_known_good
+
+    def is_fresh(self):
+        age = self.age()
+        return age is not None and age <= self.max_age
+
+    def refresh_once(self, get_channel, wait=False):
+        """
+        Refreshes the index unless a refresh is already running, so there
+        is one refresh at a time. With wait, waits for the running refresh
+        instead and only refreshes if the index is still empty, raising
+        its errors. A subscribed index is already current and is skipped.
+        Returns True if this call refreshed the index.
+        """
+        if self.subscribed():
+            return False
+        if not self._refreshing.acquire(blocking=wait):
+            return False
+        try:
+            if wait and self.refreshed_at is not None:
+                return False
+            self.refresh(get_channel())
+            return True
+        except Exception as e:
+            self.failed_refreshes += 1
+            self.last_error = str(e)
+            if wait:
+                raise
+            logging.error(f"{self.name} index refresh failed, serving the last snapshot: {e}")
+            return False
+        finally:
+            self._refreshing.release()
+
+    def refreshing(self):
+        return self._refreshing.locked()
+
+    def refresh_in_background(self, get_channel):
+        """Starts refresh_once in a daemon thread unless a refresh is already running"""
+        if self.refreshing():
+            return False
+        threading.Thread(target=self.refresh_once, args=(get_channel,), name=f"{self.name} index refresh", daemon=True).start()
+        return True
+
+    async def ensure_warm_async(self, get_channel):
+        """
+        Stale-while-revalidate: returns at once when the index holds a
+        snapshot, starting a background refresh when it is older than
+        max_age. Only the first load waits for CVP.
+        """
+        if self.refreshed_at is None:
+            await asyncio.to_thread(self.refresh_once, get_channel, True)
+        elif not self.is_fresh():
+            self.refresh_in_background(get_channel)
+
+    def all_records(self):
+        with self._lock:
+            return list(self._items.values())
+
+    def records(self, serial_numbers):
+        """Records for the serial numbers, skipping unknown devices"""
+        with self._lock:
+            return [self._items[serial_number] for serial_number in serial_numbers if serial_number in self._items]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "devices": len(self._items),
+                "age_seconds": round(self.age(), 3) if self.refreshed_at is not None else None,
+                "max_age_seconds": self.max_age,
+                "refreshes": self.refreshes,
+                "refreshing": self.refreshing(),
+                "subscribed": self.subscribed(),
+                "delta_updates": self.deltas,
+                "reconnects": self._subscriber.reconnects if self._subscriber is not None else 0,
+                "failed_refreshes": self.failed_refreshes,
+                "last_error": self.last_error,
+                "updates": self.updates,
+            }
+
+
+class BugExposureIndex(FleetIndex):
+    """
+    Inverted index over BugExposure records: bug ID, CVE ID and highest
+    bug or CVE exposure level, each to the set of exposed serial numbers.
+    Records are applied one at a time, only touching the postings of
+    devices whose exposure changed.
+    """
+
+    name = "Bug exposure"
+
+    def __init__(self, max_age=INDEX_MAX_AGE):
+        super().__init__(max_age)
+        self._by_bug = {}
+        self._by_cve = {}
+        self._by_exposure = {kind: {} for kind in EXPOSURE_KINDS}
+
+    def _add(self, exposure):
+        serial_number = exposure["serial_number"]
+        self._items[serial_number] = exposure
+        for bug_id in exposure["bug_ids"]:
+            self._by_bug.setdefault(bug_id, set()).add(serial_number)
+        for cve_id in exposure["cve_ids"]:
+            self._by_cve.setdefault(cve_id, set()).add(serial_number)
+        for kind, field in EXPOSURE_KINDS.items():
+            self._by_exposure[kind].setdefault(exposure[field], set()).add(serial_number)
+
+    def _discard(self, serial_number):
+        exposure = self._items.pop(serial_number, None)
+        if exposure is None:
+            return
+        postings = [(self._by_bug, bug_id) for bug_id in exposure["bug_ids"]]
+        postings += [(self._by_cve, cve_id) for cve_id in exposure["cve_ids"]]
+        postings += [(self._by_exposure[kind], exposure[field]) for kind, field in EXPOSURE_KINDS.items()]
+        for index, key in postings:
+            serials = index.get(key)
+            if serials is not None:
+                serials.discard(serial_number)
+                if not serials:
+                    del index[key]
+
+    def _records(self, channel):
+        return iter_all_bug_exposure(channel)
+
+    def _records_async(self, channel):
+        return iter_all_bug_exposure_async(channel)
+
+    def _subscribe(self, channel):
+        return grpc_subscribe_bug_exposure(channel)
+
+    def _convert(self, response):
+        # Skip the CVP server itself, as iter_all_bug_exposure does
+        if response.value.key.device_id.value == "127.0.0.1":
+            return None
+        return convert_response_to_bug_exposure(response)
+
+    def devices_exposed_to(self, bug_id=None, cve_id=None):
+        """Sorted serial numbers exposed to the bug and/or CVE, both must match when both are given"""
+        with self._lock:
+            matches = []
+            if bug_id is not None:
+                matches.append(self._by_bug.get(bug_id, set()))
+            if cve_id is not None:
+                matches.append(self._by_cve.get(cve_id, set()))
+            if not matches:
+                return []
+            return sorted(set.intersection(*matches))
+
+    def devices_with_exposure(self, level, kind="cve"):
+        """Sorted serial numbers whose highest bug or cve exposure is level"""
+        if kind not in EXPOSURE_KINDS:
+            raise ValueError(f"exposure type must be one of {', '.join(EXPOSURE_KINDS)}")
+        level = normalize_exposure(level)
+        with self._lock:
+            return sorted(self._by_exposure[kind].get(level, ()))
+
+    def stats(self):
+        _stats = super().stats()
+        with self._lock:
+            _stats["bugs"] = len(self._by_bug)
+            _stats["cves"] = len(self._by_cve)
+        return _stats
+
+
+class LifecycleIndex(FleetIndex):
+    """
+    DeviceLifecycleRecords with, per lifecycle milestone, a list of
+    (epoch, serial number) kept sorted so date ranges are found by
+    bisection. Devices without a date for a milestone are left out of
+    that milestone's list.
+    """
+
+    name = "Lifecycle"
+
+    def __init__(self, max_age=INDEX_MAX_AGE):
+        super().__init__(max_age)
+        self._by_date = {milestone: [] for milestone in LIFECYCLE_DATES}
+
+    def _add(self, record):
+        serial_number = record["serial_number"]
+        self._items[serial_number] = record
+        for milestone, dates in self._by_date.items():
+            if record[milestone] is not None:
+                bisect.insort(dates, (record[milestone], serial_number))
+
+    def _discard(self, serial_number):
+        record = self._items.pop(serial_number, None)
+        if record is None:
+            return
+        for milestone, dates in self._by_date.items():
+            entry = (record[milestone], serial_number)
+            if entry[0] is None:
+                continue
+            position = bisect.bisect_left(dates, entry)
+            if position < len(dates) and dates[position] == entry:
+                del dates[position]
+
+    def _records(self, channel):
+        return iter_all_device_lifecycle(channel, convert_response_to_lifecycle_record)
+
+    def _records_async(self, channel):
+        return iter_all_device_lifecycle_async(channel, convert_response_to_lifecycle_record)
+
+    def _subscribe(self, channel):
+        return grpc_subscribe_device_lifecycle(channel)
+
+    def _convert(self, response):
+        return convert_response_to_lifecycle_record(response)
+
+    def between(self, milestone, before=None, after=None):
+        """
+        DeviceLifecycleRecords whose milestone date is on or after the
+        after epoch and before the before epoch, earliest first.
+        Either bound may be None for an open range.
+        """
+        dates = self._by_date[normalize_milestone(milestone)]
+        with self._lock:
+            start = 0 if after is None else bisect.bisect_left(dates, (after,))
+            end = len(dates) if before is None else bisect.bisect_left(dates, (before,))
+            return [self._items[serial_number] for _, serial_number in dates[start:end]]
+
+
+class IndexWarmer:
+    """
+    Keeps indexes warm by refreshing each one in the background every
+    interval seconds plus a random jitter of up to jitter seconds, so
+    tools rarely find them stale and refreshes do not line up with other
+    servers polling the same CVP. Refreshes go through refresh_once, so
+    one started by a tool call is never doubled up.
+    """
+
+    def __init__(self, indexes, interval=WARM_INTERVAL, jitter=WARM_JITTER):
+        self.indexes = list(indexes)
+        self.interval = interval
+        self.jitter = jitter
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self, get_channel):
+        if self._threads or self.interval <= 0:
+            return
+        self._stop.clear()
+        for index in self.indexes:
+            thread = threading.Thread(target=self._run, args=(index, get_channel), name=f"{index.name} index warmer", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+
+    def _run(self, index, get_channel):
+        # Load at start, then refresh on the jittered interval
+        delay = 0
+        while not self._stop.wait(delay):
+            index.refresh_once(get_channel)
+            delay = self.interval + random.uniform(0, self.jitter)
+
+    def stats(self):
+        return {
+            "running": bool(self._threads),
+            "interval_seconds": self.interval,
+            "jitter_seconds": self.jitter,
+        }
+
+
+bug_exposure_index = BugExposureIndex()
+lifecycle_index = LifecycleIndex()
+index_warmer = IndexWarmer([bug_exposure_index, lifecycle_index])
@@ -0,0 +1,143 @@
+"""
+grpc and grpc.aio client interceptors recording CVP RPC timings in the
+metrics registry. Channels only carry them while metrics are enabled.
+"""
+import time
+import grpc
+from cvp_mcp.metrics import registry, RPC_DURATION, RPC_FIRST_MESSAGE, RPC_STREAM_MESSAGES
+
+
+def rpc_name(method):
+    """Short RPC name, e.g. DeviceService/GetAll for /arista.inventory.v1.DeviceService/GetAll"""
+    if isinstance(method, bytes):
+        method = method.decode()
+    service, _, rpc = method.rpartition("/")
+    return f"{service.rpartition('.')[2]}/{rpc}"
+
+
+class UnaryUnaryMetricsInterceptor(grpc.aio.UnaryUnaryClientInterceptor):
+    """Records the duration of unary RPCs such as GetOne"""
+
+    async def intercept_unary_unary(self, continuation, client_call_details, request):
+        start = time.perf_counter()
+        call = await continuation(client_call_details, request)
+        try:
+            await call
+        except grpc.RpcError:
+            pass
+        finally:
+            RPC_DURATION.observe(time.perf_counter() - start, rpc_name(client_call_details.method))
+        return call
+
+
+class UnaryStreamMetricsInterceptor(grpc.aio.UnaryStreamClientInterceptor):
+    """
+    Records, per server stream, the time to the first message, the time
+    to the last message and the number of messages received. A stream
+    cancelled early is recorded when it is closed.
+    """
+
+    async def intercept_unary_stream(self, continuation, client_call_details, request):
+        start = time.perf_counter()
+        call = await continuation(client_call_details, request)
+        name = rpc_name(client_call_details.method)
+
+        async def _responses():
+            messages = 0
+            last = start
+            try:
+                async for response in call:
+                    last = time.perf_counter()
+                    if not messages:
+                        RPC_FIRST_MESSAGE.observe(last - start, name)
+                    messages += 1
+                    yield response
+            finally:
+                RPC_DURATION.observe(last - start, name)
+                RPC_STREAM_MESSAGES.observe(messages, name)
+        return _responses()
+
+
+class MeasuredStream:
+    """
+    Wraps a sync response stream, recording the time to its first and
+    last message and its message count as it is read. The stream is
+    recorded when it ends, fails, or is cancelled or closed early.
+    Other attributes such as code() are passed through to the stream.
+    """
+
+    def __init__(self, stream, name, start):
+        self._stream = stream
+        self._name = name
+        self._start = start
+        self._last = start
+        self._messages = 0
+        self._finished = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            response = next(self._stream)
+        except BaseException:
+            self._finish()
+            raise
+        self._last = time.perf_counter()
+        if not self._messages:
+            RPC_FIRST_MESSAGE.observe(self._last - self._start, self._name)
+        self._messages += 1
+        return response
+
+    def _finish(self):
+        if not self._finished:
+            self._finished = True
+            RPC_DURATION.observe(self._last - self._start, self._name)
+            RPC_STREAM_MESSAGES.observe(self._messages, self._name)
+
+    def cancel(self):
+        self._finish()
+        return self._stream.cancel()
+
+    def close(self):
+        self._finish()
+        return self._stream.close()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+class SyncUnaryUnaryMetricsInterceptor(grpc.UnaryUnaryClientInterceptor):
+    """Records the duration of unary RPCs on sync channels"""
+
+    def intercept_unary_unary(self, continuation, client_call_details, request):
+        start = time.perf_counter()
+        outcome = continuation(client_call_details, request)
+        RPC_DURATION.observe(time.perf_counter() - start, rpc_name(client_call_details.method))
+        return outcome
+
+
+class SyncUnaryStreamMetricsInterceptor(grpc.UnaryStreamClientInterceptor):
+    """
+    Records server streams on sync channels, such as the GetAll and
+    Subscribe streams behind the index and cache refreshes
+    """
+
+    def intercept_unary_stream(self, continuation, client_call_details, request):
+        start = time.perf_counter()
+        call = continuation(client_call_details, request)
+        return MeasuredStream(call, rpc_name(client_call_details.method), start)
+
+
+def rpc_interceptors():
+    """Interceptors for new grpc.aio channels, none while metrics are disabled"""
+    if not registry.enabled:
+        return None
+    return [UnaryUnaryMetricsInterceptor(), UnaryStreamMetricsInterceptor()]
+
+
+def sync_rpc_interceptors():
+    """Interceptors for new sync channels, none while metrics are disabled"""
+    if not registry.enabled:
+        return []
+    return [SyncUnaryUnaryMetricsInterceptor(), SyncUnaryStreamMetricsInterceptor()]
@@ -1,50 +1,176 @@
 from arista.inventory.v1 import models
 from arista.inventory.v1 import services
 from google.protobuf import wrappers_pb2 as wrappers
-from .utils import RPC_TIMEOUT, createConnection, convert_response_to_switch
-from .models import SwitchInfo
+from .utils import createConnection, convert_response_to_switch, fan_out, fan_out_async
+from .models import SwitchInfo, switch_to_dict
+from .pipeline import filter_records
+from .retry import rpc_policy
+from cvp_mcp import output
+import fnmatch
 import grpc
+import heapq
 import logging
 import os
 import json
 
-def grpc_all_inventory(channel):
+# Number of serial numbers sent as partial_eq_filters in one GetAll request
+INVENTORY_BATCH_SIZE = 200
+# Switch fields bulk lookups match on, and the Device field CVP filters
+INVENTORY_LOOKUP_FIELDS = {
+    "serial_number": "key",
+    "hostname": "hostname",
+    "system_mac": "system_mac_address",
+}
+
+STREAMING_STATUSES = {
+    "Inactive": models.STREAMING_STATUS_INACTIVE,
+    "Active": models.STREAMING_STATUS_ACTIVE,
+}
+
+def normalize_streaming_status(streaming_status):
+    if not streaming_status:
+        return None
+    status = streaming_status.strip().capitalize()
+    if status not in STREAMING_STATUSES:
+        raise ValueError(f"streaming_status must be one of {', '.join(STREAMING_STATUSES)}")
+    return status
+
+def inventory_stream_request(streaming_status=None, model=None, version=None):
     """
-    Prints the hostname of all devices known to the system.
-    Optionally filters based on the only_active and only_inactive arguments.
-    When filtering, only_active takes priority to only_inactive if both are set.
+    Builds a DeviceStreamRequest for only Active and Inactive streaming devices.
+    CVP can also narrow the stream by streaming status, model and EOS version.
+    Hostnames are not pushed down, CVP matches them case-sensitively while
+    inventory_predicate and the cache match them case-insensitively.
+    """
+    get_all_req = services.DeviceStreamRequest()
+    streaming_status = normalize_streaming_status(streaming_status)
+    # Add filters to only get Active and Inactive streaming devices.
+    # partial_eq_filters are OR'ed, so every status carries the other fields
+    for status, status_value in STREAMING_STATUSES.items():
+        if streaming_status and status != streaming_status:
+            continue
+        device = models.Device(streaming_status=status_value)
+        if model:
+            device.model_name.value = model
+        if version:
+            device.software_version.value = version
+        get_all_req.partial_eq_filter.append(device)
+    return(get_all_req)
+
+def inventory_predicate(model=None, version=None, hostname=None, device_type=None, streaming_status=None):
+    """
+    Returns a function that is true for the switches matching every given filter.
+    hostname may be a glob and is matched case-insensitively, as is device_type.
+    """
+    streaming_status = normalize_streaming_status(streaming_status)
+    hostname = hostname.lower() if hostname else None
+    device_type = device_type.lower() if device_type else None
+    def _matches(switch):
+        if model and switch["model"] != model:
+            return False
+        if version and switch["version"] != version:
+            return False
+        if streaming_status and switch["streaming_status"] != streaming_status:
+            return False
+        if device_type and switch["device_type"].lower() != device_type:
+            return False
+        if hostname and not fnmatch.fnmatchcase(switch["hostname"].lower(), hostname):
+            return False
+        return True
+    return _matches
+
+def filter_inventory(switches, **filters):
+    """
+    Yields the switches matching every inventory_predicate filter
+    """
+    return filter_records(switches, inventory_predicate(**filters))
+
+def paginate_inventory(switches, limit=None, cursor=None):
+    """
+    Returns (page, next_cursor) for switches ordered by serial number.
+    cursor is the last serial number of the previous page, next_cursor is
+    None once there are no more devices. Without limit or cursor the
+    switches are returned as-is.
+    """
+    if not limit and not cursor:
+        return(list(switches), None)
+    if cursor:
+        switches = (switch for switch in switches if switch["serial_number"] > cursor)
+    if not limit:
+        return(sorted(switches, key=lambda switch: switch["serial_number"]), None)
+    # Only the next limit + 1 devices are held, not the whole fleet
+    page = heapq.nsmallest(limit + 1, switches, key=lambda switch: switch["serial_number"])
+    if len(page) > limit:
+        page = page[:limit]
+        return(page, page[-1]["serial_number"])
+    return(page, None)
+
+def bulk_inventory_request(values, field="serial_number"):
+    """
+    Builds a DeviceStreamRequest matching any of the given serial numbers,
+    or hostnames or system MACs when field is hostname or system_mac
+    """
+    if field not in INVENTORY_LOOKUP_FIELDS:
+        raise ValueError(f"field must be one of {', '.join(INVENTORY_LOOKUP_FIELDS)}")
+    get_all_req = services.DeviceStreamRequest()
+    for value in values:
+        if field == "serial_number":
+            device = models.Device(key=models.DeviceKey(device_id=wrappers.StringValue(value=value)))
+        else:
+            device = models.Device(**{INVENTORY_LOOKUP_FIELDS[field]: wrappers.StringValue(value=value)})
+        get_all_req.partial_eq_filter.append(device)
+    return(get_all_req)
+
+def iter_all_inventory(channel, get_all_req=None):
+    """
+    Yields each device with a valid System MAC as it arrives from CVP.
+    Defaults to all Active and Inactive streaming devices.
+    Closing the generator early cancels the stream.
     """
-    logging.info("CVP Get all Tool")
-    all_active = []
-    all_inactive = []
     # create the Python stub for the inventory API
     # this is essentially the client, but Python gRPC refers to them as "stubs"
     # because they call into the gRPC C API
     stub = services.DeviceServiceStub(channel)
-    get_all_req = services.DeviceStreamRequest()
-    # Add filters to only get Active and Inactive streaming devices
-    get_all_req.partial_eq_filter.append(models.Device(
-        streaming_status=models.STREAMING_STATUS_INACTIVE,
-    ))
-    get_all_req.partial_eq_filter.append(models.Device(
-        streaming_status=models.STREAMING_STATUS_ACTIVE,
-    ))
-    for device in stub.GetAll(get_all_req, timeout=RPC_TIMEOUT):
-        try:
-            # Check to make sure the device has a valid System MAC
-            if device.value.system_mac_address.value:
+    if get_all_req is None:
+        get_all_req = inventory_stream_request()
+    stream = rpc_policy.stream(stub.GetAll, get_all_req, "DeviceService/GetAll")
+    try:
+        for device in stream:
+            try:
+                # Check to make sure the device has a valid System MAC
+                if not device.value.system_mac_address.value:
+                    continue
                 switch = convert_response_to_switch(device)
-                match switch["streaming_status"]:
-                    case "Active":
-                        logging.debug(f"Active: {switch['hostname']}")
-                        all_active.append(switch)
-                    case "Inactive":
-                        logging.debug(f"Inactive: {switch['hostname']}")
-                        all_inactive.append(switch)
-        except Exception as e:
-            logging.error(f"Error with device: {e}")
+            except Exception as e:
+                logging.error(f"Error with device: {e}")
+                continue
+            yield switch
+    finally:
+        stream.close()
+
+def split_inventory(switches):
+    """
+    Splits switches into (all_active, all_inactive) lists by streaming status
+    """
+    all_active = []
+    all_inactive = []
+    for switch in switches:
+        match switch["streaming_status"]:
+            case "Active":
+                logging.debug(f"Active: {switch['hostname']}")
+                all_active.append(switch)
+            case "Inactive":
+                logging.debug(f"Inactive: {switch['hostname']}")
+                all_inactive.append(switch)
     return(all_active, all_inactive)
-    # return(json.dumps(all_devices))
+
+def grpc_all_inventory(channel):
+    """
+    Gets all Active and Inactive streaming devices known to the system.
+    Returns (all_active, all_inactive)
+    """
+    logging.info("CVP Get all Tool")
+    return(split_inventory(iter_all_inventory(channel)))
 
 def grpc_one_inventory_serial(channel, device_id):
     """
@@ -60,10 +186,134 @@ def grpc_one_inventory_serial(channel, device_id):
     except Exception as e:
         logging.error(e)
     try:
-        device = stub.GetOne(req)
+        device = rpc_policy.call(stub.GetOne, req, "DeviceService/GetOne")
         converted_device = convert_response_to_switch(device)
-        logging.debug(json.dumps(converted_device ))
+        output.debug_json("", switch_to_dict(converted_device))
         return(converted_device )
-    except:
+    except Exception as e:
+        logging.debug(f"Get one device {device_id}: {e}")
         return(SwitchInfo())
 
+
+def grpc_bulk_inventory_serial(channel, device_ids, max_workers=None):
+    """
+    Function to get details of many devices from CloudVision at once.
+    Serial numbers are sent as partial_eq_filters on one GetAll stream per
+    batch, with the batches streamed concurrently, instead of one GetOne
+    per device.
+    Returns a dict keyed by serial number, in the order requested, with an
+    empty SwitchInfo for any device that was not found.
+    """
+    logging.info("Get bulk devices from CVP by serial number")
+    unique_ids = [device_id for device_id in dict.fromkeys(device_ids) if device_id]
+    def _get_batch(start):
+        get_all_req = bulk_inventory_request(unique_ids[start:start + INVENTORY_BATCH_SIZE])
+        return {switch["serial_number"]: switch for switch in iter_all_inventory(channel, get_all_req)}
+    found = {}
+    starts = range(0, len(unique_ids), INVENTORY_BATCH_SIZE)
+    for batch in fan_out(_get_batch, starts, max_workers, default={}, label="Error with bulk device lookup"):
+        found.update(batch)
+    return({device_id: found.get(device_id, SwitchInfo()) for device_id in unique_ids})
+
+def grpc_subscribe_inventory(channel):
+    """
+    Opens a long-lived Subscribe stream of inventory changes for Active and
+    Inactive streaming devices. The caller iterates and cancels the stream.
+    """
+    stub = services.DeviceServiceStub(channel)
+    return(stub.Subscribe(inventory_stream_request()))
+
+# ===================================================
+# asyncio variants for grpc.aio channels
+# ===================================================
+
+async def iter_all_inventory_async(channel, get_all_req=None):
+    """
+    grpc.aio variant of iter_all_inventory
+    """
+    stub = services.DeviceServiceStub(channel)
+    if get_all_req is None:
+        get_all_req = inventory_stream_request()
+    call = rpc_policy.stream_async(stub.GetAll, get_all_req, "DeviceService/GetAll")
+    try:
+        async for device in call:
+            try:
+                # Check to make sure the device has a valid System MAC
+                if not device.value.system_mac_address.value:
+                    continue
+                switch = convert_response_to_switch(device)
+            except Exception as e:
+                logging.error(f"Error with device: {e}")
+                continue
+            yield switch
+    finally:
+        await call.aclose()
+
+async def grpc_all_inventory_async(channel):
+    """
+    Gets all Active and Inactive devices over a grpc.aio channel.
+    Returns (all_active, all_inactive) like grpc_all_inventory
+    """
+    logging.info("CVP Get all Tool")
+    return(split_inventory([switch async for switch in iter_all_inventory_async(channel)]))
+
+async def grpc_one_inventory_serial_async(channel, device_id):
+    """
+    Function to get details of one device from CloudVision over a grpc.aio channel
+    """
+    logging.info("Get one device from CVP by serial number")
+    stub = services.DeviceServiceStub(channel)
+    try:
+        req = services.DeviceRequest(
+            key={"device_id": wrappers.StringValue(value=device_id)}
+        )
+        device = await rpc_policy.call_async(stub.GetOne, req, "DeviceService/GetOne", hedge=True)
+        return(convert_response_to_switch(device))
+    except Exception as e:
+        logging.debug(f"Get one device {device_id}: {e}")
+        return(SwitchInfo())
+
+async def grpc_bulk_inventory_async(channel, values, field="serial_number", max_workers=None):
+    """
+    Gets every device whose serial number, hostname or system MAC (per
+    field) is one of values over a grpc.aio channel. The values are sent
+    as partial_eq_filters, INVENTORY_BATCH_SIZE per GetAll stream, with
+    the streams run concurrently. Returns the matching switches.
+    """
+    unique_values = [value for value in dict.fromkeys(values) if value]
+    async def _get_batch(start):
+        get_all_req = bulk_inventory_request(unique_values[start:start + INVENTORY_BATCH_SIZE], field)
+        return [switch async for switch in iter_all_inventory_async(channel, get_all_req)]
+    switches = []
+    starts = range(0, len(unique_values), INVENTORY_BATCH_SIZE)
+    for batch in await fan_out_async(_get_batch, starts, max_workers, default=[], label="Error with bulk device lookup"):
+        switches.extend(batch)
+    return(switches)
+
+async def grpc_bulk_inventory_serial_async(channel, device_ids, max_workers=None):
+    """
+    grpc.aio variant of grpc_bulk_inventory_serial
+    """
+    logging.info("Get bulk devices from CVP by serial number")
+    unique_ids = [device_id for device_id in dict.fromkeys(device_ids) if device_id]
+    found = {switch["serial_number"]: switch for switch in await grpc_bulk_inventory_async(channel, unique_ids, max_workers=max_workers)}
+    return({device_id: found.get(device_id, SwitchInfo()) for device_id in unique_ids})
+
+def iter_filtered_inventory_async(channel, model=None, version=None, hostname=None, device_type=None, streaming_status=None):
+    """
+    Yields the Active and Inactive devices matching the filters over a
+    grpc.aio channel. Filters CVP supports are pushed down as
+    partial_eq_filters, the rest are applied while the stream is read.
+    """
+    get_all_req = inventory_stream_request(streaming_status, model, version)
+    return(filter_inventory(
+        iter_all_inventory_async(channel, get_all_req),
+        model=model, version=version, hostname=hostname, device_type=device_type, streaming_status=streaming_status
+    ))
+
+async def grpc_filtered_inventory_async(channel, **filters):
+    """
+    Gets the Active and Inactive devices matching the filters over a grpc.aio channel
+    """
+    logging.info("CVP Get filtered inventory")
+    return([switch async for switch in iter_filtered_inventory_async(channel, **filters)])
@@ -1,8 +1,9 @@
 from arista.lifecycle.v1 import models
 from arista.lifecycle.v1 import services
 from google.protobuf import wrappers_pb2 as wrappers
-from .utils import RPC_TIMEOUT, convert_response_to_device_lifecycle
+from .utils import convert_response_to_device_lifecycle
 from .models import DeviceLifecycleSummary
+from .retry import rpc_policy
 import grpc
 import logging
 import os
@@ -11,19 +12,65 @@ import sys
 
 
 
+def iter_all_device_lifecycle(channel, convert=convert_response_to_device_lifecycle):
+    """
+    Yields each Device Lifecycle summary as it arrives from CVP.
+    convert_response_to_lifecycle_record can be passed as convert to get
+    DeviceLifecycleRecords with epoch dates instead of formatted ones.
+    Closing the generator early cancels the stream.
+    """
+    stub = services.DeviceLifecycleSummaryServiceStub(channel)
+    get_all_req = services.DeviceLifecycleSummaryStreamRequest()
+    stream = rpc_policy.stream(stub.GetAll, get_all_req, "DeviceLifecycleSummaryService/GetAll")
+    try:
+        for device in stream:
+            try:
+                _device = convert(device)
+            except Exception as e:
+                logging.error(f"Error with device Lifecycle: {e}")
+                continue
+            yield _device
+    finally:
+        stream.close()
+
+
 def grpc_all_device_lifecycle(channel):
     """
     Gets all Device Lifecycle Stats  in CVP
     """
-    all_devices = []
+    return(list(iter_all_device_lifecycle(channel)))
+
+
+def grpc_subscribe_device_lifecycle(channel):
+    """
+    Opens a long-lived Subscribe stream of Device Lifecycle summary changes.
+    The caller iterates and cancels the stream.
+    """
+    stub = services.DeviceLifecycleSummaryServiceStub(channel)
+    return(stub.Subscribe(services.DeviceLifecycleSummaryStreamRequest()))
+
+
+async def iter_all_device_lifecycle_async(channel, convert=convert_response_to_device_lifecycle):
+    """
+    grpc.aio variant of iter_all_device_lifecycle
+    """
     stub = services.DeviceLifecycleSummaryServiceStub(channel)
     get_all_req = services.DeviceLifecycleSummaryStreamRequest()
-    for device in stub.GetAll(get_all_req, timeout=RPC_TIMEOUT):
-        try:
-            _device = convert_response_to_device_lifecycle(device)
-            all_devices.append(_device)
-        except Exception as e:
-            logging.error(f"Error with device Lifecycle: {e}")
-    return(all_devices)
+    call = rpc_policy.stream_async(stub.GetAll, get_all_req, "DeviceLifecycleSummaryService/GetAll")
+    try:
+        async for device in call:
+            try:
+                _device = convert(device)
+            except Exception as e:
+                logging.error(f"Error with device Lifecycle: {e}")
+                continue
+            yield _device
+    finally:
+        await call.aclose()
 
 
+async def grpc_all_device_lifecycle_async(channel):
+    """
+    Gets all Device Lifecycle Stats in CVP over a grpc.aio channel
+    """
+    return([device async for device in iter_all_device_lifecycle_async(channel)])
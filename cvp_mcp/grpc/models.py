@@ -1,4 +1,4 @@
-from typing import TypedDict
+from typing import Optional, TypedDict
 
 
 class SwitchInfo(TypedDict):
@@ -13,6 +13,63 @@ class SwitchInfo(TypedDict):
     fqdn: str
     domain_name: str
 
+class SwitchRecord:
+    """
+    Compact, slotted form of SwitchInfo used while streaming and caching
+    inventory. Fields are read like SwitchInfo keys, switch["hostname"],
+    and to_dict() turns it into a SwitchInfo at the response boundary.
+    """
+    __slots__ = tuple(SwitchInfo.__annotations__)
+
+    def __init__(self, hostname="", model="", serial_number="", system_mac="", version="",
+                 streaming_status="", device_type="", hardware_revision="", fqdn="", domain_name=""):
+        self.hostname = hostname
+        self.model = model
+        self.serial_number = serial_number
+        self.system_mac = system_mac
+        self.version = version
+        self.streaming_status = streaming_status
+        self.device_type = device_type
+        self.hardware_revision = hardware_revision
+        self.fqdn = fqdn
+        self.domain_name = domain_name
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in self.__slots__
+
+    def __eq__(self, other):
+        if isinstance(other, SwitchRecord):
+            other = other.to_dict()
+        return self.to_dict() == other
+
+    def __repr__(self):
+        return f"SwitchRecord({self.to_dict()!r})"
+
+    def to_dict(self) -> SwitchInfo:
+        return SwitchInfo(
+            hostname = self.hostname,
+            model = self.model,
+            serial_number = self.serial_number,
+            system_mac = self.system_mac,
+            version = self.version,
+            streaming_status = self.streaming_status,
+            device_type = self.device_type,
+            hardware_revision = self.hardware_revision,
+            fqdn = self.fqdn,
+            domain_name = self.domain_name
+        )
+
+def switch_to_dict(switch):
+    """Returns a SwitchInfo for a SwitchRecord, anything else is returned as-is"""
+    if isinstance(switch, SwitchRecord):
+        return switch.to_dict()
+    return switch
+
 class BugExposure(TypedDict):
     serial_number: str
     bug_ids: list[int]
@@ -48,6 +105,16 @@ class DeviceLifecycleSummary(TypedDict):
     software_eol: DeviceSoftwareEoL
     hardware_lifecycle_summary: DeviceHardwareEoL
 
+class DeviceLifecycleRecord(TypedDict):
+    """Lifecycle dates as epoch seconds, None when CVP has no date"""
+    serial_number: str
+    software_version: str
+    end_of_support: Optional[int]
+    end_of_life: Optional[int]
+    end_of_sale: Optional[int]
+    end_of_tac_support: Optional[int]
+    end_of_hardware_rma_request: Optional[int]
+
 # ===================================================
 # Endpoint Location Models
 # ===================================================
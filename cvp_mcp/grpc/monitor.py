@@ -1,8 +1,9 @@
 from arista.connectivitymonitor.v1 import models
 from arista.connectivitymonitor.v1 import services
 from google.protobuf import wrappers_pb2 as wrappers
-from .utils import RPC_TIMEOUT, convert_response_to_probe_stat
+from .utils import convert_response_to_probe_stat
 from .models import ProbeStats
+from .retry import rpc_policy
 import grpc
 import logging
 import os
@@ -11,28 +12,38 @@ import sys
 
 
 
+def iter_all_probe_status(channel, get_all_req=None):
+    """
+    Yields each Connectivity Monitor Probe Stat as it arrives from CVP.
+    Closing the generator early cancels the stream.
+    """
+    stub = services.ProbeStatsServiceStub(channel)
+    if get_all_req is None:
+        get_all_req = services.ProbeStatsStreamRequest()
+    stream = rpc_policy.stream(stub.GetAll, get_all_req, "ProbeStatsService/GetAll")
+    try:
+        for probe in stream:
+            try:
+                _probe = convert_response_to_probe_stat(probe)
+            except Exception as e:
+                logging.error(f"Error with probe: {e}")
+                continue
+            yield _probe
+    finally:
+        stream.close()
+
+
 def grpc_all_probe_status(channel):
     """
     Gets all Connectivity Monitor Probe Stats  in CVP
     """
-    all_probes = []
-    stub = services.ProbeStatsServiceStub(channel)
-    get_all_req = services.ProbeStatsStreamRequest()
-    for probe in stub.GetAll(get_all_req, timeout=RPC_TIMEOUT):
-        try:
-            _probe = convert_response_to_probe_stat(probe)
-            all_probes.append(_probe)
-        except Exception as e:
-            logging.error(f"Error with probe: {e}")
-    return(all_probes)
+    return(list(iter_all_probe_status(channel)))
 
 
-def grpc_one_probe_status(channel, serial_number="", host="", vrf="", sourceIntf=""):
+def probe_stats_request(serial_number="", host="", vrf="", sourceIntf=""):
     """
-    Gets one Connectivity Monitor Probe Stats in CVP
+    Builds a ProbeStatsStreamRequest filtered on any of the given key fields
     """
-    all_probes = []
-    stub = services.ProbeStatsServiceStub(channel)
     get_all_req = services.ProbeStatsStreamRequest()
     if serial_number:
         get_all_req.partial_eq_filter.append(
@@ -66,13 +77,66 @@ def grpc_one_probe_status(channel, serial_number="", host="", vrf="", sourceIntf
                 )
             )
         )
+    return(get_all_req)
+
+
+def grpc_one_probe_status(channel, serial_number="", host="", vrf="", sourceIntf=""):
+    """
+    Gets one Connectivity Monitor Probe Stats in CVP
+    """
+    get_all_req = probe_stats_request(serial_number, host, vrf, sourceIntf)
+    try:
+        return(list(iter_all_probe_status(channel, get_all_req)))
+    except Exception as e:
+        logging.error(f"Error with probe: {e}")
+        return(ProbeStats())
+
+
+def grpc_subscribe_probe_status(channel, get_all_req=None):
+    """
+    Opens a long-lived Subscribe stream of Connectivity Monitor Probe Stats.
+    The caller iterates and cancels the stream.
+    """
+    stub = services.ProbeStatsServiceStub(channel)
+    if get_all_req is None:
+        get_all_req = services.ProbeStatsStreamRequest()
+    return(stub.Subscribe(get_all_req))
+
+
+async def iter_all_probe_status_async(channel, get_all_req=None):
+    """
+    grpc.aio variant of iter_all_probe_status
+    """
+    stub = services.ProbeStatsServiceStub(channel)
+    if get_all_req is None:
+        get_all_req = services.ProbeStatsStreamRequest()
+    call = rpc_policy.stream_async(stub.GetAll, get_all_req, "ProbeStatsService/GetAll")
+    try:
+        async for probe in call:
+            try:
+                _probe = convert_response_to_probe_stat(probe)
+            except Exception as e:
+                logging.error(f"Error with probe: {e}")
+                continue
+            yield _probe
+    finally:
+        await call.aclose()
+
+
+async def grpc_all_probe_status_async(channel):
+    """
+    Gets all Connectivity Monitor Probe Stats in CVP over a grpc.aio channel
+    """
+    return([probe async for probe in iter_all_probe_status_async(channel)])
+
+
+async def grpc_one_probe_status_async(channel, serial_number="", host="", vrf="", sourceIntf=""):
+    """
+    Gets one Connectivity Monitor Probe Stats in CVP over a grpc.aio channel
+    """
+    get_all_req = probe_stats_request(serial_number, host, vrf, sourceIntf)
     try:
-        for _probe in  stub.GetAll(get_all_req, timeout=RPC_TIMEOUT):
-            logging.debug(f"One PRE PROBE: {_probe}")
-            probe = convert_response_to_probe_stat(_probe)
-            logging.debug(f"One PROBE: {probe}")
-            all_probes.append(probe)
-        return(all_probes)
+        return([probe async for probe in iter_all_probe_status_async(channel, get_all_req)])
     except Exception as e:
         logging.error(f"Error with probe: {e}")
         return(ProbeStats())
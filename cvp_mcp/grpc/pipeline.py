@@ -0,0 +1,142 @@
+"""
+Composable stages over the record streams yielded by the iter_all_* fetchers.
+Every stage accepts either a regular or an async iterable and returns the
+same kind, so stages chain the same way for sync and grpc.aio fetchers:
+
+    records = limit(project(filter_records(iter_all_probe_status(channel), is_lossy), fields), 10)
+"""
+import logging
+
+
+def _is_async(records):
+    return hasattr(records, "__aiter__")
+
+
+def filter_records(records, predicate):
+    """Keeps the records for which predicate(record) is true"""
+    if _is_async(records):
+        async def _filter():
+            async for record in records:
+                if predicate(record):
+                    yield record
+        return _filter()
+    return (record for record in records if predicate(record))
+
+
+def enrich(records, func):
+    """Replaces each record with func(record), records that fail are passed through as-is"""
+    def _enrich_one(record):
+        try:
+            return func(record)
+        except Exception as e:
+            logging.error(f"Error enriching record: {e}")
+            return record
+    if _is_async(records):
+        async def _enrich():
+            async for record in records:
+                yield _enrich_one(record)
+        return _enrich()
+    return (_enrich_one(record) for record in records)
+
+
+def parse_fields(fields):
+    """
+    Turns field names into a selection tree, e.g. ["a", "b.c"] becomes
+    {"a": None, "b": {"c": None}} where None selects the whole value
+    """
+    tree = {}
+    for field in fields:
+        node = tree
+        *parents, leaf = field.split(".")
+        for name in parents:
+            if name in node and node[name] is None:
+                break
+            node = node.setdefault(name, {})
+        else:
+            node[leaf] = None
+    return tree
+
+
+def select_fields(record, tree):
+    """
+    Keeps the fields of record in a parse_fields tree, a list is treated
+    as a list of records. A record with none of the fields becomes {}.
+    """
+    if isinstance(record, list):
+        return [select_fields(item, tree) for item in record]
+    if not isinstance(record, dict):
+        return record
+    return {name: record[name] if sub is None else select_fields(record[name], sub) for name, sub in tree.items() if name in record}
+
+
+def project(records, fields=None):
+    """
+    Keeps only the given fields of each record, all fields when fields is
+    empty. Dots select nested fields, e.g. "software_eol.end_of_support".
+    """
+    if not fields:
+        return records
+    tree = parse_fields(fields)
+    def _project_one(record):
+        return select_fields(record, tree)
+    if _is_async(records):
+        async def _project():
+            async for record in records:
+                yield _project_one(record)
+        return _project()
+    return (_project_one(record) for record in records)
+
+
+def limit(records, count=None):
+    """
+    Stops after count records and closes the upstream iterator, which
+    cancels the underlying CVP stream. No limit when count is None.
+    """
+    if count is None:
+        return records
+    if _is_async(records):
+        async def _limit():
+            if count <= 0:
+                await _aclose(records)
+                return
+            seen = 0
+            try:
+                async for record in records:
+                    yield record
+                    seen += 1
+                    if seen >= count:
+                        break
+            finally:
+                await _aclose(records)
+        return _limit()
+    def _limit():
+        if count <= 0:
+            _close(records)
+            return
+        seen = 0
+        try:
+            for record in records:
+                yield record
+                seen += 1
+                if seen >= count:
+                    break
+        finally:
+            _close(records)
+    return _limit()
+
+
+async def collect(records):
+    """Gathers an async record stream into a list"""
+    return [record async for record in records]
+
+
+def _close(records):
+    close = getattr(records, "close", None)
+    if close:
+        close()
+
+
+async def _aclose(records):
+    aclose = getattr(records, "aclose", None)
+    if aclose:
+        await aclose()
@@ -0,0 +1,229 @@
+"""
+Timeouts, retries and hedging for CVP RPCs. Every GetOne and GetAll
+goes through rpc_policy, which takes its timeout from the calling tool's
+deadline budget, retries UNAVAILABLE and RESOURCE_EXHAUSTED with jittered
+exponential backoff, and can hedge slow grpc.aio GetOne calls with a
+duplicate request.
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+import grpc
+from cvp_mcp.deadline import DeadlineExceeded, rpc_timeout, remaining, record_expired
+from .utils import RPC_TIMEOUT
+
+RETRYABLE_CODES = (grpc.StatusCode.UNAVAILABLE, grpc.StatusCode.RESOURCE_EXHAUSTED)
+# Retries after the first attempt, and the backoff before each one
+RPC_RETRIES = 2
+RETRY_BASE_DELAY = 0.1
+RETRY_MAX_DELAY = 2.0
+# Retry throttling as in gRPC's retry policy: failures spend a token,
+# successes earn back a fraction of one, and retries and hedges stop
+# while fewer than half the tokens are left, so an unhealthy CVP is not
+# hit with extra load
+RETRY_TOKENS = 10
+RETRY_TOKEN_RATIO = 0.1
+# Seconds before a slow GetOne is hedged with a duplicate request, 0 disables hedging
+HEDGE_DELAY = 0
+
+
+class RpcPolicy:
+    """
+    Runs unary and server streaming RPCs with deadline budget timeouts,
+    throttled retries and optional hedging. Streams are only retried
+    before their first message, so no record is ever delivered twice.
+    """
+
+    def __init__(self, retries=RPC_RETRIES, base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY, hedge_delay=HEDGE_DELAY):
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge_delay = hedge_delay
+        self.counters = {"calls": 0, "retries": 0, "throttled": 0, "hedged": 0, "hedge_wins": 0, "deadline_exceeded": 0}
+        self._tokens = RETRY_TOKENS
+        self._lock = threading.Lock()
+
+    def _count(self, counter):
+        with self._lock:
+            self.counters[counter] += 1
+
+    def _succeeded(self):
+        with self._lock:
+            self._tokens = min(RETRY_TOKENS, self._tokens + RETRY_TOKEN_RATIO)
+
+    def _throttled(self):
+        return self._tokens <= RETRY_TOKENS / 2
+
+    def _deadline_exceeded(self, error, name):
+        """Records error against the tool call's budget when the RPC ran out of time"""
+        if isinstance(error, DeadlineExceeded) or error.code() == grpc.StatusCode.DEADLINE_EXCEEDED:
+            self._count("deadline_exceeded")
+            record_expired(name)
+            return True
+        return False
+
+    def _backoff(self, attempt, error, name):
+        """
+        Seconds to wait before retrying after error, or None when the
+        error is final. Spends a retry token for retryable errors.
+        """
+        if self._deadline_exceeded(error, name):
+            return None
+        code = error.code()
+        if code not in RETRYABLE_CODES:
+            return None
+        with self._lock:
+            self._tokens = max(0, self._tokens - 1)
+        if attempt >= self.retries:
+            return None
+        if self._throttled():
+            self._count("throttled")
+            return None
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        left = remaining()
+        if left is not None and delay >= left:
+            return None
+        self._count("retries")
+        logging.warning(f"{name} failed with {code.name}, retry {attempt + 1} in {delay:.2f}s")
+        return delay
+
+    def call(self, rpc, request, name):
+        """Calls a unary RPC such as stub.GetOne, retrying retryable errors"""
+        self._count("calls")
+        attempt = 0
+        while True:
+            try:
+                response = rpc(request, timeout=rpc_timeout(RPC_TIMEOUT))
+                self._succeeded()
+                return response
+            except (grpc.RpcError, DeadlineExceeded) as e:
+                delay = self._backoff(attempt, e, name)
+                if delay is None:
+                    raise
+            time.sleep(delay)
+            attempt += 1
+
+    def stream(self, rpc, request, name):
+        """
+        Yields the responses of a server streaming RPC such as stub.GetAll.
+        rpc may also return a plain generator, like the Connector client's
+        get, which is closed instead of cancelled.
+        """
+        self._count("calls")
+        attempt = 0
+        while True:
+            received = False
+            try:
+                stream = rpc(request, timeout=rpc_timeout(RPC_TIMEOUT))
+                try:
+                    for response in stream:
+                        received = True
+                        yield response
+                finally:
+                    if hasattr(stream, "cancel"):
+                        stream.cancel()
+                    else:
+                        stream.close()
+                self._succeeded()
+                return
+            except (grpc.RpcError, DeadlineExceeded) as e:
+                if received:
+                    self._deadline_exceeded(e, name)
+                    raise
+                delay = self._backoff(attempt, e, name)
+                if delay is None:
+                    raise
+            time.sleep(delay)
+            attempt += 1
+
+    async def _hedged(self, rpc, request, timeout, name):
+        """Sends a duplicate request if the first has not answered within hedge_delay"""
+        async def _attempt(timeout):
+            return await rpc(request, timeout=timeout)
+        first = asyncio.ensure_future(_attempt(timeout))
+        tasks = [first]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay)
+            if not done and not self._throttled() and timeout > self.hedge_delay:
+                self._count("hedged")
+                logging.debug(f"Hedging slow {name}")
+                tasks.append(asyncio.ensure_future(_attempt(timeout - self.hedge_delay)))
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            self._count("hedge_wins")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # The losing request, or both when the caller is cancelled
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def call_async(self, rpc, request, name, hedge=False):
+        """
+        call for grpc.aio stubs. With hedge, a call that has not answered
+        within hedge_delay seconds gets a duplicate and the first response
+        wins, only use it for idempotent reads such as GetOne.
+        """
+        self._count("calls")
+        attempt = 0
+        while True:
+            try:
+                timeout = rpc_timeout(RPC_TIMEOUT)
+                if hedge and self.hedge_delay > 0:
+                    response = await self._hedged(rpc, request, timeout, name)
+                else:
+                    response = await rpc(request, timeout=timeout)
+                self._succeeded()
+                return response
+            except (grpc.RpcError, DeadlineExceeded) as e:
+                delay = self._backoff(attempt, e, name)
+                if delay is None:
+                    raise
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def stream_async(self, rpc, request, name):
+        """stream for grpc.aio stubs"""
+        self._count("calls")
+        attempt = 0
+        while True:
+            received = False
+            try:
+                call = rpc(request, timeout=rpc_timeout(RPC_TIMEOUT))
+                try:
+                    async for response in call:
+                        received = True
+                        yield response
+                finally:
+                    call.cancel()
+                self._succeeded()
+                return
+            except (grpc.RpcError, DeadlineExceeded) as e:
+                if received:
+                    self._deadline_exceeded(e, name)
+                    raise
+                delay = self._backoff(attempt, e, name)
+                if delay is None:
+                    raise
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def stats(self):
+        with self._lock:
+            _stats = dict(self.counters)
+            _stats["retry_tokens"] = round(self._tokens, 1)
+        _stats["retries_allowed"] = self.retries
+        _stats["hedge_delay_seconds"] = self.hedge_delay
+        return _stats
+
+
+rpc_policy = RpcPolicy()
@@ -0,0 +1,378 @@
+"""
+Columnar in-memory snapshots of fleet data.
+
+A ColumnarTable holds one dataset, such as every probe stat, as one
+column per field instead of one dict per record. String columns are
+dictionary encoded, so a hostname or VRF repeated across thousands of
+rows is stored once, and numeric columns are packed arrays. Filters and
+aggregates run over whole columns with numpy.
+"""
+from array import array
+import logging
+import operator
+import sys
+import threading
+import time
+import numpy
+from .monitor import iter_all_probe_status, iter_all_probe_status_async
+
+# Column kinds
+STRING = "str"
+FLOAT = "float"
+INT = "int"
+
+INVENTORY_SCHEMA = {
+    "hostname": STRING,
+    "model": STRING,
+    "serial_number": STRING,
+    "system_mac": STRING,
+    "version": STRING,
+    "streaming_status": STRING,
+    "device_type": STRING,
+    "hardware_revision": STRING,
+    "fqdn": STRING,
+    "domain_name": STRING,
+}
+PROBE_SCHEMA = {
+    "serial_number": STRING,
+    "host": STRING,
+    "vrf": STRING,
+    "source_intf": STRING,
+    "latency_millis": FLOAT,
+    "jitter_millis": FLOAT,
+    "http_response_time_millis": FLOAT,
+    "packet_loss_percent": INT,
+    "error": STRING,
+}
+# DeviceLifecycleRecord fields, dates as epoch seconds like the lifecycle
+# index so they can be range filtered, 0 where CVP has no date
+LIFECYCLE_SCHEMA = {
+    "serial_number": STRING,
+    "software_version": STRING,
+    "end_of_support": INT,
+    "end_of_life": INT,
+    "end_of_sale": INT,
+    "end_of_tac_support": INT,
+    "end_of_hardware_rma_request": INT,
+}
+
+OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+# Rows sampled to estimate the size of the dict representation
+MEMORY_SAMPLE_ROWS = 1000
+
+
+class StringColumn:
+    """Dictionary-encoded string column, each distinct value is stored once"""
+
+    def __init__(self):
+        self.values = []
+        self.codes = array("I")
+        self._index = {}
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, row):
+        return self.values[self.codes[row]]
+
+    def append(self, value):
+        if value is None:
+            value = ""
+        code = self._index.get(value)
+        if code is None:
+            code = self._index[value] = len(self.values)
+            self.values.append(sys.intern(value))
+        self.codes.append(code)
+
+    def code(self, value):
+        """Returns the code of value, or None when no row has it"""
+        return self._index.get(value)
+
+    def nbytes(self):
+        return (
+            sys.getsizeof(self.codes)
+            + sys.getsizeof(self.values)
+            + sys.getsizeof(self._index)
+            + sum(sys.getsizeof(value) for value in self.values)
+        )
+
+
+def _column(kind):
+    if kind == STRING:
+        return StringColumn()
+    return array("d" if kind == FLOAT else "q")
+
+def _column_nbytes(column):
+    if isinstance(column, StringColumn):
+        return column.nbytes()
+    return sys.getsizeof(column)
+
+def percentile(values, q):
+    """
+    Returns the q-th percentile (0-100) of values with linear
+    interpolation, the same method as numpy.percentile's default
+    """
+    return _sorted_percentile(sorted(values), q)
+
+def _sorted_percentile(values, q):
+    if not values:
+        return None
+    position = (len(values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+def summarize(values):
+    """count, min, max, mean, p50 and p95 of a sequence of numbers"""
+    count = len(values)
+    if not count:
+        return {"count": 0, "min": None, "max": None, "mean": None, "p50": None, "p95": None}
+    values = numpy.asarray(values, dtype=float)
+    p50, p95 = numpy.percentile(values, [50, 95])
+    return {
+        "count": count,
+        "min": float(values.min()),
+        "max": float(values.max()),
+        "mean": float(values.mean()),
+        "p50": float(p50),
+        "p95": float(p95),
+    }
+
+
+class ColumnarTable:
+    """
+    One dataset stored column by column, see the module docstring.
+    Rows are addressed by index, filters return lists of row indices
+    that the aggregates and rows() accept.
+    """
+
+    def __init__(self, schema):
+        self.schema = dict(schema)
+        self.columns = {name: _column(kind) for name, kind in self.schema.items()}
+        self.created_at = time.time()
+        self._paths = {name: tuple(name.split(".")) for name in self.schema}
+        self._appenders = [
+            (self._paths[name], column.append, "" if self.schema[name] == STRING else 0)
+            for name, column in self.columns.items()
+        ]
+        self._length = 0
+
+    @classmethod
+    def from_records(cls, schema, records):
+        table = cls(schema)
+        table.extend(records)
+        return table
+
+    def __len__(self):
+        return self._length
+
+    def append(self, record):
+        for path, append, default in self._appenders:
+            try:
+                value = record[path[0]]
+                for key in path[1:]:
+                    value = value[key]
+            except (KeyError, TypeError):
+                value = None
+            append(default if value is None else value)
+        self._length += 1
+
+    def extend(self, records):
+        for record in records:
+            self.append(record)
+
+    async def extend_async(self, records):
+        async for record in records:
+            self.append(record)
+
+    def _array(self, name):
+        """numpy view of a column, string columns are viewed as their codes"""
+        column = self.columns[name]
+        if isinstance(column, StringColumn):
+            return numpy.frombuffer(column.codes, dtype=numpy.uint32) if len(column) else numpy.zeros(0, numpy.uint32)
+        dtype = numpy.float64 if column.typecode == "d" else numpy.int64
+        return numpy.frombuffer(column, dtype=dtype) if len(column) else numpy.zeros(0, dtype)
+
+    def where(self, indices=None, **conditions):
+        """
+        Returns the indices of the rows matching every condition. A
+        condition is a value to compare for equality, or an (operator,
+        value) tuple with one of ==, !=, <, <=, >, >=, e.g.
+        where(vrf="default", latency_millis=(">", 50)). String columns
+        only support == and !=. indices narrows an earlier where().
+        """
+        compiled = []
+        for name, condition in conditions.items():
+            op, value = condition if isinstance(condition, tuple) else ("==", condition)
+            if op not in OPERATORS:
+                raise ValueError(f"Unknown operator {op} for {name}")
+            column = self.columns[name]
+            if isinstance(column, StringColumn):
+                if op not in ("==", "!="):
+                    raise ValueError(f"{name} is a string column and only supports == and !=")
+                code = column.code(value)
+                if code is None:
+                    if op == "==":
+                        return []
+                    continue
+                compiled.append((name, OPERATORS[op], code))
+            else:
+                compiled.append((name, OPERATORS[op], value))
+        mask = numpy.ones(self._length, dtype=bool)
+        for name, compare, value in compiled:
+            mask &= compare(self._array(name), value)
+        if indices is not None:
+            selected = numpy.zeros(self._length, dtype=bool)
+            selected[numpy.asarray(indices, dtype=numpy.int64)] = True
+            mask &= selected
+        return numpy.flatnonzero(mask).tolist()
+
+    def values(self, name, indices=None):
+        """Returns a column's values for the given rows, all rows by default"""
+        column = self.columns[name]
+        if indices is None:
+            if isinstance(column, StringColumn):
+                return [column.values[code] for code in column.codes]
+            return column.tolist()
+        return [column[row] for row in indices]
+
+    def aggregate(self, name, indices=None):
+        """count, min, max, mean, p50 and p95 of a numeric column"""
+        values = self._array(name)
+        if indices is not None:
+            values = values[numpy.asarray(indices, dtype=numpy.int64)]
+        return summarize(values)
+
+    def group_by(self, key, name, indices=None):
+        """aggregate() of a numeric column per distinct value of a string column"""
+        keys = self.columns[key]
+        rows = numpy.arange(self._length) if indices is None else numpy.asarray(indices, dtype=numpy.int64)
+        codes = self._array(key)[rows]
+        values = self._array(name)[rows]
+        order = numpy.argsort(codes, kind="stable")
+        codes, values = codes[order], values[order]
+        unique, starts = numpy.unique(codes, return_index=True)
+        ends = list(starts[1:]) + [len(codes)]
+        return {
+            keys.values[code]: summarize(values[start:end])
+            for code, start, end in zip(unique.tolist(), starts.tolist(), ends)
+        }
+
+    def top(self, name, count=10, indices=None, largest=True):
+        """Returns the indices of the count rows with the largest (or smallest) values of a column"""
+        rows = numpy.arange(self._length) if indices is None else numpy.asarray(indices, dtype=numpy.int64)
+        values = self._array(name)[rows]
+        order = numpy.argsort(-values if largest else values, kind="stable")[:count]
+        return rows[order].tolist()
+
+    def row(self, index, fields=None):
+        """Rebuilds one record as a dict, with nested dicts for dotted names"""
+        return self.rows([index], fields)[0]
+
+    def rows(self, indices=None, fields=None):
+        """Rebuilds records as dicts, all rows and fields by default"""
+        fields = list(fields or self.schema)
+        columns = [self.values(name, indices) for name in fields]
+        if all(len(self._paths[name]) == 1 for name in fields):
+            return [dict(zip(fields, values)) for values in zip(*columns)]
+        paths = [self._paths[name] for name in fields]
+        return [_nested(paths, values) for values in zip(*columns)]
+
+    def memory_usage(self, sample=MEMORY_SAMPLE_ROWS):
+        """
+        Bytes held by the columns, against an estimate for the same rows
+        as a list of dicts with a separate object per value, which is how
+        the iter_all_* fetchers return them
+        """
+        columnar = sum(_column_nbytes(column) for column in self.columns.values())
+        if not self._length:
+            return {"rows": 0, "columnar_bytes": columnar, "dict_bytes": 0, "ratio": None}
+        step = max(1, self._length // sample)
+        sampled = range(0, self._length, step)
+        per_row = sum(_deep_sizeof(self.row(index)) for index in sampled) / len(sampled)
+        dict_bytes = int(per_row * self._length) + sys.getsizeof([None] * self._length)
+        return {
+            "rows": self._length,
+            "columnar_bytes": columnar,
+            "dict_bytes": dict_bytes,
+            "ratio": round(dict_bytes / columnar, 1) if columnar else None,
+        }
+
+
+def _nested(paths, values):
+    record = {}
+    for path, value in zip(paths, values):
+        target = record
+        for key in path[:-1]:
+            target = target.setdefault(key, {})
+        target[path[-1]] = value
+    return record
+
+def _deep_sizeof(value):
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(_deep_sizeof(item) for item in value.values())
+    return sys.getsizeof(value)
+
+
+class SnapshotStore:
+    """
+    Latest ColumnarTable per dataset name, e.g. "probes".
+    A new snapshot replaces the old one whole, so readers holding a
+    table keep a consistent view.
+    """
+
+    def __init__(self):
+        self._tables = {}
+        self._lock = threading.Lock()
+
+    def put(self, name, table):
+        with self._lock:
+            self._tables[name] = table
+        logging.info(f"Snapshot {name} loaded with {len(table)} rows")
+
+    def get(self, name):
+        with self._lock:
+            return self._tables.get(name)
+
+    def age(self, name):
+        """Seconds since the snapshot was taken, None if there is none"""
+        table = self.get(name)
+        if table is None:
+            return None
+        return time.time() - table.created_at
+
+    def stats(self):
+        with self._lock:
+            tables = dict(self._tables)
+        return {
+            name: {
+                "age_seconds": round(time.time() - table.created_at, 3),
+                "columns": len(table.schema),
+                "memory": table.memory_usage(),
+            }
+            for name, table in tables.items()
+        }
+
+
+snapshot_store = SnapshotStore()
+
+
+def snapshot_all_probe_status(channel, store=snapshot_store):
+    """Fills the "probes" snapshot from iter_all_probe_status"""
+    table = ColumnarTable.from_records(PROBE_SCHEMA, iter_all_probe_status(channel))
+    store.put("probes", table)
+    return(table)
+
+async def snapshot_all_probe_status_async(channel, store=snapshot_store):
+    """grpc.aio variant of snapshot_all_probe_status"""
+    table = ColumnarTable(PROBE_SCHEMA)
+    await table.extend_async(iter_all_probe_status_async(channel))
+    store.put("probes", table)
+    return(table)
@@ -0,0 +1,89 @@
+import logging
+import threading
+import time
+import grpc
+
+SUBSCRIBE_MIN_BACKOFF = 1
+SUBSCRIBE_MAX_BACKOFF = 60
+
+
+class Subscriber:
+    """
+    Runs a resource API Subscribe stream on a background thread.
+    Every response is handed to on_message, and the stream is re-opened
+    with exponential backoff whenever it drops.
+    prime is run once on the thread before the first subscription,
+    on_open is called each time a new stream is opened.
+    """
+
+    def __init__(self, name, get_channel, open_stream, on_message, prime=None, on_open=None):
+        self.name = name
+        self.connected = False
+        self.disconnected_at = time.monotonic()
+        self.last_message_at = None
+        self.reconnects = 0
+        self._get_channel = get_channel
+        self._open_stream = open_stream
+        self._on_message = on_message
+        self._prime = prime
+        self._on_open = on_open
+        self._stream = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=f"cvp-subscribe-{self.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        stream = self._stream
+        if stream is not None:
+            stream.cancel()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        if self._prime:
+            try:
+                self._prime(self._get_channel())
+            except Exception as e:
+                logging.error(f"Error priming {self.name} subscription: {e}")
+        backoff = SUBSCRIBE_MIN_BACKOFF
+        while not self._stop.is_set():
+            try:
+                self._stream = self._open_stream(self._get_channel())
+                if self._on_open:
+                    self._on_open()
+                for response in self._stream:
+                    if not self.connected:
+                        logging.info(f"{self.name} subscription connected")
+                        self.connected = True
+                        backoff = SUBSCRIBE_MIN_BACKOFF
+                    self.last_message_at = time.monotonic()
+                    try:
+                        self._on_message(response)
+                    except Exception as e:
+                        logging.error(f"Error handling {self.name} update: {e}")
+            except grpc.RpcError as e:
+                if not self._stop.is_set():
+                    logging.warning(f"{self.name} subscription dropped: {e.code()}")
+            except Exception as e:
+                logging.error(f"{self.name} subscription error: {e}")
+            finally:
+                self._stream = None
+                if self.connected:
+                    self.connected = False
+                    self.disconnected_at = time.monotonic()
+            if self._stop.wait(backoff):
+                break
+            self.reconnects += 1
+            backoff = min(backoff * 2, SUBSCRIBE_MAX_BACKOFF)
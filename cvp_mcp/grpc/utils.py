@@ -1,12 +1,37 @@
+import asyncio
+import contextvars
 import grpc
-from .models import SwitchInfo, ProbeStats,DeviceLifecycleSummary, DeviceHardwareEoL, DeviceSoftwareEoL, EndpointLocation, EndpointLocationList
+from concurrent.futures import ThreadPoolExecutor
+from .models import SwitchInfo, SwitchRecord, BugExposure, ProbeStats,DeviceLifecycleSummary, DeviceLifecycleRecord, DeviceHardwareEoL, DeviceSoftwareEoL, EndpointLocation, EndpointLocationList
 from arista.inventory.v1 import models
 from arista.endpointlocation.v1 import models as endpoint_models
+from arista.bugexposure.v1 import models as bug_models
+import datetime
+import functools
+import json
 import logging
+import os
+import re
+from cvp_mcp.metrics import timed, CONVERT_DURATION
 
 RPC_TIMEOUT = 30
 EOS_PLATFORMS = ["DCS-", "CCS-", "AWE-"]
 EOS_VIRTUAL = ["cEOS", "vEOS"]
+# Default number of concurrent RPCs a single fan_out call may run
+FAN_OUT_WORKERS = 8
+# MAC addresses written as aa:bb:cc:dd:ee:ff, aa-bb-cc-dd-ee-ff, aabb.ccdd.eeff or aabbccddeeff
+MAC_ADDRESS = re.compile(r"^[0-9a-f]{2}([:-]?)(?:[0-9a-f]{2}\1){4}[0-9a-f]{2}$|^[0-9a-f]{4}\.[0-9a-f]{4}\.[0-9a-f]{4}$")
+
+def normalize_mac(value):
+    """
+    Returns a MAC address in CVP's lowercase colon separated form,
+    or None when value is not a MAC address
+    """
+    value = value.strip().lower()
+    if not MAC_ADDRESS.match(value):
+        return None
+    digits = re.sub(r"[^0-9a-f]", "", value)
+    return ":".join(digits[i:i + 2] for i in range(0, 12, 2))
 
 def datetime_to_readable_format(dt, format_type="full"):
     """
@@ -55,39 +80,125 @@ def serialize_repeated_int32(repeated_int32):
 
      return int_list
  
-def convert_response_to_switch(device) -> SwitchInfo:
-    if device.value.system_mac_address.value:
-         match device.value.streaming_status:
-             case models.STREAMING_STATUS_INACTIVE:
-                 streaming_status = "Inactive"
-             case models.STREAMING_STATUS_ACTIVE:
-                 streaming_status = "Active"
-             case _:
-                 streaming_status = "Unknown"
-         if any(x in device.value.model_name.value for x in EOS_PLATFORMS):
-             device_type = "EOS"
-         elif any(x in device.value.model_name.value for x in EOS_VIRTUAL):
-             device_type = "Virtual EOS"
-         elif "C-" in device.value.model_name.value:
-             device_type = "Access Point"
-         else:
-             device_type = "Third Party"
-         switch = SwitchInfo(
-             hostname = device.value.hostname.value,
-             model = device.value.model_name.value,
-             serial_number = device.value.key.device_id.value,
-             system_mac = device.value.system_mac_address.value,
-             version = device.value.software_version.value,
-             streaming_status = streaming_status,
-             device_type = device_type,
-             hardware_revision = device.value.hardware_revision.value,
-             fqdn = device.value.fqdn.value,
-             domain_name = device.value.domain_name.value
-         )
-    else:
-        switch = SwitchInfo()
+STREAMING_STATUS_NAMES = {
+    models.STREAMING_STATUS_INACTIVE: "Inactive",
+    models.STREAMING_STATUS_ACTIVE: "Active",
+}
+DEFAULT_DEVICE_TYPE = "Third Party"
+# Checked in order, the first device type with a substring in the model name wins
+DEVICE_TYPE_RULES = [
+    ("EOS", EOS_PLATFORMS),
+    ("Virtual EOS", EOS_VIRTUAL),
+    ("Access Point", ["C-"]),
+]
+
+def compile_device_type_matcher(rules):
+    """
+    Compiles rules into one regex with a lookahead branch per device type.
+    Branches are tried in rule order from the start of the model name, so
+    the first matching rule wins, as with checking each list in turn.
+    Returns (pattern, {group name: device type})
+    """
+    branches = []
+    device_types = {}
+    for index, (device_type, substrings) in enumerate(rules):
+        if not substrings:
+            continue
+        group = f"rule{index}"
+        device_types[group] = device_type
+        alternatives = "|".join(re.escape(substring) for substring in substrings)
+        branches.append(f"(?=.*?(?:{alternatives}))(?P<{group}>)")
+    if not branches:
+        return(re.compile(r"(?!)"), device_types)
+    return(re.compile("|".join(branches), re.DOTALL), device_types)
+
+_device_type_matcher = compile_device_type_matcher(DEVICE_TYPE_RULES)
+
+def configure_device_types(extra_rules=None):
+    """
+    Adds (device type, [model substrings]) rules, checked before the
+    built-in ones, e.g. for third-party models in the inventory
+    """
+    global _device_type_matcher
+    rules = [(device_type, list(substrings)) for device_type, substrings in (extra_rules or [])]
+    _device_type_matcher = compile_device_type_matcher(rules + DEVICE_TYPE_RULES)
+    classify_device_type.cache_clear()
+
+def load_device_type_rules(value):
+    """
+    Parses device type rules from JSON, given inline or as a file path,
+    e.g. {"Palo Alto": ["PA-"], "Juniper": ["EX", "QFX"]}
+    """
+    if os.path.isfile(value):
+        with open(value) as f:
+            value = f.read()
+    rules = json.loads(value)
+    if not isinstance(rules, dict):
+        raise ValueError("Device type rules must be a JSON object of device type to model substrings")
+    return([
+        (device_type, [substrings] if isinstance(substrings, str) else substrings)
+        for device_type, substrings in rules.items()
+    ])
+
+@functools.lru_cache(maxsize=4096)
+def classify_device_type(model_name):
+    """Returns the device type for a model name, memoized per model"""
+    pattern, device_types = _device_type_matcher
+    match = pattern.match(model_name)
+    if match is None:
+        return DEFAULT_DEVICE_TYPE
+    return device_types[match.lastgroup]
+
+@timed(CONVERT_DURATION, "switch")
+def convert_response_to_switch(device):
+    """
+    Converts a DeviceService response to a SwitchRecord, or an empty
+    SwitchInfo when the device has no System MAC
+    """
+    value = device.value
+    system_mac = value.system_mac_address.value
+    if not system_mac:
+        return(SwitchInfo())
+    model_name = value.model_name.value
+    switch = SwitchRecord(
+        hostname = value.hostname.value,
+        model = model_name,
+        serial_number = value.key.device_id.value,
+        system_mac = system_mac,
+        version = value.software_version.value,
+        streaming_status = STREAMING_STATUS_NAMES.get(value.streaming_status, "Unknown"),
+        device_type = classify_device_type(model_name),
+        hardware_revision = value.hardware_revision.value,
+        fqdn = value.fqdn.value,
+        domain_name = value.domain_name.value
+    )
     return(switch)
 
+def convert_exposure(exposure):
+    match exposure:
+        case bug_models.HIGHEST_EXPOSURE_HIGH:
+            return "High"
+        case bug_models.HIGHEST_EXPOSURE_LOW:
+            return "Low"
+        case bug_models.HIGHEST_EXPOSURE_NONE:
+            return "None"
+        case _:
+            return "Unspecified"
+
+@timed(CONVERT_DURATION, "bug_exposure")
+def convert_response_to_bug_exposure(bug) -> BugExposure:
+    bug_exposure = BugExposure(
+        serial_number = bug.value.key.device_id.value,
+        bug_ids = serialize_repeated_int32(bug.value.bug_ids.values),
+        cve_ids = serialize_repeated_int32(bug.value.cve_ids.values),
+        bug_count = bug.value.bug_count.value,
+        cve_count = bug.value.cve_count.value,
+        highest_cve_exposure = convert_exposure(bug.value.highest_cve_exposure),
+        highest_bug_exposre = convert_exposure(bug.value.highest_bug_exposure)
+    )
+    return(bug_exposure)
+
+@timed(CONVERT_DURATION, "probe_stat")
 def convert_response_to_probe_stat(probe) -> ProbeStats:
     _probe = ProbeStats(
         serial_number = probe.value.key.device_id.value,
@@ -102,39 +213,65 @@ def convert_response_to_probe_stat(probe) -> ProbeStats:
     )
     return _probe
 
-def convert_response_to_device_lifecycle(device) -> DeviceLifecycleSummary:
-    try:
-        _sw = DeviceSoftwareEoL(
-            version = device.value.software_eol.version.value,
-            end_of_support = datetime_to_readable_format(device.value.software_eol.end_of_support.ToDatetime(), "with_day")
-        )
-    except:
-        _sw = DeviceSoftwareEoL(
-            version = "",
-            end_of_support = ""
-        )
-    logging.debug(f"SW: {_sw}")
-    try:
-        _hw = DeviceHardwareEoL(
-            end_of_life = datetime_to_readable_format(device.value.hardware_lifecycle_summary.end_of_life.ToDatetime(), "with_day"),
-            end_of_sale = datetime_to_readable_format(device.value.hardware_lifecycle_summary.end_of_sale.ToDatetime(), "with_day"),
-            end_of_tac_support = datetime_to_readable_format(device.value.hardware_lifecycle_summary.end_of_tag_support.ToDatetime(), "with_day"),
-            end_of_hardware_rma_request = datetime_to_readable_format(device.value.hardware_lifecycle_summary.end_of_hardware_rma_request.ToDatetime(), "with_day")
-        )
-    except:
-        _hw = DeviceHardwareEoL(
-            end_of_life = "",
-            end_of_sale = "",
-            end_of_tac_support = "",
-            end_of_hardware_rma_request = ""
-        )
+# DeviceLifecycleRecord date fields and where each lives in HardwareLifecycleSummary
+HARDWARE_LIFECYCLE_DATES = {
+    "end_of_life": "end_of_life",
+    "end_of_sale": "end_of_sale",
+    "end_of_tac_support": "end_of_tac_support",
+    "end_of_hardware_rma_request": "end_of_hardware_rma_requests",
+}
+LIFECYCLE_DATES = ("end_of_support",) + tuple(HARDWARE_LIFECYCLE_DATES)
+
+@timed(CONVERT_DURATION, "lifecycle_record")
+def convert_response_to_lifecycle_record(device) -> DeviceLifecycleRecord:
+    """
+    Converts a DeviceLifecycleSummary response to a DeviceLifecycleRecord,
+    with dates kept as epoch seconds so they can be sorted and compared
+    """
+    value = device.value
+    software_eol = value.software_eol
+    hardware = value.hardware_lifecycle_summary
+    record = DeviceLifecycleRecord(
+        serial_number = value.key.device_id.value,
+        software_version = software_eol.version.value,
+        end_of_support = software_eol.end_of_support.seconds if software_eol.HasField("end_of_support") else None,
+    )
+    for name, field in HARDWARE_LIFECYCLE_DATES.items():
+        date_and_models = getattr(hardware, field)
+        record[name] = date_and_models.date.seconds if date_and_models.HasField("date") else None
+    return(record)
+
+@functools.lru_cache(maxsize=4096)
+def format_epoch(epoch, format_type="with_day"):
+    """datetime_to_readable_format for epoch seconds, empty for no date. Fleets share few distinct dates"""
+    if epoch is None:
+        return ""
+    return datetime_to_readable_format(datetime.datetime.fromtimestamp(epoch, datetime.timezone.utc), format_type)
+
+def format_device_lifecycle(record) -> DeviceLifecycleSummary:
+    """Formats a DeviceLifecycleRecord for tool output"""
+    _sw = DeviceSoftwareEoL(
+        version = record["software_version"],
+        end_of_support = format_epoch(record["end_of_support"])
+    )
+    _hw = DeviceHardwareEoL(
+        end_of_life = format_epoch(record["end_of_life"]),
+        end_of_sale = format_epoch(record["end_of_sale"]),
+        end_of_tac_support = format_epoch(record["end_of_tac_support"]),
+        end_of_hardware_rma_request = format_epoch(record["end_of_hardware_rma_request"])
+    )
     _device = DeviceLifecycleSummary(
-        serial_number = device.value.key.device_id.value,
+        serial_number = record["serial_number"],
         software_eol = _sw,
         hardware_lifecycle_summary = _hw
     )
     return(_device)
 
+def convert_response_to_device_lifecycle(device) -> DeviceLifecycleSummary:
+    # Timed by convert_response_to_lifecycle_record, timing this too would count every conversion twice
+    return(format_device_lifecycle(convert_response_to_lifecycle_record(device)))
+
+@timed(CONVERT_DURATION, "endpoint_location")
 def convert_response_to_endpoint_location(endpoint) -> EndpointLocation:
     all_endpoints = []
     all_locations = []
@@ -150,7 +287,7 @@ def convert_response_to_endpoint_location(endpoint) -> EndpointLocation:
         #     # )
         #     all_locations.append(location)
     hostname = ""
-    mac_addres = ""
+    mac_address = ""
     ip_address = ""
     if endpoint.identifier_list:
         for _endpoint in endpoint.identifier_list.values:
@@ -171,6 +308,100 @@ def convert_response_to_endpoint_location(endpoint) -> EndpointLocation:
     return(all_endpoints)
 
 def serialize_arista_protobuf(pb_obj, max_depth=10, current_depth=0):
+    """
+    Recursively serialize Arista protobuf objects to dict with enum names.
+    Uses a serializer compiled once per message descriptor, the output is
+    identical to serialize_arista_protobuf_reflective.
+    """
+    descriptor = getattr(pb_obj, "DESCRIPTOR", None)
+    if descriptor is None:
+        return serialize_arista_protobuf_reflective(pb_obj, max_depth, current_depth)
+    return _get_serializer(descriptor)(pb_obj, max_depth, current_depth)
+
+_SERIALIZERS = {}
+
+def _get_serializer(descriptor):
+    serializer = _SERIALIZERS.get(descriptor)
+    if serializer is None:
+        serializer = _compile_serializer(descriptor)
+    return serializer
+
+def _convert_scalar(value):
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='replace')
+    return value
+
+# Field kinds dispatched inline by the compiled serializers
+_SCALAR, _BYTES, _ENUM, _MESSAGE, _MAP, _REPEATED_SCALAR, _REPEATED_BYTES, _REPEATED_ENUM, _REPEATED_MESSAGE = range(9)
+
+def _is_repeated(field):
+    # upb repeated containers have no __iter__ attribute, so ask the descriptor
+    if hasattr(field, "is_repeated"):
+        return field.is_repeated
+    return field.label == field.LABEL_REPEATED
+
+def _compile_field(field):
+    """Returns (name, kind, arg) for one field, chosen from its descriptor"""
+    is_repeated = _is_repeated(field)
+    if field.message_type is not None:
+        if field.message_type.GetOptions().map_entry:
+            # Iterating a map yields its keys, which is what the reflective serializer returns
+            return (field.name, _MAP, None)
+        # Already registered for recursive message types, so this terminates
+        serializer = _get_serializer(field.message_type)
+        return (field.name, _REPEATED_MESSAGE if is_repeated else _MESSAGE, serializer)
+    if field.enum_type is not None:
+        enum_names = {value.number: value.name for value in field.enum_type.values}
+        return (field.name, _REPEATED_ENUM if is_repeated else _ENUM, enum_names)
+    if field.type == field.TYPE_BYTES:
+        return (field.name, _REPEATED_BYTES if is_repeated else _BYTES, None)
+    return (field.name, _REPEATED_SCALAR if is_repeated else _SCALAR, None)
+
+def _compile_serializer(descriptor):
+    """Builds a serializer specialized for one message descriptor"""
+    handlers = {}
+    def _serialize(pb_obj, max_depth, current_depth):
+        if current_depth >= max_depth:
+            return str(pb_obj)
+        result = {}
+        try:
+            for field, value in pb_obj.ListFields():
+                handler = handlers.get(field)
+                if handler is None:
+                    # Extensions are not in the descriptor's field list
+                    handler = handlers[field] = _compile_field(field)
+                field_name, kind, arg = handler
+                try:
+                    if kind == _SCALAR:
+                        result[field_name] = value
+                    elif kind == _MESSAGE:
+                        result[field_name] = arg(value, max_depth, current_depth + 1)
+                    elif kind == _ENUM:
+                        result[field_name] = arg.get(value, value)
+                    elif kind == _REPEATED_MESSAGE:
+                        result[field_name] = [arg(item, max_depth, current_depth + 1) for item in value]
+                    elif kind == _REPEATED_ENUM:
+                        result[field_name] = [arg.get(item, item) for item in value]
+                    elif kind == _REPEATED_SCALAR:
+                        result[field_name] = list(value)
+                    elif kind == _MAP:
+                        result[field_name] = [_convert_scalar(key) for key in value]
+                    elif kind == _BYTES:
+                        result[field_name] = _convert_scalar(value)
+                    else:
+                        result[field_name] = [_convert_scalar(item) for item in value]
+                except Exception as e:
+                    result[field_name] = f"<serialization_error: {str(e)}>"
+        except Exception as e:
+            return {"serialization_error": str(e), "object_type": str(type(pb_obj))}
+        return result
+    # Registered before the fields compile so recursive message types find it
+    _SERIALIZERS[descriptor] = _serialize
+    for field in descriptor.fields:
+        handlers[field] = _compile_field(field)
+    return _serialize
+
+def serialize_arista_protobuf_reflective(pb_obj, max_depth=10, current_depth=0):
     """Recursively serialize Arista protobuf objects to dict with enum names"""
     if current_depth >= max_depth:
         return str(pb_obj)
@@ -184,13 +415,13 @@ def serialize_arista_protobuf(pb_obj, max_depth=10, current_depth=0):
             try:
                 # Handle different field types
                 if hasattr(value, 'ListFields'):  # Nested protobuf message
-                    result[field_name] = serialize_arista_protobuf(value, max_depth, current_depth + 1)
+                    result[field_name] = serialize_arista_protobuf_reflective(value, max_depth, current_depth + 1)
                     
-                elif hasattr(value, '__iter__') and not isinstance(value, (str, bytes)):  # Repeated field
+                elif _is_repeated(field):  # Repeated field
                     result[field_name] = []
                     for item in value:
                         if hasattr(item, 'ListFields'):  # Repeated protobuf messages
-                            result[field_name].append(serialize_arista_protobuf(item, max_depth, current_depth + 1))
+                            result[field_name].append(serialize_arista_protobuf_reflective(item, max_depth, current_depth + 1))
                         else:
                             result[field_name].append(convert_protobuf_value(item, field))
                             
@@ -227,3 +458,54 @@ def convert_protobuf_value(value, field_descriptor=None):
         return {"seconds": value.seconds, "nanos": value.nanos}
     else:
         return str(value)
+
+def subscription_operation(response):
+    """
+    Returns the arista.subscriptions.Operation name of a resource stream
+    response, e.g. INITIAL, INITIAL_SYNC_COMPLETE, UPDATED or DELETED
+    """
+    field = response.DESCRIPTOR.fields_by_name.get("type")
+    if field is None:
+        return "INITIAL"
+    operation = field.enum_type.values_by_number.get(response.type)
+    return operation.name if operation else "OPERATION_UNSPECIFIED"
+
+def fan_out(func, items, max_workers=None, default=None, label="Error"):
+    """
+    Runs func on each item in a bounded thread pool and returns the results
+    in the same order as items. An item that raises is logged with
+    logging.error as "<label>: <error>" and gets default as its result,
+    the others still run. max_workers defaults to FAN_OUT_WORKERS.
+    Each item runs in a copy of the caller's context, so the calling
+    tool's deadline budget reaches the worker threads.
+    """
+    items = list(items)
+    if max_workers is None:
+        max_workers = FAN_OUT_WORKERS
+    def _call(item):
+        try:
+            return func(item)
+        except Exception as e:
+            logging.error(f"{label}: {e}")
+            return default
+    if max_workers <= 1 or len(items) <= 1:
+        return [_call(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items)), thread_name_prefix="cvp-fan-out") as pool:
+        futures = [pool.submit(contextvars.copy_context().run, _call, item) for item in items]
+        return [future.result() for future in futures]
+
+async def fan_out_async(func, items, max_workers=None, default=None, label="Error"):
+    """
+    asyncio counterpart of fan_out: awaits func(item) for each item with at
+    most max_workers in flight and returns the results in order.
+    """
+    items = list(items)
+    semaphore = asyncio.Semaphore(max_workers or FAN_OUT_WORKERS)
+    async def _call(item):
+        async with semaphore:
+            try:
+                return await func(item)
+            except Exception as e:
+                logging.error(f"{label}: {e}")
+                return default
+    return list(await asyncio.gather(*[_call(item) for item in items]))
@@ -0,0 +1,151 @@
+import bisect
+import functools
+import threading
+import time
+
+# Histogram buckets for durations in seconds, sizes in bytes and message counts
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+COUNT_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class ToolMetrics:
+    """
+    Per-tool response metrics: number of responses, bytes sent and time
+    spent serializing, so oversized tool output can be spotted
+    """
+
+    def __init__(self):
+        self.tools = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, response_bytes, serialize_seconds):
+        with self._lock:
+            metrics = self.tools.get(name)
+            if metrics is None:
+                metrics = self.tools[name] = {
+                    "responses": 0,
+                    "response_bytes": 0,
+                    "max_response_bytes": 0,
+                    "serialize_seconds": 0.0,
+                    "max_serialize_seconds": 0.0,
+                }
+            metrics["responses"] += 1
+            metrics["response_bytes"] += response_bytes
+            metrics["max_response_bytes"] = max(metrics["max_response_bytes"], response_bytes)
+            metrics["serialize_seconds"] += serialize_seconds
+            metrics["max_serialize_seconds"] = max(metrics["max_serialize_seconds"], serialize_seconds)
+
+    def stats(self):
+        with self._lock:
+            tools = {name: dict(metrics) for name, metrics in self.tools.items()}
+        for metrics in tools.values():
+            metrics["mean_response_bytes"] = round(metrics["response_bytes"] / metrics["responses"])
+            metrics["serialize_seconds"] = round(metrics["serialize_seconds"], 6)
+            metrics["max_serialize_seconds"] = round(metrics["max_serialize_seconds"], 6)
+        return {
+            "responses": sum(metrics["responses"] for metrics in tools.values()),
+            "response_bytes": sum(metrics["response_bytes"] for metrics in tools.values()),
+            "tools": tools,
+        }
+
+
+class Histogram:
+    """
+    Prometheus histogram with one label. Buckets are counted individually
+    and made cumulative when rendered, so an observation is one bisect.
+    """
+
+    def __init__(self, name, documentation, buckets, label):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.label = label
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, label_value=""):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {label_value: (list(counts), total, count) for label_value, (counts, total, count) in self._series.items()}
+        for label_value, (counts, total, count) in sorted(series.items()):
+            label = f'{self.label}="{_escape(label_value)}"'
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label}}} {total}")
+            lines.append(f"{self.name}_count{{{label}}} {count}")
+        return "\n".join(lines)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class MetricsRegistry:
+    """
+    Histograms exported in the Prometheus text format. Recording is off
+    until enabled, call sites check enabled first so disabled metrics cost
+    one attribute lookup.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.histograms = {}
+
+    def histogram(self, name, documentation, buckets, label):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram(name, documentation, buckets, label)
+        return histogram
+
+    def render(self):
+        return "\n".join(histogram.render() for histogram in self.histograms.values()) + "\n"
+
+
+tool_metrics = ToolMetrics()
+registry = MetricsRegistry()
+
+TOOL_DURATION = registry.histogram("cvp_mcp_tool_duration_seconds", "Time to run a tool call, including serialization", LATENCY_BUCKETS, "tool")
+TOOL_SERIALIZE = registry.histogram("cvp_mcp_tool_serialize_seconds", "Time to serialize a tool response as JSON", LATENCY_BUCKETS, "tool")
+TOOL_RESPONSE_BYTES = registry.histogram("cvp_mcp_tool_response_bytes", "Size of a serialized tool response", SIZE_BUCKETS, "tool")
+RPC_DURATION = registry.histogram("cvp_mcp_rpc_duration_seconds", "Time from starting a CVP RPC to its last message", LATENCY_BUCKETS, "method")
+RPC_FIRST_MESSAGE = registry.histogram("cvp_mcp_rpc_first_message_seconds", "Time from starting a CVP stream to its first message", LATENCY_BUCKETS, "method")
+RPC_STREAM_MESSAGES = registry.histogram("cvp_mcp_rpc_stream_messages", "Messages received on one CVP stream", COUNT_BUCKETS, "method")
+CHANNEL_SETUP = registry.histogram("cvp_mcp_channel_setup_seconds", "Time for a new CVP channel to become ready", LATENCY_BUCKETS, "kind")
+CONVERT_DURATION = registry.histogram("cvp_mcp_convert_seconds", "Time to convert one CVP message", LATENCY_BUCKETS, "converter")
+
+
+def timed(histogram, label_value):
+    """
+    Decorator recording each call's duration in histogram under
+    label_value while metrics are enabled
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not registry.enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start, label_value)
+        return wrapper
+    return decorator
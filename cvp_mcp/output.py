@@ -0,0 +1,96 @@
+import functools
+import inspect
+import json
+import logging
+import time
+from typing import Optional
+from cvp_mcp.grpc import pipeline
+from cvp_mcp.metrics import tool_metrics, registry, TOOL_DURATION, TOOL_SERIALIZE, TOOL_RESPONSE_BYTES
+
+# Separators for compact JSON, tool output is read by models not people
+COMPACT_SEPARATORS = (",", ":")
+FIELDS_DOC = """
+    fields optionally keeps only the named fields of each returned record,
+    e.g. ["hostname", "serial_number"], using dots for nested fields such as
+    "software_eol.end_of_support".
+    """
+
+
+def to_json(data):
+    """Serializes data as compact JSON"""
+    return json.dumps(data, separators=COMPACT_SEPARATORS)
+
+
+def debug_json(label, data):
+    """Logs data as JSON at DEBUG, only serializing it when DEBUG is enabled"""
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug(f"{label}{to_json(data)}")
+
+
+def project_records(result, records=(), record=False, fields=None):
+    """
+    Keeps only the given fields of the records in a tool result. records
+    names the keys of result holding records, as a list of records or a
+    dict of key to record such as devices keyed by serial number. With
+    record the whole result is one record. Everything else in the result
+    is left as-is, and a record with none of the fields becomes {}.
+    """
+    if not fields or not isinstance(result, dict):
+        return result
+    if record:
+        return next(pipeline.project([result], fields))
+    result = dict(result)
+    for key in records:
+        collection = result.get(key)
+        if isinstance(collection, dict):
+            result[key] = dict(zip(collection, pipeline.project(collection.values(), fields)))
+        elif isinstance(collection, list):
+            result[key] = list(pipeline.project(collection, fields))
+    return result
+
+
+def tool_output(*records, record=False):
+    """
+    Decorator for async tools that adds a fields argument for projection,
+    returns the result as compact JSON serialized once, and records the
+    response size and serialization time in tool_metrics, plus the tool
+    duration in the metrics registry when it is enabled. records names the
+    keys of the result that fields projects, or record makes the whole
+    result one record, see project_records. Tools with neither get no
+    fields argument. fields is handled here, so calls differing only in
+    fields still coalesce.
+    The wrapper's signature returns str. Register the tool with
+    mcp.tool(structured_output=False) so FastMCP does not send the JSON
+    text a second time as structured content.
+    """
+    projectable = bool(records) or record
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, fields: Optional[list[str]] = None, **kwargs):
+            called = time.perf_counter()
+            result = project_records(await func(*args, **kwargs), records, record, fields)
+            start = time.perf_counter()
+            text = result if isinstance(result, str) else to_json(result)
+            end = time.perf_counter()
+            response_bytes = len(text.encode())
+            tool_metrics.record(func.__name__, response_bytes, end - start)
+            if registry.enabled:
+                TOOL_DURATION.observe(end - called, func.__name__)
+                TOOL_SERIALIZE.observe(end - start, func.__name__)
+                TOOL_RESPONSE_BYTES.observe(response_bytes, func.__name__)
+            if logging.getLogger().isEnabledFor(logging.DEBUG):
+                logging.debug(f"{func.__name__} response: {text}")
+            return(text)
+        signature = inspect.signature(func)
+        parameters = list(signature.parameters.values())
+        annotations = {**func.__annotations__, "return": str}
+        if projectable:
+            parameters.append(inspect.Parameter("fields", inspect.Parameter.KEYWORD_ONLY, default=None, annotation=Optional[list[str]]))
+            annotations["fields"] = Optional[list[str]]
+        wrapper.__signature__ = signature.replace(parameters=parameters, return_annotation=str)
+        # functools.wraps shares func's annotations dict, so replace it rather than mutate it
+        wrapper.__annotations__ = annotations
+        if projectable:
+            wrapper.__doc__ = (func.__doc__ or "").rstrip() + FIELDS_DOC
+        return wrapper
+    return decorator
@@ -0,0 +1,71 @@
+import asyncio
+import functools
+import inspect
+import json
+import logging
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls: while a call for a key is in
+    flight, later callers with the same key await that call's result
+    instead of starting their own.
+    """
+
+    def __init__(self):
+        self.counters = {}
+        self._inflight = {}
+
+    def _count(self, name, counter):
+        counters = self.counters.setdefault(name, {"calls": 0, "executions": 0, "coalesced": 0})
+        counters[counter] += 1
+
+    async def do(self, name, key, func):
+        """Returns the result of func(), shared with any in-flight call for key"""
+        self._count(name, "calls")
+        task = self._inflight.get(key)
+        if task is None:
+            self._count(name, "executions")
+            task = asyncio.ensure_future(func())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self._count(name, "coalesced")
+            logging.debug(f"Coalesced {name} call with an in-flight request")
+        # Shield so one caller being cancelled does not cancel the shared call
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    def stats(self):
+        totals = {"calls": 0, "executions": 0, "coalesced": 0}
+        for counters in self.counters.values():
+            for counter, value in counters.items():
+                totals[counter] += value
+        totals["in_flight"] = len(self._inflight)
+        totals["tools"] = {name: dict(counters) for name, counters in self.counters.items()}
+        return totals
+
+
+single_flight = SingleFlight()
+
+
+def call_key(func, args, kwargs):
+    """Builds a key from the function name and its normalized arguments"""
+    bound = inspect.signature(func).bind(*args, **kwargs)
+    bound.apply_defaults()
+    return (func.__name__, json.dumps(bound.arguments, sort_keys=True, default=str))
+
+
+def coalesce(func):
+    """
+    Decorator for async tools so that identical concurrent calls
+    share one execution through single_flight
+    """
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        key = call_key(func, args, kwargs)
+        return await single_flight.do(func.__name__, key, lambda: func(*args, **kwargs))
+    return wrapper